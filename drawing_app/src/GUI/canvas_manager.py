@@ -1,38 +1,36 @@
-import cv2
-from PySide6.QtGui import QImage, QPixmap
-import numpy as np
 from drawing_manager import DrawingManager
 from tools.back_button import BackButton
 
 class CanvasManager:
-    def __init__(self, canvas_label):
+    def __init__(self, canvas_widget, width=800, height=600):
         """
         Initialize the CanvasManager class that manages the drawing canvas and interacts
         with the DrawingManager for performing drawing operations.
+        It offers the DrawingManager's drawing interface, so the tools run on either one; the
+        only difference is that thicknesses set here are screen pixels, scaled by the zoom.
+        :param canvas_widget: CanvasWidget, or a core.headless.HeadlessCanvas to run without a GUI.
+        :param width: Width of the document.
+        :param height: Height of the document.
         """
-        if canvas_label is None:
-            raise ValueError("Canvas label cannot be None. Please provide a valid QLabel for the canvas.")
+        if canvas_widget is None:
+            raise ValueError("Canvas widget cannot be None. Please provide a valid CanvasWidget for the canvas.")
         
-        self.canvas_label = canvas_label
-        self.drawing_manager = DrawingManager(self.canvas_label)
-        self.back_button = BackButton(self.drawing_manager)  # Initialize BackButton for undo functionality
-        self.zoom_factor = 1.0
+        self.canvas_widget = canvas_widget
+        self.drawing_manager = DrawingManager(self.canvas_widget, width, height)
+        self.back_button = BackButton(self.drawing_manager)  # The session's only BackButton; tools and toolbar share it
         self.temp_image = None  # Temporary image for drag operations (double-buffering)
-        self.offset_x = 0  # Offset for panning
-        self.offset_y = 0
 
 
     def update_canvas(self):
         """Update the canvas display with the current drawing (base image)."""
-        image = self.drawing_manager.image
-        self._set_canvas_image(image)
+        self.drawing_manager.update_canvas()
 
     def update_canvas_with_image(self, image):
         """
         Update the canvas display with a temporary image (e.g., during drag events).
         This does not modify the base image but shows a preview.
         """
-        self._set_canvas_image(image)
+        self.drawing_manager.show_preview(image)
 
     def clear_canvas(self):
         """Clear the canvas to its initial background color."""
@@ -49,30 +47,36 @@ class CanvasManager:
         self.drawing_manager.disable_drawing()
 
     def draw_line(self, start_point, end_point, color=None):
-        """
-        Draw a line on the canvas using the specified color.
-        :param start_point: Starting point of the line.
-        :param end_point: Ending point of the line.
-        :param color: The color to use for the line (if None, use the current color).
-        """
-        if color is None:
-            color = self.color  # Use the currently set color if none is provided
-        
-        cv2.line(self.image, start_point, end_point, color, self.thickness)
-        self.update_canvas()  # Assuming you have a method to update the canvas
+        """Draw a line with the current thickness, whether or not the pen is down (see DrawingManager.draw_line)."""
+        self.drawing_manager.draw_line(start_point, end_point, color)
+
+    def draw_polyline(self, points, color=None):
+        """Draw connected line segments through a batch of points (see DrawingManager.draw_polyline)."""
+        self.drawing_manager.draw_polyline(points, color)
+
+    def draw_polylines(self, polylines, color=None):
+        """Draw several polylines at once with a single repaint (see DrawingManager.draw_polylines)."""
+        self.drawing_manager.draw_polylines(polylines, color)
+
+    def draw_circle(self, center_point, radius, color=None, thickness=None):
+        """Draw a circle (see DrawingManager.draw_circle)."""
+        self.drawing_manager.draw_circle(center_point, radius, color, thickness)
 
     def draw_rectangle(self, start_point, end_point):
-        """Draw a zoom-aware rectangle on the canvas."""
-        scaled_start, scaled_end = self._scale_points(start_point, end_point)
-        self.drawing_manager.draw_rectangle(scaled_start, scaled_end)
-        self.update_canvas()
+        """Draw a rectangle on the canvas (points are in document coordinates)."""
+        self.drawing_manager.draw_rectangle(start_point, end_point)
 
     def draw_ellipse(self, center_point, axes_lengths):
-        """Draw a zoom-aware ellipse on the canvas."""
-        scaled_center = self._scale_point(center_point)
-        scaled_axes = self._scale_tuple(axes_lengths)
-        self.drawing_manager.draw_ellipse(scaled_center, scaled_axes)
-        self.update_canvas()
+        """Draw an ellipse on the canvas (center and axes are in document coordinates)."""
+        self.drawing_manager.draw_ellipse(center_point, axes_lengths)
+
+    def undo(self):
+        """Undo the last operation; False if there was nothing to undo."""
+        return self.drawing_manager.undo()
+
+    def redo(self):
+        """Redo the last undone operation; False if there was nothing to redo."""
+        return self.drawing_manager.redo()
 
     def set_color(self, color):
         """Set the drawing color."""
@@ -100,58 +104,44 @@ class CanvasManager:
         Adjust the zoom factor, scaling all drawing operations accordingly.
         This scales the display of the canvas as well as tools like pens and shapes.
         """
-        self.zoom_factor = max(0.1, self.zoom_factor * factor)  # Prevent zooming too small
-        self.update_zoomed_canvas()
+        with self.profiler.span("zoom", "view"):
+            self.drawing_manager.set_zoom_factor(max(0.1, self.zoom_factor * factor))  # Prevent zooming too small
 
     def pan(self, delta_x, delta_y):
         """Pan the canvas by adjusting the offset."""
-        self.offset_x += delta_x
-        self.offset_y += delta_y
-        self.update_zoomed_canvas()
+        with self.profiler.span("pan", "view"):
+            self.drawing_manager.pan(delta_x, delta_y)
 
     def update_zoomed_canvas(self):
         """Update the canvas with the current zoom factor and panning applied."""
-        zoomed_image = cv2.resize(self.drawing_manager.image, None, fx=self.zoom_factor, fy=self.zoom_factor, interpolation=cv2.INTER_LINEAR)
-
-        # Crop the zoomed image based on the offsets
-        cropped_image = self._apply_offset(zoomed_image)
-
-        self.update_canvas_with_image(cropped_image)
-
-    def _apply_offset(self, zoomed_image):
-        """Apply panning offset to the zoomed image."""
-        max_x_offset = max(0, zoomed_image.shape[1] - self.drawing_manager.width)
-        max_y_offset = max(0, zoomed_image.shape[0] - self.drawing_manager.height)
+        self.drawing_manager.update_canvas()
 
-        # Ensure the offsets are within bounds
-        self.offset_x = min(max(self.offset_x, 0), max_x_offset)
-        self.offset_y = min(max(self.offset_y, 0), max_y_offset)
-
-        return zoomed_image[self.offset_y:self.offset_y + self.drawing_manager.height,
-                            self.offset_x:self.offset_x + self.drawing_manager.width]
+    @property
+    def view(self):
+        """View transform (zoom and pan) shared with the DrawingManager."""
+        return self.drawing_manager.view
 
-    def _scale_points(self, *points):
-        """Scale points according to the current zoom factor."""
-        return tuple(self._scale_point(point) for point in points)
+    @property
+    def jobs(self):
+        """core.jobs.JobService running this canvas's background work."""
+        return self.drawing_manager.jobs
 
-    def _scale_point(self, point):
-        """Scale a single point (x, y) by the current zoom factor."""
-        return int(point[0] * self.zoom_factor), int(point[1] * self.zoom_factor)
+    @property
+    def profiler(self):
+        """core.profiler.Profiler timing the hot paths of this canvas."""
+        return self.drawing_manager.profiler
 
-    def _scale_tuple(self, values):
-        """Scale a tuple of values by the zoom factor, useful for axes lengths."""
-        return tuple(int(v * self.zoom_factor) for v in values)
+    @property
+    def zoom_factor(self):
+        return self.drawing_manager.zoom_factor
 
-    def _set_canvas_image(self, image):
-        """Convert the image to QPixmap and set it on the QLabel canvas."""
-        # Ensure the image is C-contiguous before passing it to QImage
-        if not image.flags['C_CONTIGUOUS']:
-            image = np.ascontiguousarray(image)
+    @property
+    def offset_x(self):
+        return self.drawing_manager.offset_x
 
-        height, width, channel = image.shape
-        bytes_per_line = 3 * width
-        q_image = QImage(image.data, width, height, bytes_per_line, QImage.Format_RGB888).rgbSwapped()
-        self.canvas_label.setPixmap(QPixmap.fromImage(q_image))
+    @property
+    def offset_y(self):
+        return self.drawing_manager.offset_y
 
     @property
     def color(self):
@@ -166,6 +156,56 @@ class CanvasManager:
         """Setter for the image property."""
         self.drawing_manager.image = new_image
 
+    def copy_image(self, owner="previews"):
+        """Return a tracked copy of the whole document (see DrawingManager.copy_image)."""
+        return self.drawing_manager.copy_image(owner)
+
+    def read_region(self, rect):
+        """Return the pixels of a document rectangle of the active layer (see DrawingManager.read_region)."""
+        return self.drawing_manager.read_region(rect)
+
+    def write_region(self, origin, pixels):
+        """Write pixels into the active layer at `origin` and repaint that area."""
+        self.drawing_manager.write_region(origin, pixels)
+
+    def apply_filter(self, image_filter, rect=None):
+        """Filter the active layer in parallel and wait for it (see DrawingManager.apply_filter)."""
+        self.drawing_manager.apply_filter(image_filter, rect)
+
+    def filter_job(self, image_filter, rect=None):
+        """Return a background job filtering the active layer (see DrawingManager.filter_job)."""
+        return self.drawing_manager.filter_job(image_filter, rect)
+
+    def add_overlay(self, overlay):
+        """Show a stroke in progress over the document (see DrawingManager.add_overlay)."""
+        self.drawing_manager.add_overlay(overlay)
+
+    def update_overlay(self, overlay, rect):
+        """Repaint the part of the canvas in which an overlay changed."""
+        self.drawing_manager.update_overlay(overlay, rect)
+
+    def commit_overlay(self, overlay):
+        """Blend an overlay into the document once, when its stroke ends."""
+        self.drawing_manager.commit_overlay(overlay)
+
+    def show_shape_preview(self, preview):
+        """Show a rubber-band shape over the canvas (see DrawingManager.show_shape_preview)."""
+        self.drawing_manager.show_shape_preview(preview)
+
+    def clear_shape_preview(self):
+        """Stop showing the rubber-band shape."""
+        self.drawing_manager.clear_shape_preview()
+
+    @property
+    def memory(self):
+        """Buffer registry accounting the session's image memory."""
+        return self.drawing_manager.memory
+
+    @property
+    def scratch(self):
+        """Reusable scratch buffers shared by the tools."""
+        return self.drawing_manager.scratch
+
     @property
     def thickness(self):
         return self.drawing_manager.thickness
@@ -0,0 +1,81 @@
+from contextlib import nullcontext
+import numpy as np
+from PySide6.QtCore import Qt, QPointF, QRectF
+from PySide6.QtGui import QPainter, QPen, QColor, QTransform
+from PySide6.QtWidgets import QWidget
+from GUI.display_bridge import DisplayBridge
+from core.shape_preview import RECTANGLE, ELLIPSE
+
+
+class CanvasWidget(QWidget):
+    def __init__(self, width=800, height=600, parent=None):
+        """
+        Paint widget that keeps a persistent display buffer for the canvas.
+
+        Regions uploaded with `update_region` are written into a DisplayBridge buffer and
+        only that part of the widget is scheduled for repainting, instead of replacing a
+        whole pixmap on every change the way `QLabel.setPixmap` does. Shape previews are
+        painted as vector primitives on top of the buffer and never touch its pixels.
+
+        :param width: Width of the visible canvas in pixels.
+        :param height: Height of the visible canvas in pixels.
+        :param parent: Optional parent widget.
+        """
+        super().__init__(parent)
+        self.setFixedSize(width, height)
+        self.setAttribute(Qt.WA_OpaquePaintEvent)  # Every pixel is painted from the buffer
+        self.bridge = DisplayBridge(width, height)
+        self.shape_previews = []  # core.shape_preview.ShapePreview outlines painted over the buffer
+        self.view = None  # ViewTransform mapping the previews' document coordinates to the widget
+        self.profiler = None  # core.profiler.Profiler set by the DrawingManager; times the Qt paint
+
+    def set_image(self, image: np.ndarray):
+        """Upload a full BGR image into the display buffer."""
+        self.update_region(image, 0, 0)
+
+    def update_region(self, image: np.ndarray, x: int, y: int):
+        """
+        Upload a BGR image region into the display buffer and repaint only that area.
+        :param image: BGR image data for the region.
+        :param x: Left edge of the region in widget coordinates.
+        :param y: Top edge of the region in widget coordinates.
+        """
+        written = self.bridge.write(image, x, y)
+        if written is not None:
+            self.update(*written)
+
+    def mark_updated(self, x: int, y: int, width: int, height: int):
+        """Repaint an area whose pixels were rendered straight into `bridge.buffer`."""
+        self.update(x, y, width, height)
+
+    def paintEvent(self, event):
+        """Repaint the exposed area straight from the display buffer."""
+        profiler = self.profiler
+        with profiler.span("paint", "qt") if profiler is not None else nullcontext():
+            painter = QPainter(self)
+            rect = event.rect()
+            painter.drawImage(rect, self.bridge.image, rect)
+            if self.shape_previews and self.view is not None:
+                self._paint_shape_previews(painter)
+            painter.end()
+
+    def _paint_shape_previews(self, painter):
+        """Paint the shape previews in document coordinates through the view transform."""
+        view = self.view
+        # Document pixel centres sit at +0.5, where cv2 rasterizes the committed shape
+        painter.setTransform(QTransform(view.zoom, 0, 0, view.zoom,
+                                        0.5 * view.zoom - view.offset_x, 0.5 * view.zoom - view.offset_y))
+        painter.setRenderHint(QPainter.Antialiasing)
+        for preview in self.shape_previews:
+            color = QColor(preview.color[2], preview.color[1], preview.color[0])  # Document colours are BGR
+            color.setAlphaF(preview.opacity)
+            painter.setPen(QPen(color, max(1, preview.thickness), Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin))
+            painter.setBrush(Qt.NoBrush)
+            start, end = QPointF(*preview.start_point), QPointF(*preview.end_point)
+            if preview.kind == RECTANGLE:
+                painter.drawRect(QRectF(start, end).normalized())
+            elif preview.kind == ELLIPSE:
+                (center_x, center_y), (axis_x, axis_y) = preview.ellipse_geometry()
+                painter.drawEllipse(QPointF(center_x, center_y), axis_x, axis_y)
+            else:
+                painter.drawLine(start, end)
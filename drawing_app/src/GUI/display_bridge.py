@@ -0,0 +1,20 @@
+from PySide6.QtGui import QImage
+from core.frame_buffer import FrameBuffer
+
+
+class DisplayBridge(FrameBuffer):
+    def __init__(self, width, height, background_color=(255, 255, 255)):
+        """
+        Persistent display buffer shared between numpy and Qt.
+
+        `buffer` is a BGR numpy array and `image` is a `QImage` in `Format_BGR888` that
+        points at the same memory, so pixels written into the buffer are visible to Qt
+        without `rgbSwapped()` or `QPixmap.fromImage` copies.
+
+        :param width: Width of the display buffer in pixels.
+        :param height: Height of the display buffer in pixels.
+        :param background_color: Initial fill colour of the buffer (BGR).
+        """
+        super().__init__(width, height, background_color)
+        # The QImage does not own its memory; self.buffer must live as long as it does
+        self.image = QImage(self.buffer.data, width, height, self.buffer.strides[0], QImage.Format_BGR888)
@@ -1,52 +1,153 @@
-from PySide6.QtWidgets import QMainWindow, QVBoxLayout, QWidget, QLabel, QColorDialog
+import tempfile
+from PySide6.QtWidgets import QMainWindow, QVBoxLayout, QWidget, QColorDialog, QDockWidget, QLabel, QFileDialog
 from GUI.canvas_manager import CanvasManager
+from GUI.canvas_widget import CanvasWidget
+from GUI.navigator import NavigatorWidget
+from GUI.profiler_hud import ProfilerHud
+from GUI.job_dispatcher import GuiDispatcher
 from GUI.toolbar import ToolbarManager
 from GUI.tool_selection import ToolSelection
-from PySide6.QtCore import Qt
-from tools.back_button import BackButton
-from main import Worker  # Import Worker from the main module
+from PySide6.QtCore import Qt, QTimer
+from core.stroke_log import StrokeLogWriter, StrokeRecorder, prune_stroke_logs, session_stroke_log
+from core.watchdog import StallWatchdog
+from core.jobs import SaveImageJob, FunctionJob, DONE, FAILED
+from core.journal import orphaned_journals, session_journal
+from core.filters import PRESETS
+
+# Crash-recovery journals, one per running session (see core.journal.session_journal); deleted again on a clean exit
+SESSION_JOURNAL_DIR = tempfile.gettempdir()
+SESSION_JOURNAL_NAME = "drawing_app_session"
+# Each session logs its strokes to a file of its own, replayable with core.stroke_log.replay;
+# the logs of the last few sessions are kept, so the one of a crashed session survives the restart
+SESSION_STROKE_LOG_DIR = tempfile.gettempdir()
+SESSION_STROKE_LOG_NAME = "drawing_app_session"
+SESSION_STROKE_LOGS_KEPT = 5
 
 class DrawingApp(QMainWindow):
-    def __init__(self):
+    def __init__(self, journal_dir=SESSION_JOURNAL_DIR, stroke_log_dir=SESSION_STROKE_LOG_DIR, stall_budget=None):
         super().__init__()
         self.setWindowTitle("Cross-Platform Drawing App with Turtle")
         self.setGeometry(100, 100, 1000, 700)
 
         # Setup main layout
-        self.canvas_label = QLabel("Drawing Area")
-        self.canvas_label.setFixedSize(800, 600)
-        self.canvas_label.setStyleSheet("background-color: white;")
+        self.canvas_widget = CanvasWidget(800, 600)
 
         layout = QVBoxLayout()
-        layout.addWidget(self.canvas_label)
+        layout.addWidget(self.canvas_widget)
 
         container = QWidget()
         container.setLayout(layout)
         self.setCentralWidget(container)
 
         # Initialize canvas, toolbar, and tools
-        self.canvas_manager = CanvasManager(self.canvas_label)
+        self.canvas_manager = CanvasManager(self.canvas_widget)
+        # Background jobs report progress and results on the GUI thread
+        self.job_dispatcher = GuiDispatcher(self)
+        self.canvas_manager.jobs.dispatch = self.job_dispatcher.dispatch
         self.toolbar_manager = ToolbarManager(self)
         self.tool_selection = ToolSelection(self.canvas_manager, self)
+        self.profiler_hud = ProfilerHud(self.canvas_manager.profiler, self.canvas_widget)
 
         # Initialize the toolbar
         self.toolbar_manager.init_toolbar()
 
+        # Navigator minimap docked next to the canvas
+        self.navigator = NavigatorWidget(self.canvas_manager.drawing_manager)
+        navigator_dock = QDockWidget("Navigator", self)
+        navigator_dock.setWidget(self.navigator)
+        self.addDockWidget(Qt.RightDockWidgetArea, navigator_dock)
+
         # Initialize default tool (Pen)
         self.tool_selection.select_pen_tool()
 
         # Add mouse event handling
-        self.canvas_label.mousePressEvent = self.mouse_press_event
-        self.canvas_label.mouseMoveEvent = self.mouse_move_event
-        self.canvas_label.mouseReleaseEvent = self.mouse_release_event
+        self.canvas_widget.mousePressEvent = self.mouse_press_event
+        self.canvas_widget.mouseMoveEvent = self.mouse_move_event
+        self.canvas_widget.mouseReleaseEvent = self.mouse_release_event
 
         # Add status bar
         self.statusBar().showMessage("Pen Tool Selected")
+        self.canvas_manager.drawing_manager.status_listeners.append(self.statusBar().showMessage)
+
+        # Session memory per owner, refreshed once a second (also enforces the memory cap)
+        self.memory_label = QLabel()
+        self.statusBar().addPermanentWidget(self.memory_label)
+        self.memory_timer = QTimer(self)
+        self.memory_timer.timeout.connect(self.update_memory_label)
+        self.memory_timer.start(1000)
+        self.update_memory_label()
+
+        # Journal every change so the session survives a crash, rebuilding the last crashed one;
+        # journals of sessions that are still running in another window are left alone
+        if journal_dir:
+            orphans = orphaned_journals(journal_dir, SESSION_JOURNAL_NAME)
+            if self.canvas_manager.drawing_manager.open_journal(
+                    session_journal(journal_dir, SESSION_JOURNAL_NAME), recover=bool(orphans),
+                    previous_path=orphans[0] if orphans else None):
+                self.statusBar().showMessage("Recovered the previous session")
+
+        # Record every tool interaction into a compact binary stroke log
+        self.stroke_log = None
+        if stroke_log_dir:
+            prune_stroke_logs(stroke_log_dir, SESSION_STROKE_LOG_NAME, SESSION_STROKE_LOGS_KEPT - 1)
+            self.stroke_log = StrokeLogWriter(session_stroke_log(stroke_log_dir, SESSION_STROKE_LOG_NAME))
+            self.tool_selection.mouse_events.recorder = StrokeRecorder(self.stroke_log)
+
+        # Log event-loop stalls longer than `stall_budget` seconds, with the stack they happened in (opt-in)
+        self.watchdog = None
+        if stall_budget:
+            self.watchdog = StallWatchdog(stall_budget)
+            self.heartbeat_timer = QTimer(self)
+            self.heartbeat_timer.setTimerType(Qt.PreciseTimer)
+            self.heartbeat_timer.timeout.connect(self.watchdog.heartbeat)
+            self.heartbeat_timer.start(max(1, round(self.watchdog.interval * 1000)))
+            self.watchdog.start()
 
         # Add color picker and initial color setting
         self.current_color = (0, 0, 0)  # Default color (black)
         self.canvas_manager.set_color(self.current_color)
-        self.back_button = BackButton(self.canvas_manager.drawing_manager)
+        self.back_button = self.canvas_manager.back_button
+
+    def update_memory_label(self):
+        """Show how much image memory the session holds."""
+        memory = self.canvas_manager.memory
+        memory.enforce()
+        self.memory_label.setText(memory.summary())
+
+    def toggle_profiler(self):
+        """Show or hide the profiler HUD; profiling only runs while it is shown."""
+        shown = self.profiler_hud.toggle()
+        self.statusBar().showMessage("Profiler on" if shown else "Profiler off")
+
+    def export_trace(self):
+        """Save the recorded profiler spans as a Chrome trace (open it in chrome://tracing or Perfetto)."""
+        profiler = self.canvas_manager.profiler
+        if not profiler.spans:
+            self.statusBar().showMessage("Nothing recorded yet; turn the profiler on first")
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Export Trace", "drawing_trace.json", "Trace (*.json)")
+        if path:
+            self.run_job(FunctionJob("export", profiler.export_chrome_trace, path), f"Trace saved to {path}")
+
+    def save_image(self):
+        """Save the flattened document as an image, encoding and writing it in the background."""
+        path, _ = QFileDialog.getSaveFileName(self, "Save Image", "drawing.png", "Images (*.png *.jpg *.bmp *.tiff)")
+        if path:
+            snapshot = self.canvas_manager.copy_image()  # Drawing may continue while it is written
+            self.run_job(SaveImageJob(snapshot, path), f"Saved {path}")
+
+    def apply_filter(self, name):
+        """Apply a filter preset to the active layer; it is computed in the background, across all CPU cores."""
+        self.run_job(self.canvas_manager.filter_job(PRESETS[name]()), f"{name} applied")
+
+    def run_job(self, job, done_message):
+        """Submit a background job and follow its progress and outcome in the status bar."""
+        job.progress_listeners.append(
+            lambda job, fraction, message: self.statusBar().showMessage(f"{message or job.kind}: {fraction:.0%}"))
+        job.done_listeners.append(lambda job: self.statusBar().showMessage(
+            done_message if job.state == DONE else
+            f"{job.kind} failed: {job.error}" if job.state == FAILED else f"{job.kind} cancelled"))
+        return self.canvas_manager.jobs.submit(job)
 
     def mouse_press_event(self, event):
         """Handle mouse press events for drawing."""
@@ -60,6 +161,23 @@ class DrawingApp(QMainWindow):
     def mouse_release_event(self, event):
         """Handle mouse release events for drawing."""
         self.tool_selection.mouse_events.mouse_release_event(event)
+        self.tool_selection.back_button.save_state()  # Close the operation so it reaches the journal now
+
+    def closeEvent(self, event):
+        """Finish the journal on a clean exit; it is only needed after a crash."""
+        self.canvas_manager.drawing_manager.close_journal(discard=True)
+        if self.stroke_log is not None:
+            self.stroke_log.close()
+        jobs = self.canvas_manager.jobs
+        for job in jobs.jobs():
+            if job.kind not in ("save", "export"):
+                job.cancel()  # Saves and exports are finished, anything else is dropped
+        jobs.shutdown(cancel=False)
+        if self.watchdog is not None:
+            self.watchdog.stop()
+            if self.watchdog.sites:
+                self.watchdog.log(self.watchdog.report())
+        super().closeEvent(event)
 
     def pick_color(self):
         """Open a color picker dialog to choose the drawing color."""
@@ -75,64 +193,12 @@ class DrawingApp(QMainWindow):
         self.canvas_manager.set_thickness(thickness)
         self.statusBar().showMessage(f"Thickness set to {thickness}px")
 
-    def some_method(self):
-        """An example method showcasing internal usage."""
-        self.set_thickness(5)  # Example call to another method within the same class
-
-
-class DrawingAppWithWorker(DrawingApp):
-    def __init__(self):
-        super().__init__()
-        # Worker thread initialization
-        self.worker = Worker()
-        self.worker.finished.connect(self.on_task_finished)
-        self.worker.error.connect(self.on_task_error)
-
-        # Setup your main window and canvas
-        self.setWindowTitle("Drawing Application")
-        self.setGeometry(100, 100, 800, 600)
-
-        # Create a label to serve as the canvas
-        self.canvas_label = QLabel(self)
-        self.canvas_label.setFixedSize(800, 600)
-        self.canvas_label.setStyleSheet("background-color: white;")
-
-        # Layout management
-        layout = QVBoxLayout()
-        layout.addWidget(self.canvas_label)
-        container = QWidget()
-        container.setLayout(layout)
-        self.setCentralWidget(container)
-
-        # Initialize the CanvasManager with the drawing app reference
-        self.canvas_manager = CanvasManager(self.canvas_label, drawing_app=self)
-
-        # Initialize the BackButton for undo functionality
-        self.back_button = BackButton(self.canvas_manager.drawing_manager)
-
-        # Initialize the tool selection
-        self.tool_selection = ToolSelection(self.canvas_manager, self)
-        self.tool_selection.select_pen_tool()
-
-        # Setup the toolbar and pass the BackButton
-        self.toolbar_manager = ToolbarManager(self, self.back_button)
-        self.toolbar_manager.init_toolbar()
-
-        # Mouse events handling
-        self.canvas_label.mousePressEvent = self.mouse_press_event
-        self.canvas_label.mouseMoveEvent = self.mouse_move_event
-        self.canvas_label.mouseReleaseEvent = self.mouse_release_event
-
-    def on_task_finished(self):
-        """Handle worker task completion."""
-        self.statusBar().showMessage("Background task finished.")
-
-    def on_task_error(self, error_message):
-        """Handle worker task error."""
-        self.statusBar().showMessage(f"Error occurred: {error_message}")
-
     def set_opacity(self, value):
         """Set the opacity for the current drawing tool via the DrawingManager."""
         opacity = value / 100.0  # Convert slider value to opacity (0.0 to 1.0)
         self.canvas_manager.set_opacity(opacity)  # Pass the value to DrawingManager
         self.statusBar().showMessage(f"Opacity set to {opacity * 100:.0f}%")
+
+    def some_method(self):
+        """An example method showcasing internal usage."""
+        self.set_thickness(5)  # Example call to another method within the same class
@@ -0,0 +1,24 @@
+from PySide6.QtCore import QObject, Signal
+
+
+class GuiDispatcher(QObject):
+    _call = Signal(object, tuple)
+
+    def __init__(self, parent=None):
+        """
+        Deliver calls from worker threads on the thread this object lives in (the GUI thread).
+
+        Install `dispatch` as a JobService's dispatch, so job progress and results reach
+        listeners on the GUI thread, where they may update widgets and the document.
+
+        :param parent: Optional parent QObject.
+        """
+        super().__init__(parent)
+        self._call.connect(self._run)  # Emitted from another thread, so the call is queued
+
+    def dispatch(self, function, *args):
+        self._call.emit(function, args)
+
+    @staticmethod
+    def _run(function, args):
+        function(*args)
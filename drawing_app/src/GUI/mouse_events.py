@@ -1,23 +1,70 @@
 from PySide6.QtCore import Qt
+from GUI.render_scheduler import RenderScheduler
+from core.events import PointerEvent
 
 class MouseEvents:
     def __init__(self, tool_selection):
         self.tool_selection = tool_selection
+        # Drag events are coalesced and presented once per display frame
+        self.render_scheduler = RenderScheduler(tool_selection.canvas_manager.drawing_manager)
+        self.recorder = None  # Optional StrokeRecorder capturing every stroke for the stroke log
+
+    @property
+    def profiler(self):
+        return self.tool_selection.canvas_manager.drawing_manager.profiler
+
+    def _run_in_frame(self, tool, handler, pointer):
+        """Call a tool handler as a frame of its own, like the drags, so its repaints are presented once."""
+        drawing_manager = self.tool_selection.canvas_manager.drawing_manager
+        drawing_manager.begin_frame()
+        try:
+            with drawing_manager.profiler.tool_span(tool, handler):
+                getattr(tool, handler)(pointer)
+        finally:
+            drawing_manager.end_frame()
+
+    def _to_document(self, event):
+        """Turn a Qt mouse event into the plain PointerEvent the tools take, mapped through the view transform."""
+        view = self.tool_selection.canvas_manager.view
+        x, y = view.to_document((event.position().x(), event.position().y()))
+        return PointerEvent(x, y)
 
     def mouse_press_event(self, event):
         if event.button() == Qt.LeftButton and self.tool_selection.current_tool:
+            self.render_scheduler.flush()  # Finish any drag still waiting for a frame
+            self.profiler.input_received()
+            tool = self.tool_selection.current_tool
+            pointer = self._to_document(event)
+            if self.recorder is not None:
+                self.recorder.begin(tool, self.tool_selection.canvas_manager, pointer)
+            self.tool_selection.canvas_manager.drawing_manager.begin_stroke()
             # Call on_press only if the tool has this method
-            if hasattr(self.tool_selection.current_tool, 'on_press'):
-                self.tool_selection.current_tool.on_press(event)
+            if hasattr(tool, 'on_press'):
+                self._run_in_frame(tool, 'on_press', pointer)
+            if self.recorder is not None:
+                self.recorder.capture_parameters(tool)
 
     def mouse_move_event(self, event):
         if event.buttons() == Qt.LeftButton and self.tool_selection.current_tool:
-            # Call on_drag only if the tool has this method
-            if hasattr(self.tool_selection.current_tool, 'on_drag'):
-                self.tool_selection.current_tool.on_drag(event)
+            self.profiler.input_received()
+            # Queue on_drag only if the tool has this method; it runs on the next frame
+            tool = self.tool_selection.current_tool
+            if hasattr(tool, 'on_drag') or hasattr(tool, 'on_drag_batch'):
+                pointer = self._to_document(event)
+                if self.recorder is not None:
+                    self.recorder.drag(pointer)  # Recorded when it arrives, not when its frame runs
+                self.render_scheduler.queue_drag(tool, pointer)
 
     def mouse_release_event(self, event):
         if event.button() == Qt.LeftButton and self.tool_selection.current_tool:
+            self.render_scheduler.flush()  # The stroke must be complete before it is released
+            self.profiler.input_received()
+            pointer = self._to_document(event)
             # Call on_release only if the tool has this method
-            if hasattr(self.tool_selection.current_tool, 'on_release'):
-                self.tool_selection.current_tool.on_release(event)
+            try:
+                if hasattr(self.tool_selection.current_tool, 'on_release'):
+                    self._run_in_frame(self.tool_selection.current_tool, 'on_release', pointer)
+            finally:
+                self.tool_selection.canvas_manager.drawing_manager.end_stroke()  # Deferred work lands now
+            if self.recorder is not None:
+                self.recorder.end(pointer)
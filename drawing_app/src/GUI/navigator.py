@@ -0,0 +1,65 @@
+from PySide6.QtCore import Qt, QRectF
+from PySide6.QtGui import QImage, QPainter, QPen, QColor
+from PySide6.QtWidgets import QWidget
+
+
+class NavigatorWidget(QWidget):
+    def __init__(self, drawing_manager, width=200, height=150, parent=None):
+        """
+        Minimap of the whole document with the visible viewport outlined.
+
+        The thumbnail is drawn from the smallest pyramid level, so painting it never reads
+        full-resolution pixels beyond the regions that changed. Clicking or dragging centres
+        the canvas view on that point.
+
+        :param drawing_manager: The DrawingManager whose document and view are shown.
+        :param width: Width of the navigator in pixels.
+        :param height: Height of the navigator in pixels.
+        :param parent: Optional parent widget.
+        """
+        super().__init__(parent)
+        self.drawing_manager = drawing_manager
+        self.setFixedSize(width, height)
+        self.drawing_manager.present_listeners.append(self.update)
+
+    def _thumbnail_rect(self):
+        """Return the widget rectangle the document thumbnail is drawn into, keeping its aspect ratio."""
+        view = self.drawing_manager.view
+        scale = min(self.width() / view.document_width, self.height() / view.document_height)
+        width, height = view.document_width * scale, view.document_height * scale
+        return QRectF((self.width() - width) / 2, (self.height() - height) / 2, width, height), scale
+
+    def paintEvent(self, event):
+        """Draw the smallest pyramid level and the current viewport rectangle."""
+        level = self.drawing_manager.pyramid.smallest(self.drawing_manager.layers.composite()).to_array()
+        height, width = level.shape[:2]
+        thumbnail = QImage(level.data, width, height, level.strides[0], QImage.Format_BGR888)
+
+        target, scale = self._thumbnail_rect()
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(128, 128, 128))
+        painter.setRenderHint(QPainter.SmoothPixmapTransform)
+        painter.drawImage(target, thumbnail)
+
+        # Outline the part of the document visible in the canvas
+        view = self.drawing_manager.view
+        painter.setPen(QPen(QColor(255, 0, 0), 1))
+        painter.drawRect(QRectF(target.x() + view.offset_x / view.zoom * scale,
+                                target.y() + view.offset_y / view.zoom * scale,
+                                view.view_width / view.zoom * scale,
+                                view.view_height / view.zoom * scale))
+        painter.end()
+
+    def mousePressEvent(self, event):
+        self._center_on(event)
+
+    def mouseMoveEvent(self, event):
+        if event.buttons() & Qt.LeftButton:
+            self._center_on(event)
+
+    def _center_on(self, event):
+        """Centre the canvas view on the document point under the mouse."""
+        target, scale = self._thumbnail_rect()
+        x = (event.position().x() - target.x()) / scale
+        y = (event.position().y() - target.y()) / scale
+        self.drawing_manager.center_on((x, y))
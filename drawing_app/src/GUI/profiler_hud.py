@@ -0,0 +1,55 @@
+from PySide6.QtCore import Qt, QTimer
+from PySide6.QtGui import QFont
+from PySide6.QtWidgets import QLabel
+
+
+class ProfilerHud(QLabel):
+    def __init__(self, profiler, parent, refresh_ms=250):
+        """
+        On-screen readout of a Profiler, drawn over the top-left corner of its parent.
+
+        Showing the HUD turns profiling on and hiding it turns it off again, so the
+        instrumented paths only pay for timing while it is visible.
+
+        :param profiler: core.profiler.Profiler to read.
+        :param parent: Widget to draw over, normally the canvas widget.
+        :param refresh_ms: Interval between updates of the readout.
+        """
+        super().__init__(parent)
+        self.profiler = profiler
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)  # Drawing continues underneath the HUD
+        self.setFont(QFont("monospace", 9))
+        self.setStyleSheet("background-color: rgba(0, 0, 0, 160); color: white; padding: 4px;")
+        self.timer = QTimer(self)
+        self.timer.setInterval(refresh_ms)
+        self.timer.timeout.connect(self.refresh)
+        self.move(8, 8)
+        self.hide()
+
+    def toggle(self):
+        """Show the HUD and start profiling, or hide it and stop."""
+        if self.isVisible():
+            self.timer.stop()
+            self.profiler.disable()
+            self.hide()
+        else:
+            self.profiler.enable()
+            self.refresh()
+            self.show()
+            self.raise_()
+            self.timer.start()
+        return self.isVisible()
+
+    def refresh(self):
+        """Update the readout with the last second of statistics."""
+        stats = self.profiler.stats()
+        frame, latency = stats["frame_ms"], stats["latency_ms"]
+        lines = [
+            f"frame    {frame['p50']:6.2f} ms p50  {frame['p95']:6.2f} ms p95  {stats['fps']:5.0f} fps",
+            f"latency  {latency['p50']:6.2f} ms p50  {latency['p95']:6.2f} ms p95",
+            f"input    {stats['events_per_second']:6.0f} events/s",
+        ]
+        for name, total_ms, count in stats["top_spans"]:
+            lines.append(f"  {name:<22} {total_ms:7.2f} ms  x{count}")
+        self.setText("\n".join(lines))
+        self.adjustSize()
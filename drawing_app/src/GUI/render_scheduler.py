@@ -0,0 +1,101 @@
+from PySide6.QtCore import QObject, QTimer, Qt
+from PySide6.QtGui import QGuiApplication
+
+
+class RenderScheduler(QObject):
+    def __init__(self, drawing_manager, refresh_rate=None, parent=None):
+        """
+        Coalesce mouse-move events and present them once per display frame.
+
+        Drag events are queued instead of being handled immediately. A QTimer running at
+        the display refresh rate hands each frame's batch to the current tool and presents
+        the result once. Tools that implement `on_drag_batch(points)` receive all queued
+        points at once so they can rasterize them with a single call; other tools get
+        their queued `on_drag` events replayed with repaints deferred until the end of the frame.
+
+        :param drawing_manager: The DrawingManager whose repaints are batched.
+        :param refresh_rate: Frames per second to present at (defaults to the screen refresh rate).
+        :param parent: Optional parent QObject.
+        """
+        super().__init__(parent)
+        self.drawing_manager = drawing_manager
+        self.refresh_rate = refresh_rate or self._screen_refresh_rate()
+
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.setInterval(max(1, round(1000 / self.refresh_rate)))
+        self.timer.timeout.connect(self.flush)
+
+        self.tool = None  # Tool the pending events belong to
+        self.pending_points = []  # Queued (x, y) points for batch-capable tools
+        self.pending_events = []  # Queued drag events for tools without batching
+
+        self.events_received = 0
+        self.frames_presented = 0
+        self.coalesced_events = 0  # Events that were merged into another event's frame
+
+    @staticmethod
+    def _screen_refresh_rate():
+        """Return the primary screen's refresh rate, falling back to 60 Hz."""
+        screen = QGuiApplication.primaryScreen()
+        rate = screen.refreshRate() if screen else 0
+        return rate if rate > 0 else 60.0
+
+    def queue_drag(self, tool, event):
+        """
+        Queue a drag event for the given tool; it is handled on the next frame.
+        :param tool: The tool that should receive the event.
+        :param event: The drag event, a core.events.PointerEvent in document coordinates.
+        """
+        if tool is not self.tool:
+            self.flush()  # Never mix events of different tools in one batch
+            self.tool = tool
+
+        self.events_received += 1
+        if hasattr(tool, 'on_drag_batch'):
+            self.pending_points.append((event.x, event.y))
+        else:
+            self.pending_events.append(event)
+
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def has_pending(self):
+        """Check whether any drag events are waiting for the next frame."""
+        return bool(self.pending_points or self.pending_events)
+
+    def flush(self):
+        """Hand the queued events to the tool and present the result once."""
+        if not self.has_pending():
+            self.timer.stop()  # Idle: no ticks until the next drag
+            return
+
+        points, self.pending_points = self.pending_points, []
+        events, self.pending_events = self.pending_events, []
+
+        self.drawing_manager.begin_frame()
+        try:
+            with self.drawing_manager.profiler.tool_span(self.tool, 'on_drag'):
+                if points:
+                    self.tool.on_drag_batch(points)
+                for event in events:
+                    self.tool.on_drag(event)
+        finally:
+            self.drawing_manager.end_frame()
+
+        self.frames_presented += 1
+        self.coalesced_events += len(points) + len(events) - 1
+
+    def stats(self):
+        """Return counters describing how many events were received, presented and coalesced."""
+        return {
+            "events_received": self.events_received,
+            "frames_presented": self.frames_presented,
+            "coalesced_events": self.coalesced_events,
+        }
+
+    def reset_stats(self):
+        """Reset the event counters."""
+        self.events_received = 0
+        self.frames_presented = 0
+        self.coalesced_events = 0
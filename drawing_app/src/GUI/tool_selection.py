@@ -4,7 +4,6 @@ from tools.pen import Pen
 from tools.Brush.brush import Brush
 from tools.turtle_tool import TurtleTool
 from GUI.mouse_events import MouseEvents
-from tools.back_button import BackButton  # Import BackButton
 
 class ToolSelection:
     def __init__(self, canvas_manager, main_window):
@@ -12,7 +11,7 @@ class ToolSelection:
         self.main_window = main_window
         self.mouse_events = MouseEvents(self)
         self.current_tool = None
-        self.back_button = BackButton(canvas_manager.drawing_manager)  # Initialize BackButton
+        self.back_button = canvas_manager.back_button  # Shared BackButton of the canvas
 
     def select_pen_tool(self):
         self.back_button.save_state()  # Save state before switching tool
@@ -1,14 +1,14 @@
-from PySide6.QtWidgets import QToolBar, QColorDialog, QSlider, QLabel, QPushButton
+from PySide6.QtWidgets import QToolBar, QColorDialog, QSlider, QLabel, QPushButton, QComboBox
 from PySide6.QtCore import Qt
+from core.filters import PRESETS
 from tools.Brush.BlurBrush import BlurBrush
 from tools.Brush.brush import Brush
 from tools.line import Line  # Import the Line tool
-from tools.back_button import BackButton  # Import BackButton class
 
 class ToolbarManager:
     def __init__(self, main_window):
         self.main_window = main_window
-        self.back_button = BackButton(main_window.canvas_manager.drawing_manager)  # Initialize BackButton with drawing manager
+        self.back_button = main_window.canvas_manager.back_button  # Shared BackButton of the canvas
 
     def init_toolbar(self):
         """
@@ -17,9 +17,16 @@ class ToolbarManager:
         toolbar = QToolBar("Tools")
         self.main_window.addToolBar(toolbar)
 
-        # Add Undo button (disabled initially)
+        # Add a Save button; the image is written in the background
+        save_button = QPushButton("Save")
+        save_button.clicked.connect(self.main_window.save_image)
+        toolbar.addWidget(save_button)
+
+        # Add Undo and Redo buttons (disabled initially)
         self.add_undo_button(toolbar)
         self.undo_button.setEnabled(False)
+        self.add_redo_button(toolbar)
+        self.redo_button.setEnabled(False)
 
         # Add tool buttons (Pen, Brush, Line, Eraser, etc.)
         self.add_tool_buttons(toolbar)
@@ -30,8 +37,18 @@ class ToolbarManager:
         # Add Zoom controls
         self.add_zoom_controls(toolbar)
 
-        # Update the state of the undo button
+        # Add Layer controls
+        self.add_layer_controls(toolbar)
+
+        # Add whole-canvas filters
+        self.add_filter_controls(toolbar)
+
+        # Add profiler HUD and trace export
+        self.add_profiler_controls(toolbar)
+
+        # Update the state of the undo button whenever the history changes
         self.update_undo_button()
+        self.back_button.history.listeners.append(self.update_undo_button)
 
     def add_undo_button(self, toolbar):
         """
@@ -42,6 +59,22 @@ class ToolbarManager:
         toolbar.addWidget(undo_button)
         self.undo_button = undo_button
 
+    def add_redo_button(self, toolbar):
+        """
+        Adds the redo button to the toolbar and connects it to the redo functionality.
+        """
+        redo_button = QPushButton("Redo")
+        redo_button.clicked.connect(self.redo_last_action)
+        toolbar.addWidget(redo_button)
+        self.redo_button = redo_button
+
+    def redo_last_action(self):
+        """
+        Trigger the redo functionality and update the undo button state.
+        """
+        self.main_window.tool_selection.back_button.redo()
+        self.update_undo_button()
+
     def undo_last_action(self):
         """
         Trigger the undo functionality and update the undo button state.
@@ -54,10 +87,11 @@ class ToolbarManager:
 
     def update_undo_button(self):
         """
-        Enable or disable the undo button based on whether undo actions are available.
+        Enable or disable the undo and redo buttons based on whether those actions are available.
         """
-        can_undo = self.main_window.tool_selection.back_button.can_undo()
-        self.undo_button.setEnabled(can_undo)
+        back_button = self.main_window.tool_selection.back_button
+        self.undo_button.setEnabled(back_button.can_undo())
+        self.redo_button.setEnabled(back_button.can_redo())
 
     def add_tool_buttons(self, toolbar):
         """
@@ -138,6 +172,94 @@ class ToolbarManager:
         zoom_out_button.clicked.connect(self.main_window.canvas_manager.zoom_out)
         toolbar.addWidget(zoom_out_button)
 
+    def add_layer_controls(self, toolbar):
+        """
+        Adds a layer selector and buttons to add a layer and to show or hide the active one.
+        """
+        toolbar.addWidget(QLabel("Layer:"))
+        self.layer_combo = QComboBox()
+        self.layer_combo.currentIndexChanged.connect(self.select_layer)
+        toolbar.addWidget(self.layer_combo)
+
+        new_layer_button = QPushButton("New Layer")
+        new_layer_button.clicked.connect(self.add_layer)
+        toolbar.addWidget(new_layer_button)
+
+        visibility_button = QPushButton("Show/Hide Layer")
+        visibility_button.clicked.connect(self.toggle_layer_visibility)
+        toolbar.addWidget(visibility_button)
+
+        self.update_layer_combo()
+
+    def add_filter_controls(self, toolbar):
+        """
+        Adds a selector applying a filter to the whole active layer.
+        """
+        toolbar.addWidget(QLabel("Filter:"))
+        self.filter_combo = QComboBox()
+        self.filter_combo.addItem("Choose...")
+        self.filter_combo.addItems(list(PRESETS))
+        self.filter_combo.activated.connect(self.apply_filter)
+        toolbar.addWidget(self.filter_combo)
+
+    def apply_filter(self, combo_index):
+        """
+        Apply the filter chosen in the selector, then show the placeholder again.
+        """
+        if combo_index > 0:
+            self.main_window.apply_filter(self.filter_combo.itemText(combo_index))
+        self.filter_combo.setCurrentIndex(0)
+
+    def add_profiler_controls(self, toolbar):
+        """
+        Adds a button toggling the profiler HUD and one exporting the recorded spans as a Chrome trace.
+        """
+        profiler_button = QPushButton("Profiler")
+        profiler_button.setCheckable(True)
+        profiler_button.clicked.connect(self.main_window.toggle_profiler)
+        toolbar.addWidget(profiler_button)
+
+        export_button = QPushButton("Export Trace")
+        export_button.clicked.connect(self.main_window.export_trace)
+        toolbar.addWidget(export_button)
+
+    def update_layer_combo(self):
+        """
+        List the layers top first and select the active one.
+        """
+        layers = self.main_window.canvas_manager.drawing_manager.layers
+        self.layer_combo.blockSignals(True)
+        self.layer_combo.clear()
+        for layer in reversed(layers.layers):
+            self.layer_combo.addItem(layer.name if layer.visible else f"{layer.name} (hidden)")
+        self.layer_combo.setCurrentIndex(len(layers.layers) - 1 - layers.active_index)
+        self.layer_combo.blockSignals(False)
+
+    def select_layer(self, combo_index):
+        """
+        Make the layer chosen in the selector the one tools draw into.
+        """
+        drawing_manager = self.main_window.canvas_manager.drawing_manager
+        if combo_index >= 0:
+            drawing_manager.set_active_layer(len(drawing_manager.layers.layers) - 1 - combo_index)
+
+    def add_layer(self):
+        """
+        Add a blank layer on top and make it the active one.
+        """
+        layer = self.main_window.canvas_manager.drawing_manager.add_layer()
+        self.update_layer_combo()
+        self.main_window.statusBar().showMessage(f"{layer.name} added")
+
+    def toggle_layer_visibility(self):
+        """
+        Show or hide the active layer.
+        """
+        drawing_manager = self.main_window.canvas_manager.drawing_manager
+        layers = drawing_manager.layers
+        drawing_manager.set_layer_visible(layers.active_index, not layers.active.visible)
+        self.update_layer_combo()
+
     def add_brush_button(self, toolbar, brush_type):
         """
         Helper function to add a brush tool button.
@@ -0,0 +1,336 @@
+import argparse
+import fnmatch
+import json
+import math
+import os
+import sys
+import time
+import numpy as np
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")  # Nothing here opens a window, even if Qt gets imported
+
+from core.headless import HeadlessCanvas
+from core.events import PointerEvent
+from GUI.canvas_manager import CanvasManager
+from tools.pen import Pen
+from tools.pencil import Pencil
+from tools.line import Line
+from tools.shapes import Shapes
+from tools.Brush.brush import Brush
+from tools.Brush.BlurBrush import BlurBrush
+from tools.turtle_tool import TurtleTool
+
+DEFAULT_SIZES = ((800, 600), (2048, 2048), (4096, 4096))
+DEFAULT_ZOOMS = (0.5, 1.0, 2.0)
+VIEW_SIZE = (1280, 800)  # Largest canvas widget the documents are shown in
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_THRESHOLD = 0.25  # Allowed slowdown of a percentile before it counts as a regression
+MIN_DELTA_MS = 0.05  # Slowdowns smaller than this are timer noise, whatever the ratio
+CHECKED_STATS = ("p50", "p95")
+
+TURTLE_PROGRAM = "repeat 36 [ fd 40 rt 170 ]"
+
+
+class Session:
+    def __init__(self, width, height, zoom):
+        """
+        A headless document with the GUI's canvas manager, as the tools see it in the app.
+        :param width: Width of the document.
+        :param height: Height of the document.
+        :param zoom: Zoom factor of the view.
+        """
+        self.canvas = HeadlessCanvas(min(width, VIEW_SIZE[0]), min(height, VIEW_SIZE[1]))
+        self.canvas_manager = CanvasManager(self.canvas, width, height)
+        self.drawing_manager = self.canvas_manager.drawing_manager
+        self.drawing_manager.set_zoom_factor(zoom)
+        self.width = width
+        self.height = height
+
+    def timed(self, action, *args):
+        """Run one event as the render scheduler does (a frame of its own) and return its latency in seconds."""
+        start = time.perf_counter()
+        self.drawing_manager.begin_frame()
+        try:
+            action(*args)
+        finally:
+            self.drawing_manager.end_frame()
+        return time.perf_counter() - start
+
+
+def synthetic_strokes(width, height, count, points, seed=0):
+    """
+    Random-walk strokes that stay inside the visible part of the document.
+    :return: List of (points, 2) int arrays.
+    """
+    rng = np.random.default_rng(seed)
+    visible_width, visible_height = min(width, VIEW_SIZE[0]), min(height, VIEW_SIZE[1])
+    strokes = []
+    for _ in range(count):
+        start = rng.uniform((0, 0), (visible_width, visible_height))
+        steps = rng.normal(0, 6, (points - 1, 2)) + rng.uniform(-6, 6, 2)  # A drift, like a hand-drawn stroke
+        path = np.vstack((start, start + np.cumsum(steps, axis=0)))
+        strokes.append(np.clip(np.rint(path), 0, (visible_width - 1, visible_height - 1)).astype(int))
+    return strokes
+
+
+def drive_tool(make_tool):
+    """Return a scenario that drags a fresh tool through every synthetic stroke and times each event."""
+    def scenario(session, strokes):
+        latencies = []
+        for stroke in strokes:
+            tool = make_tool(session.canvas_manager)
+            events = [PointerEvent(int(x), int(y)) for x, y in stroke]
+            latencies.append(session.timed(tool.on_press, events[0]))
+            for event in events[1:-1]:
+                latencies.append(session.timed(tool.on_drag, event))
+            latencies.append(session.timed(tool.on_release, events[-1]))
+            session.canvas_manager.back_button.save_state()
+        return latencies
+    return scenario
+
+
+def drive_tool_batched(make_tool, frame=4):
+    """
+    Like `drive_tool`, but hand the drags to `on_drag_batch` `frame` events at a time, as the
+    render scheduler does when events arrive faster than the display refresh. Every event
+    is charged an equal share of its frame, so the rows compare with the per-event ones.
+    """
+    def scenario(session, strokes):
+        latencies = []
+        for stroke in strokes:
+            tool = make_tool(session.canvas_manager)
+            points = [(int(x), int(y)) for x, y in stroke]
+            latencies.append(session.timed(tool.on_press, PointerEvent(*points[0])))
+            for start in range(1, len(points) - 1, frame):
+                batch = points[start:min(start + frame, len(points) - 1)]
+                latencies += [session.timed(tool.on_drag_batch, batch) / len(batch)] * len(batch)
+            latencies.append(session.timed(tool.on_release, PointerEvent(*points[-1])))
+            session.canvas_manager.back_button.save_state()
+        return latencies
+    return scenario
+
+
+def turtle_scenario(session, strokes):
+    """Run a turtle program from the start of every stroke; one program is one event."""
+    latencies = []
+    tool = TurtleTool(session.canvas_manager)
+    for stroke in strokes:
+        tool.teleport(*stroke[0])
+        latencies.append(session.timed(tool.run_program, TURTLE_PROGRAM))
+    return latencies
+
+
+def zoom_pan_scenario(session, strokes):
+    """Zoom in and out around the current zoom and pan along every stroke."""
+    latencies = []
+    canvas_manager = session.canvas_manager
+    for stroke in strokes:
+        latencies.append(session.timed(canvas_manager.zoom, 1.25))
+        for (x0, y0), (x1, y1) in zip(stroke[:-1:4], stroke[4::4]):
+            latencies.append(session.timed(canvas_manager.pan, int(x1 - x0), int(y1 - y0)))
+        latencies.append(session.timed(canvas_manager.zoom, 0.8))
+    return latencies
+
+
+def undo_redo_scenario(session, strokes):
+    """Draw every stroke with the pen, then time undoing and redoing all of them."""
+    drive_tool(Pen)(session, strokes)
+    back_button = session.canvas_manager.back_button
+    latencies = [session.timed(back_button.undo) for _ in strokes]
+    latencies += [session.timed(back_button.redo) for _ in strokes]
+    return latencies
+
+
+SCENARIOS = {
+    "pen": drive_tool(Pen),
+    "pencil": drive_tool(Pencil),
+    "line": drive_tool(Line),
+    "shapes.rectangle": drive_tool(lambda manager: Shapes(manager, "rectangle")),
+    "shapes.ellipse": drive_tool(lambda manager: Shapes(manager, "ellipse")),
+    "brush.bristle": drive_tool(lambda manager: Brush(manager, "bristle")),
+    "brush.soft": drive_tool(lambda manager: Brush(manager, "soft")),
+    "brush.textured": drive_tool(lambda manager: Brush(manager, "textured")),
+    "brush.bristle.batched": drive_tool_batched(lambda manager: Brush(manager, "bristle")),
+    "brush.soft.batched": drive_tool_batched(lambda manager: Brush(manager, "soft")),
+    "blur": drive_tool(BlurBrush),
+    "turtle": turtle_scenario,
+    "view.zoom_pan": zoom_pan_scenario,
+    "history.undo_redo": undo_redo_scenario,
+}
+
+
+def summarize(latencies):
+    """Latency percentiles in milliseconds and throughput in events per second."""
+    samples = np.asarray(latencies) * 1000.0
+    p50, p95, p99 = np.percentile(samples, (50, 95, 99))
+    return {"events": len(samples), "p50": float(p50), "p95": float(p95), "p99": float(p99),
+            "max": float(samples.max()), "events_per_second": float(len(samples) / (samples.sum() / 1000.0))}
+
+
+def result_key(name, size, zoom):
+    return f"{name}@{size[0]}x{size[1]}@{zoom:g}x"
+
+
+def run(names, sizes, zooms, strokes=8, points=48, seed=0, report=print):
+    """
+    Run scenarios at every document size and zoom factor.
+    :param names: Scenario names (keys of SCENARIOS).
+    :param sizes: (width, height) document sizes.
+    :param zooms: Zoom factors.
+    :param strokes: Synthetic strokes per scenario.
+    :param points: Events per stroke.
+    :param seed: Seed of the synthetic strokes; the same seed gives the same strokes.
+    :param report: Callback receiving a line of text per finished benchmark.
+    :return: {result_key: summary}.
+    """
+    results = {}
+    for name in names:
+        for size in sizes:
+            for zoom in zooms:
+                session = Session(*size, zoom)
+                latencies = SCENARIOS[name](session, synthetic_strokes(*size, strokes, points, seed))
+                key = result_key(name, size, zoom)
+                results[key] = summarize(latencies)
+                report(format_row(key, results[key]))
+    return results
+
+
+def format_row(key, summary):
+    return (f"{key:<36} {summary['events']:>6} ev  p50 {summary['p50']:8.3f} ms  p95 {summary['p95']:8.3f} ms  "
+            f"p99 {summary['p99']:8.3f} ms  {summary['events_per_second']:10.1f} ev/s")
+
+
+def scaling_curves(results, names, sizes, zooms):
+    """
+    How each scenario's median latency grows with the document size.
+
+    The exponent is the slope of log(p50) over log(pixels) between the smallest and the
+    largest size: about 0 means the cost does not depend on the document size (only on
+    what is touched), 1 means it grows with the pixel count.
+
+    :return: Lines of text, one per scenario and zoom factor.
+    """
+    lines = []
+    sizes = sorted(sizes, key=lambda size: size[0] * size[1])
+    for name in names:
+        for zoom in zooms:
+            medians = [results[result_key(name, size, zoom)]["p50"] for size in sizes]
+            curve = "  ".join(f"{w}x{h}: {median:.3f}" for (w, h), median in zip(sizes, medians))
+            exponent = ""
+            pixels = [w * h for w, h in sizes]
+            if len(sizes) > 1 and pixels[-1] > pixels[0] and min(medians[0], medians[-1]) > 0:
+                slope = math.log(medians[-1] / medians[0]) / math.log(pixels[-1] / pixels[0])
+                exponent = f"  exponent {slope:+.2f}"
+            lines.append(f"{name}@{zoom:g}x  p50 ms  {curve}{exponent}")
+    return lines
+
+
+def load_baseline(path):
+    """Return the stored {result_key: summary}, or None if there is no baseline yet."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file)["results"]
+
+
+def save_baseline(path, results):
+    """Store results as the baseline, merged into the results of benchmarks that were not run."""
+    stored = load_baseline(path) or {}
+    stored.update(results)
+    with open(path, "w") as file:
+        json.dump({"machine": _machine(), "results": stored}, file, indent=2, sort_keys=True)
+
+
+def regressions(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare results with a baseline.
+    :param threshold: Allowed relative slowdown of the checked percentiles, e.g. 0.25 for 25%.
+    :return: Lines of text describing every regression; empty if there is none.
+    """
+    found = []
+    for key, summary in results.items():
+        reference = baseline.get(key)
+        if reference is None:
+            continue
+        for stat in CHECKED_STATS:
+            limit = reference[stat] * (1.0 + threshold)
+            if summary[stat] > limit and summary[stat] - reference[stat] > MIN_DELTA_MS:
+                found.append(f"{key} {stat} {summary[stat]:.3f} ms > {reference[stat]:.3f} ms "
+                             f"(+{summary[stat] / reference[stat] - 1:.0%})")
+    return found
+
+
+def _machine():
+    import platform
+    return {"python": platform.python_version(), "machine": platform.machine(), "processor": platform.processor(),
+            "cpus": os.cpu_count(), "numpy": np.__version__}
+
+
+def _parse_sizes(text):
+    sizes = []
+    for item in text.split(","):
+        width, _, height = item.lower().partition("x")
+        if not width.isdigit() or not height.isdigit():
+            raise ValueError(f"Invalid canvas size {item!r}; expected WIDTHxHEIGHT.")
+        sizes.append((int(width), int(height)))
+    return sizes
+
+
+def _select(patterns):
+    names = [name for name in SCENARIOS if any(fnmatch.fnmatch(name, pattern) for pattern in patterns)]
+    if not names:
+        raise ValueError(f"No benchmark matches {patterns}; available: {', '.join(SCENARIOS)}.")
+    return names
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the drawing tools and rendering without a GUI.")
+    parser.add_argument("patterns", nargs="*", default=["*"], help="Benchmarks to run, e.g. 'brush.*' (default: all).")
+    parser.add_argument("--sizes", default=",".join(f"{w}x{h}" for w, h in DEFAULT_SIZES),
+                        help="Comma-separated document sizes, e.g. 800x600,4096x4096.")
+    parser.add_argument("--zooms", default=",".join(f"{zoom:g}" for zoom in DEFAULT_ZOOMS),
+                        help="Comma-separated zoom factors.")
+    parser.add_argument("--strokes", type=int, default=8, help="Synthetic strokes per benchmark.")
+    parser.add_argument("--points", type=int, default=48, help="Events per stroke.")
+    parser.add_argument("--quick", action="store_true", help="Only the smallest size at 1x, with fewer strokes.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline file to compare with or save to.")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed relative slowdown before a benchmark fails (default 0.25).")
+    args = parser.parse_args(argv)
+
+    try:
+        names = _select(args.patterns)
+        sizes = _parse_sizes(args.sizes)
+        zooms = [float(zoom) for zoom in args.zooms.split(",")]
+    except ValueError as error:
+        parser.error(str(error))
+    if args.quick:
+        sizes, zooms, args.strokes = [min(sizes, key=lambda size: size[0] * size[1])], [1.0], min(args.strokes, 3)
+
+    results = run(names, sizes, zooms, args.strokes, args.points)
+    if len(sizes) > 1:
+        print("\nScaling with the document size:")
+        for line in scaling_curves(results, names, sizes, zooms):
+            print(line)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one.")
+        return 0
+    found = regressions(results, baseline, args.threshold)
+    if found:
+        print(f"\n{len(found)} regression(s) beyond {args.threshold:.0%}:")
+        for line in found:
+            print("  " + line)
+        return 1
+    print(f"\nNo regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
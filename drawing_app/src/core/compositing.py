@@ -0,0 +1,131 @@
+import numpy as np
+from core.dirty_region import intersect, union
+
+
+def blend_over(base, color, coverage, opacity=1.0, out=None):
+    """
+    Alpha-blend a solid colour over `base` with fixed-point integer math.
+
+    Every pixel becomes `(base * (255 - a) + color * a + 127) // 255` with
+    `a = coverage * opacity`, computed in uint16 without any float image.
+
+    :param base: uint8 image of shape (h, w) or (h, w, channels).
+    :param color: Colour to blend in. On a BGRA `base` (a premultiplied layer) it is given
+                  an alpha of 255, so the same formula paints the colour and its coverage.
+    :param coverage: uint8 array of shape (h, w), 255 = fully covered.
+    :param opacity: Extra opacity applied to the coverage (0..1).
+    :param out: Optional array to write to; may be `base` itself.
+    """
+    alpha = coverage.astype(np.uint16)
+    if opacity < 1.0:
+        alpha = (alpha * int(round(opacity * 255)) + 127) // 255
+    if base.ndim == 3:
+        alpha = alpha[..., None]
+        color = np.asarray(tuple(color[:3]) + (255,), dtype=np.uint16)[:base.shape[2]]
+    else:
+        color = np.uint16(color[0] if np.ndim(color) else color)
+    blended = (base.astype(np.uint16) * (255 - alpha) + color * alpha + 127) // 255
+    if out is None:
+        return blended.astype(np.uint8)
+    out[:] = blended
+    return out
+
+
+def blend_pixels(base, pixels, coverage, opacity=1.0, out=None):
+    """
+    Alpha-blend an image over `base` through a coverage mask, with fixed-point integer math.
+
+    Like `blend_over`, but every pixel gets its own colour from `pixels`:
+    `(base * (255 - a) + pixels * a + 127) // 255` with `a = coverage * opacity`.
+
+    :param base: uint8 image of shape (h, w, channels).
+    :param pixels: uint8 image of the same shape to blend in.
+    :param coverage: uint8 array of shape (h, w), 255 = fully covered.
+    :param opacity: Extra opacity applied to the coverage (0..1).
+    :param out: Optional array to write to; may be `base` itself.
+    """
+    alpha = coverage.astype(np.uint16)
+    if opacity < 1.0:
+        alpha = (alpha * int(round(opacity * 255)) + 127) // 255
+    alpha = alpha[..., None]
+    blended = (base.astype(np.uint16) * (255 - alpha) + pixels.astype(np.uint16) * alpha + 127) // 255
+    if out is None:
+        return blended.astype(np.uint8)
+    out[:] = blended
+    return out
+
+
+class StrokeBuffer:
+    def __init__(self, width, height, color, opacity=1.0, padding=64, registry=None):
+        """
+        Per-stroke coverage buffer covering only the part of the document a stroke touched.
+
+        Tools accumulate the stroke's coverage here (e.g. with `np.maximum`, so overlapping
+        segments of one stroke do not build up) and the stroke is blended over the base only
+        when it is displayed or committed, with `blend_over`. The buffer grows with the
+        stroke, in steps of `padding` pixels, and never needs a copy of the base image.
+
+        :param width: Width of the document, to clip the buffer to.
+        :param height: Height of the document, to clip the buffer to.
+        :param color: Colour of the stroke.
+        :param opacity: Opacity the whole stroke is composited with (0..1).
+        :param padding: Extra pixels allocated around the stroke whenever the buffer grows.
+        :param registry: Optional BufferRegistry to report the buffer to (as "previews").
+        """
+        self.width = width
+        self.height = height
+        self.color = tuple(color)
+        self.opacity = opacity
+        self.padding = padding
+        self.registry = registry
+        self.rect = None  # Document rectangle covered by `coverage`
+        self.coverage = None  # uint8 coverage, 255 = fully painted
+        self.painted = None  # Bounds of everything painted so far
+
+    def ensure(self, rect):
+        """
+        Grow the buffer to cover an (x, y, w, h) document rectangle.
+        :return: The rectangle clipped to the document, or None if it lies outside.
+        """
+        rect = intersect(rect, (0, 0, self.width, self.height))
+        if rect is None:
+            return None
+        if self.rect is not None and intersect(rect, self.rect) == rect:
+            return rect
+        grown = rect if self.rect is None else union(self.rect, rect)
+        pad = self.padding
+        grown = intersect((grown[0] - pad, grown[1] - pad, grown[2] + 2 * pad, grown[3] + 2 * pad),
+                          (0, 0, self.width, self.height))
+        coverage = np.zeros((grown[3], grown[2]), dtype=np.uint8)
+        if self.registry is not None:
+            self.registry.track("previews", coverage)
+        if self.rect is not None:
+            x, y, w, h = self.rect
+            coverage[y - grown[1]:y - grown[1] + h, x - grown[0]:x - grown[0] + w] = self.coverage
+        self.rect, self.coverage = grown, coverage
+        return rect
+
+    def flat_index(self, xs, ys):
+        """Indices into `coverage.reshape(-1)` of document pixel coordinates inside `rect`."""
+        return (ys - self.rect[1]) * self.rect[2] + (xs - self.rect[0])
+
+    def mark_painted(self, rect):
+        """Record that coverage changed inside an (x, y, w, h) rectangle."""
+        self.painted = rect if self.painted is None else union(self.painted, rect)
+
+    def composite_into(self, pixels, rect):
+        """
+        Blend the stroke over `pixels`, which hold the document rectangle `rect`.
+        :return: The part of `rect` the stroke overlaps, or None.
+        """
+        if self.painted is None:
+            return None
+        part = intersect(rect, self.painted)
+        if part is None:
+            return None
+        x, y, w, h = part
+        target = pixels[y - rect[1]:y - rect[1] + h, x - rect[0]:x - rect[0] + w]
+        coverage = self.coverage[y - self.rect[1]:y - self.rect[1] + h, x - self.rect[0]:x - self.rect[0] + w]
+        blend_over(target, self.color, coverage, self.opacity, out=target)
+        return part
+
@@ -0,0 +1,137 @@
+import math
+import numpy as np
+
+
+def union(rect_a, rect_b):
+    """Return the smallest (x, y, w, h) rectangle containing both rectangles."""
+    x0 = min(rect_a[0], rect_b[0])
+    y0 = min(rect_a[1], rect_b[1])
+    x1 = max(rect_a[0] + rect_a[2], rect_b[0] + rect_b[2])
+    y1 = max(rect_a[1] + rect_a[3], rect_b[1] + rect_b[3])
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def intersect(rect_a, rect_b):
+    """Return the overlap of two (x, y, w, h) rectangles, or None if they do not overlap."""
+    x0 = max(rect_a[0], rect_b[0])
+    y0 = max(rect_a[1], rect_b[1])
+    x1 = min(rect_a[0] + rect_a[2], rect_b[0] + rect_b[2])
+    y1 = min(rect_a[1] + rect_a[3], rect_b[1] + rect_b[3])
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def scale_rect(rect, factor):
+    """Scale an (x, y, w, h) rectangle outward to whole pixels."""
+    x0 = math.floor(rect[0] * factor)
+    y0 = math.floor(rect[1] * factor)
+    x1 = math.ceil((rect[0] + rect[2]) * factor)
+    y1 = math.ceil((rect[1] + rect[3]) * factor)
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def _touches(rect_a, rect_b):
+    """Check whether two rectangles overlap or share an edge."""
+    return (rect_a[0] <= rect_b[0] + rect_b[2] and rect_b[0] <= rect_a[0] + rect_a[2] and
+            rect_a[1] <= rect_b[1] + rect_b[3] and rect_b[1] <= rect_a[1] + rect_a[3])
+
+
+def points_bounds(points, thickness=1):
+    """
+    Bounding box of a set of points stroked with the given thickness.
+    :param points: Iterable of (x, y) points.
+    :param thickness: Stroke thickness in pixels (negative values mean filled).
+    """
+    points = np.asarray(points).reshape(-1, 2).astype(np.int64)  # One pass, also for long polylines
+    (min_x, min_y), (max_x, max_y) = points.min(axis=0).tolist(), points.max(axis=0).tolist()
+    pad = max(1, abs(int(thickness))) // 2 + 2  # Half the stroke plus room for rounded caps
+    x0, y0 = min_x - pad, min_y - pad
+    return x0, y0, max_x + pad - x0 + 1, max_y + pad - y0 + 1
+
+
+def line_bounds(start_point, end_point, thickness=1):
+    """Bounding box touched by cv2.line between two points."""
+    return points_bounds((start_point, end_point), thickness)
+
+
+def rect_bounds(start_point, end_point, thickness=1):
+    """Bounding box touched by cv2.rectangle between two corners."""
+    return points_bounds((start_point, end_point), thickness)
+
+
+def ellipse_bounds(center_point, axes_lengths, thickness=1):
+    """Bounding box touched by a full cv2.ellipse with the given center and axes."""
+    cx, cy = center_point
+    ax, ay = abs(int(axes_lengths[0])), abs(int(axes_lengths[1]))
+    return points_bounds(((cx - ax, cy - ay), (cx + ax, cy + ay)), thickness)
+
+
+class DirtyRegion:
+    def __init__(self, width, height, max_rects=16):
+        """
+        Collect the canvas rectangles that changed since the last repaint.
+
+        Overlapping or touching rectangles are merged as they are added. Once more than
+        `max_rects` disjoint rectangles are pending they collapse into their bounding box,
+        so a repaint never has to walk a long list of tiny regions.
+
+        :param width: Width of the canvas the rectangles are clipped to.
+        :param height: Height of the canvas the rectangles are clipped to.
+        :param max_rects: Maximum number of disjoint rectangles kept before collapsing.
+        """
+        self.width = width
+        self.height = height
+        self.max_rects = max_rects
+        self.rects = []
+
+    def add(self, rect):
+        """Mark an (x, y, w, h) rectangle as dirty. Rectangles outside the canvas are ignored."""
+        rect = intersect(rect, (0, 0, self.width, self.height))
+        if rect is None:
+            return
+
+        # Merge with every pending rectangle the new one touches
+        merged = True
+        while merged:
+            merged = False
+            for i, other in enumerate(self.rects):
+                if _touches(rect, other):
+                    rect = union(rect, self.rects.pop(i))
+                    merged = True
+                    break
+        self.rects.append(rect)
+
+        if len(self.rects) > self.max_rects:
+            self.rects = [self.bounds()]
+
+    def add_all(self):
+        """Mark the whole canvas as dirty."""
+        self.rects = [(0, 0, self.width, self.height)]
+
+    def bounds(self):
+        """Return the bounding box of all dirty rectangles, or None if nothing is dirty."""
+        if not self.rects:
+            return None
+        rect = self.rects[0]
+        for other in self.rects[1:]:
+            rect = union(rect, other)
+        return rect
+
+    def take(self):
+        """Return the pending dirty rectangles and reset the region."""
+        rects, self.rects = self.rects, []
+        return rects
+
+    def resize(self, width, height):
+        """Change the canvas size the rectangles are clipped to and mark everything dirty."""
+        self.width = width
+        self.height = height
+        self.add_all()
+
+    def __bool__(self):
+        return bool(self.rects)
+
+    def __len__(self):
+        return len(self.rects)
+
@@ -0,0 +1,22 @@
+class PointerEvent:
+    def __init__(self, x, y, pressure=1.0):
+        """
+        Plain pointer event the tools receive, in document coordinates.
+        The Qt adapter (GUI.mouse_events) turns mouse events into these; scripts, tests and
+        worker processes create them directly.
+
+        :param x: Horizontal position in document pixels.
+        :param y: Vertical position in document pixels.
+        :param pressure: Pen pressure (0..1); 1.0 for a mouse.
+        """
+        self.x = x
+        self.y = y
+        self.pressure = pressure
+
+    @property
+    def point(self):
+        """The (x, y) position."""
+        return self.x, self.y
+
+    def __repr__(self):
+        return f"PointerEvent({self.x}, {self.y})"
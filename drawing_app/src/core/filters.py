@@ -0,0 +1,196 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import cv2
+import numpy as np
+from core.dirty_region import intersect
+from core.jobs import Job, NORMAL
+
+CHUNK_SIZE = 512  # Side of the pieces a filter is split into; a multiple of the tile size
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class ImageFilter:
+    def __init__(self, name, apply, halo=0, linear=False):
+        """
+        A whole-image operation that can be computed piecewise.
+
+        :param name: Name shown to the user.
+        :param apply: Callable taking a uint8 BGR region and returning the filtered region of the same shape.
+        :param halo: Pixels of context each output pixel depends on; pieces are read with this margin.
+        :param linear: Whether the operation is linear in the pixel values (blur, sharpen). Linear
+                       filters run on premultiplied BGRA layers directly; others are applied to
+                       the unpremultiplied colour, keeping the alpha.
+        """
+        self.name = name
+        self.halo = halo
+        self.linear = linear
+        self._apply = apply
+
+    def apply(self, pixels):
+        """Filter an opaque BGR region or a premultiplied BGRA region."""
+        if pixels.shape[2] == 3:
+            return self._apply(pixels)
+        if self.linear:
+            out = self._apply(pixels)
+            np.minimum(out[..., :3], out[..., 3:], out=out[..., :3])  # Premultiplied colour never exceeds coverage
+            return out
+        alpha = pixels[..., 3:].astype(np.uint16)
+        colour = np.minimum((pixels[..., :3].astype(np.uint16) * 255 + alpha // 2) // np.maximum(alpha, 1),
+                            255).astype(np.uint8)  # Unpremultiplied; transparent pixels become black
+        out = np.empty_like(pixels)
+        out[..., :3] = (self._apply(colour).astype(np.uint16) * alpha + 127) // 255
+        out[..., 3:] = pixels[..., 3:]
+        return out
+
+
+def gaussian_blur(radius=4):
+    """Gaussian blur with a (2 * radius + 1) kernel."""
+    size = 2 * radius + 1
+    return ImageFilter("Blur", lambda pixels: cv2.GaussianBlur(pixels, (size, size), 0), halo=radius, linear=True)
+
+
+def sharpen(amount=1.0, radius=2):
+    """Unsharp mask: add `amount` times the difference to a Gaussian blur."""
+    size = 2 * radius + 1
+
+    def apply(pixels):
+        blurred = cv2.GaussianBlur(pixels, (size, size), 0)
+        return cv2.addWeighted(pixels, 1.0 + amount, blurred, -amount, 0)
+
+    return ImageFilter("Sharpen", apply, halo=radius, linear=True)
+
+
+def _lut_filter(name, table):
+    table = np.clip(np.rint(table), 0, 255).astype(np.uint8)
+    return ImageFilter(name, lambda pixels: cv2.LUT(pixels, table))
+
+
+def brightness_contrast(brightness=0, contrast=1.0):
+    """Scale the values around mid-grey by `contrast`, then add `brightness`."""
+    values = np.arange(256, dtype=np.float64)
+    return _lut_filter("Brightness/Contrast", (values - 128) * contrast + 128 + brightness)
+
+
+def invert():
+    return _lut_filter("Invert", 255 - np.arange(256))
+
+
+def posterize(levels=4):
+    """Reduce every channel to `levels` evenly spaced values."""
+    if levels < 2:
+        raise ValueError("Posterize needs at least 2 levels.")
+    step = 255 / (levels - 1)
+    return _lut_filter("Posterize", np.round(np.arange(256) / step) * step)
+
+
+def threshold(value=128):
+    """Set every channel to 255 above `value` and to 0 otherwise."""
+    return _lut_filter("Threshold", np.where(np.arange(256) > value, 255, 0))
+
+
+# Filters offered in the GUI, with their default settings
+PRESETS = {
+    "Blur": lambda: gaussian_blur(4),
+    "Sharpen": lambda: sharpen(1.0, 2),
+    "Brighten": lambda: brightness_contrast(brightness=30),
+    "Darken": lambda: brightness_contrast(brightness=-30),
+    "More Contrast": lambda: brightness_contrast(contrast=1.3),
+    "Invert": invert,
+    "Posterize": lambda: posterize(4),
+    "Threshold": lambda: threshold(128),
+}
+
+
+def filter_pool():
+    """Thread pool shared by all filters, one thread per CPU; OpenCV releases the GIL, so pieces run in parallel."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix='filter')
+        return _pool
+
+
+def filter_tiles(tiles, rect, image_filter, chunk_size=CHUNK_SIZE, progress=None, pool=None):
+    """
+    Filter a rectangle of a TileStore in parallel pieces, without modifying it.
+
+    The rectangle is split into chunks; each is read with a halo of `image_filter.halo`
+    pixels (clipped at the document edges), filtered on the pool, and cropped back to the
+    chunk, so the pieces stitch together without seams. Chunks whose whole halo is blank
+    are not filtered: their result is the filtered background colour, and nothing is
+    returned for them when that equals the background.
+
+    :param tiles: TileStore to read; it must not change while the filter runs.
+    :param rect: (x, y, w, h) rectangle to filter.
+    :param image_filter: ImageFilter to apply.
+    :param chunk_size: Side of the chunks.
+    :param progress: Optional callback receiving the finished fraction (0..1); an exception
+                     it raises cancels the chunks not started yet and is passed on.
+    :param pool: Executor to use (defaults to `filter_pool()`).
+    :return: List of (origin, pixels) to write back.
+    """
+    rect = intersect(rect, (0, 0, tiles.width, tiles.height))
+    if rect is None:
+        return []
+    document = (0, 0, tiles.width, tiles.height)
+    halo = image_filter.halo
+    background = np.array(tiles.background_color, dtype=np.uint8).reshape(1, 1, -1)
+    filtered_background = image_filter.apply(background)[0, 0]
+    background_changes = not np.array_equal(filtered_background, background[0, 0])
+
+    results = []
+    chunks = []
+    x0, y0, width, height = rect
+    for y in range(y0, y0 + height, chunk_size):
+        for x in range(x0, x0 + width, chunk_size):
+            chunk = intersect((x, y, chunk_size, chunk_size), rect)
+            source = intersect((chunk[0] - halo, chunk[1] - halo, chunk[2] + 2 * halo, chunk[3] + 2 * halo), document)
+            if not tiles.is_blank(source):
+                chunks.append((chunk, source))
+            elif background_changes:
+                results.append((chunk[:2], np.full((chunk[3], chunk[2], tiles.channels), filtered_background,
+                                                   dtype=np.uint8)))
+
+    pool = pool or filter_pool()
+    futures = [pool.submit(_filter_chunk, tiles, chunk, source, image_filter) for chunk, source in chunks]
+    try:
+        for done, future in enumerate(as_completed(futures), start=1):
+            results.append(future.result())
+            if progress is not None:
+                progress(done / len(futures))
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+    return results
+
+
+def _filter_chunk(tiles, chunk, source, image_filter):
+    filtered = image_filter.apply(tiles.read(source))
+    x, y, width, height = chunk
+    offset_x, offset_y = x - source[0], y - source[1]
+    return (x, y), filtered[offset_y:offset_y + height, offset_x:offset_x + width]
+
+
+class FilterJob(Job):
+    kind = "filter"
+
+    def __init__(self, tiles, rect, image_filter, priority=NORMAL):
+        """
+        Background job filtering a snapshot of a layer; see DrawingManager.filter_job.
+        :param tiles: TileStore snapshot (see TileStore.copy) that nothing else writes to.
+        :param rect: (x, y, w, h) rectangle to filter.
+        :param image_filter: ImageFilter to apply.
+        """
+        super().__init__(priority)
+        self.tiles = tiles
+        self.rect = rect
+        self.image_filter = image_filter
+
+    def run(self):
+        self.set_progress(0.0, self.image_filter.name)
+        return filter_tiles(self.tiles, self.rect, self.image_filter,
+                            progress=lambda fraction: self.set_progress(fraction, self.image_filter.name))
@@ -0,0 +1,41 @@
+import numpy as np
+
+
+class FrameBuffer:
+    def __init__(self, width, height, background_color=(255, 255, 255)):
+        """
+        Persistent BGR display buffer the view is rendered into.
+
+        It holds no GUI objects, so rendering works without a display; the Qt canvas wraps
+        the same memory in a QImage (see GUI.display_bridge.DisplayBridge).
+
+        :param width: Width of the display buffer in pixels.
+        :param height: Height of the display buffer in pixels.
+        :param background_color: Initial fill colour of the buffer (BGR).
+        """
+        self.width = width
+        self.height = height
+        self.buffer = np.empty((height, width, 3), dtype=np.uint8)
+        self.buffer[:] = background_color
+
+    def write(self, region: np.ndarray, x: int, y: int):
+        """
+        Copy a BGR image region into the buffer at (x, y), clipped to the buffer bounds.
+        Works directly on non-contiguous views, so cropped images need no extra copy.
+        :return: The (x, y, w, h) rectangle that was written, or None if nothing was visible.
+        """
+        height, width = region.shape[:2]
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(self.width, x + width), min(self.height, y + height)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        self.buffer[y0:y1, x0:x1] = region[y0 - y:y1 - y, x0 - x:x1 - x]
+        return x0, y0, x1 - x0, y1 - y0
+
+    def view(self, x: int, y: int, width: int, height: int) -> np.ndarray:
+        """Return a writable view of part of the buffer for rendering into it in place."""
+        return self.buffer[y:y + height, x:x + width]
+
+    def fill(self, color):
+        """Fill the whole buffer with a single BGR colour."""
+        self.buffer[:] = color
@@ -0,0 +1,55 @@
+from core.dirty_region import union
+from core.frame_buffer import FrameBuffer
+
+
+class HeadlessCanvas:
+    def __init__(self, width=800, height=600):
+        """
+        Display target for a DrawingManager without any window or GUI toolkit.
+
+        It offers the same surface as GUI.canvas_widget.CanvasWidget: the view is rendered
+        into a numpy FrameBuffer, and repainted areas are collected in `damage` instead of
+        being scheduled on a widget, so the rendering core runs on servers, in tests and in
+        multiprocessing workers.
+
+        :param width: Width of the view in pixels.
+        :param height: Height of the view in pixels.
+        """
+        self._width = width
+        self._height = height
+        self.bridge = FrameBuffer(width, height)
+        self.shape_previews = []  # Shape previews are only drawn by GUI canvases
+        self.view = None
+        self.profiler = None  # Set by the DrawingManager
+        self.damage = None  # Bounds of the view area repainted since the last `take_damage`
+
+    def width(self):
+        return self._width
+
+    def height(self):
+        return self._height
+
+    def set_image(self, image):
+        """Upload a full BGR image into the frame buffer."""
+        self.update_region(image, 0, 0)
+
+    def update_region(self, image, x, y):
+        """Upload a BGR image region into the frame buffer."""
+        written = self.bridge.write(image, x, y)
+        if written is not None:
+            self.mark_updated(*written)
+
+    def mark_updated(self, x, y, width, height):
+        """Record an area whose pixels were rendered into the frame buffer."""
+        rect = (x, y, width, height)
+        self.damage = rect if self.damage is None else union(self.damage, rect)
+
+    def take_damage(self):
+        """Return and reset the bounds of the view area repainted since the last call, or None."""
+        damage, self.damage = self.damage, None
+        return damage
+
+    @property
+    def image(self):
+        """The rendered view as a BGR numpy array (not a copy)."""
+        return self.bridge.buffer
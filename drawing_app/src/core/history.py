@@ -0,0 +1,249 @@
+import numpy as np
+from core.dirty_region import union
+from core.journal import STATE, SPILL, JournalError
+
+
+class TileHistory:
+    def __init__(self, tiles, max_bytes=256 * 1024 * 1024, journal=None):
+        """
+        Undo/redo history that stores only the tiles each operation changed.
+
+        The TileStore reports every tile right before it is modified; the first time a tile
+        is touched during an operation its previous pixels are copied. `checkpoint` closes
+        the operation: tiles that ended up unchanged are dropped, and an operation that
+        changed nothing (e.g. a tool switch) leaves no entry at all. Entries are evicted
+        oldest first once the stored pixels exceed `max_bytes`. Every layer of the document
+        is recorded through the same history (see `track`), so keys are
+        (tile_x, tile_y, layer_id) and one operation may span several layers.
+
+        With a `journal`, every change is also appended to it for crash recovery, and the
+        oldest undo entries spill into the journal file instead of being dropped; they are
+        paged back in when undo reaches them. An entry that cannot be paged back in (its
+        journal write failed) is dropped together with every older one, since undoing past
+        it would mix tiles of different points in time. When the journal outgrows its size
+        limit, it is compacted from a snapshot of the document.
+
+        :param tiles: The TileStore of the bottom layer (layer id 0) to record.
+        :param max_bytes: Budget for the tile pixels kept in memory by undo and redo entries.
+        :param journal: Optional core.journal.Journal to log changes and spill entries to.
+        """
+        self.stores = {}  # layer_id -> TileStore
+        self.max_bytes = max_bytes
+        self.journal = journal
+        self.undo_stack = []  # Entries: {(tile_x, tile_y, layer_id): pixels or None for a blank tile}
+        self.redo_stack = []
+        self.listeners = []  # Callbacks run whenever can_undo/can_redo may have changed
+        self._pending = {}  # Tiles of the open operation and their pixels before it started
+        self._restoring = False
+        self._nbytes = 0
+        self.track(0, tiles)
+
+    def track(self, layer_id, tiles):
+        """Record the changes of a layer's TileStore under `layer_id`."""
+        self.stores[layer_id] = tiles
+        tiles.before_change = lambda tile_x, tile_y: self._record(tile_x, tile_y, layer_id)
+
+    def untrack(self, layer_id):
+        """
+        Stop recording a layer, e.g. when it is deleted.
+        Stored entries keep its tiles, but undo and redo skip them.
+        """
+        tiles = self.stores.pop(layer_id, None)
+        if tiles is not None:
+            tiles.before_change = None
+        self._pending = {key: before for key, before in self._pending.items() if key[2] != layer_id}
+
+    @property
+    def nbytes(self):
+        """Bytes held by the stored tile pixels, including the open operation."""
+        return self._nbytes + _entry_bytes(self._pending)
+
+    def _record(self, tile_x, tile_y, layer_id):
+        """TileStore hook: keep the pixels of a tile before its first change in the open operation."""
+        key = (tile_x, tile_y, layer_id)
+        if self._restoring or key in self._pending:
+            return
+        self._pending[key] = self._snapshot(key)
+        if len(self._pending) == 1:
+            self._notify()
+
+    def _snapshot(self, key):
+        tile = self.stores[key[2]].get_tile(key[0], key[1])
+        return None if tile is None else np.array(tile)
+
+    def checkpoint(self):
+        """
+        Close the open operation and push it as one undo step.
+        :return: True if the operation changed any pixels.
+        """
+        entry = {key: before for key, before in self._pending.items()
+                 if not _same_pixels(before, self.stores[key[2]].get_tile(key[0], key[1]))}
+        self._pending = {}
+        if not entry:
+            return False
+        self.undo_stack.append(entry)
+        self._nbytes += _entry_bytes(entry)
+        self._log({key: self._snapshot(key) for key in entry})
+        self._drop_redo()
+        self._evict()
+        self._notify()
+        return True
+
+    def undo(self):
+        """
+        Undo the last operation, patching only its tiles.
+        :return: The (x, y, w, h) document rectangle that changed, or None if there was nothing to undo.
+        """
+        self.checkpoint()
+        if not self.undo_stack:
+            return None
+        entry = self.undo_stack.pop()
+        if isinstance(entry, _SpilledEntry):
+            try:
+                entry = self.journal.read(entry.record)  # Deep undo: page the entry back in
+            except JournalError:
+                self._drop_undo()
+                self._notify()
+                return None
+        else:
+            self._nbytes -= _entry_bytes(entry)
+        redo_entry, rect = self._swap(entry)
+        self.redo_stack.append(redo_entry)
+        self._nbytes += _entry_bytes(redo_entry)
+        self._evict()
+        self._notify()
+        return rect
+
+    def redo(self):
+        """
+        Redo the last undone operation.
+        :return: The (x, y, w, h) document rectangle that changed, or None if there was nothing to redo.
+        """
+        self.checkpoint()
+        if not self.redo_stack:
+            return None
+        entry = self.redo_stack.pop()
+        self._nbytes -= _entry_bytes(entry)
+        undo_entry, rect = self._swap(entry)
+        self.undo_stack.append(undo_entry)
+        self._nbytes += _entry_bytes(undo_entry)
+        self._notify()
+        return rect
+
+    def restore(self, tiles):
+        """
+        Write tiles into the store without recording them, e.g. when recovering a session.
+        :return: The (x, y, w, h) document rectangle that changed, or None.
+        """
+        return self._swap(tiles, log=False)[1]
+
+    def _swap(self, entry, log=True):
+        """Write an entry's tiles into the store and return the replaced tiles and their bounds."""
+        replaced = {}
+        rect = None
+        self._restoring = True
+        try:
+            for key, pixels in entry.items():
+                tiles = self.stores.get(key[2])
+                if tiles is None:
+                    continue  # The layer was deleted
+                replaced[key] = self._snapshot(key)
+                tiles.restore_tile(key[0], key[1], pixels)
+                tile_rect = tiles.tile_rect(key[0], key[1])
+                rect = tile_rect if rect is None else union(rect, tile_rect)
+        finally:
+            self._restoring = False
+        if log:
+            self._log(entry)
+        return replaced, rect
+
+    def _log(self, tiles):
+        """Append the new contents of changed tiles to the journal (the arrays must not change later)."""
+        if self.journal is not None and tiles:
+            self.journal.append(STATE, tiles)
+            if self.journal.needs_compaction:
+                self.journal.compact(self.snapshot(), [entry.record for entry in self.undo_stack
+                                                       if isinstance(entry, _SpilledEntry)])
+
+    def snapshot(self):
+        """Return copies of every allocated tile of the recorded layers, keyed like the entries."""
+        return {(tile_x, tile_y, layer_id): np.array(tiles.get_tile(tile_x, tile_y))
+                for layer_id, tiles in self.stores.items() for tile_x, tile_y in tiles.allocated_tiles()}
+
+    def can_undo(self):
+        """Check if there is an operation to undo, including the one still open."""
+        return bool(self.undo_stack or self._pending)
+
+    def can_redo(self):
+        """Check if there is an undone operation to redo."""
+        return bool(self.redo_stack)
+
+    def clear(self):
+        """Forget all undo and redo steps and the open operation."""
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self._pending = {}
+        self._nbytes = 0
+        self._notify()
+
+    def _drop_undo(self):
+        for entry in self.undo_stack:
+            self._nbytes -= _entry_bytes(entry)
+        self.undo_stack.clear()
+
+    def _drop_redo(self):
+        for entry in self.redo_stack:
+            self._nbytes -= _entry_bytes(entry)
+        self.redo_stack.clear()
+
+    def shrink(self, max_bytes):
+        """Evict entries as if the budget were `max_bytes`, e.g. when the session runs low on memory."""
+        budget, self.max_bytes = self.max_bytes, min(self.max_bytes, max_bytes)
+        try:
+            self._evict()
+        finally:
+            self.max_bytes = budget
+
+    def _evict(self):
+        """
+        Free memory until the stored pixels fit the budget: spill the oldest undo entries to
+        the journal if there is one, otherwise drop redo entries and then the oldest undo entries.
+        """
+        while self._nbytes > self.max_bytes:
+            oldest = 0
+            while oldest < len(self.undo_stack) and isinstance(self.undo_stack[oldest], _SpilledEntry):
+                oldest += 1
+            spillable = oldest < len(self.undo_stack) - 1  # The newest entry always stays in memory
+            if self.journal is not None and spillable:
+                entry = self.undo_stack[oldest]
+                self._nbytes -= _entry_bytes(entry)
+                self.undo_stack[oldest] = _SpilledEntry(self.journal.append(SPILL, entry))
+            elif self.redo_stack:
+                self._nbytes -= _entry_bytes(self.redo_stack.pop(0))
+            elif spillable:
+                self._nbytes -= _entry_bytes(self.undo_stack.pop(oldest))
+            else:
+                break
+
+    def _notify(self):
+        for listener in self.listeners:
+            listener()
+
+
+class _SpilledEntry:
+    """Undo entry whose pixels live in the journal file."""
+
+    def __init__(self, record):
+        self.record = record
+
+
+def _same_pixels(before, after):
+    if before is None or after is None:
+        return before is None and after is None
+    return np.array_equal(before, after)
+
+
+def _entry_bytes(entry):
+    if isinstance(entry, _SpilledEntry):
+        return 0
+    return sum(pixels.nbytes for pixels in entry.values() if pixels is not None)
@@ -0,0 +1,243 @@
+import heapq
+import itertools
+import os
+import threading
+import cv2
+
+LOW = 0
+NORMAL = 1
+HIGH = 2  # Work a stroke in progress waits for, e.g. blur levels
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's `run` when it notices it was cancelled."""
+
+
+class Job:
+    kind = "job"  # Name of the job type, e.g. to cancel every job of a kind
+
+    def __init__(self, priority=NORMAL):
+        """
+        Unit of background work; subclasses implement `run` and set `kind`.
+
+        `run` executes on a worker thread and must not touch widgets. It reports progress
+        with `set_progress`, which also raises JobCancelled once the job was cancelled, so
+        long jobs stop at their next progress report. Listeners are called through the
+        service's `dispatch`, which in the GUI delivers them on the GUI thread.
+
+        :param priority: LOW, NORMAL or HIGH; higher priorities leave the queue first.
+        """
+        self.priority = priority
+        self.state = PENDING
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.progress_listeners = []  # Callbacks receiving (job, fraction, message)
+        self.done_listeners = []  # Callbacks receiving the job once it is done, failed or cancelled
+        self.service = None
+        self._cancelled = threading.Event()
+        self._finished = threading.Event()
+
+    def run(self):
+        """Do the work on a worker thread and return the result."""
+        raise NotImplementedError
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def finished(self):
+        return self._finished.is_set()
+
+    def cancel(self):
+        """Ask the job to stop; a pending job never starts, a running one stops at its next progress report."""
+        self._cancelled.set()
+
+    def check_cancelled(self):
+        """Raise JobCancelled if the job was cancelled."""
+        if self._cancelled.is_set():
+            raise JobCancelled()
+
+    def set_progress(self, fraction, message=None):
+        """Report progress (0..1) from `run`; raises JobCancelled once the job was cancelled."""
+        self.check_cancelled()
+        self.progress = fraction
+        if self.progress_listeners:
+            self.service.dispatch(self._notify_progress, fraction, message)
+
+    def wait(self, timeout=None):
+        """
+        Block until the job finished.
+        :return: The result of `run`.
+        :raises JobCancelled: If the job was cancelled.
+        :raises Exception: The error `run` raised.
+        """
+        if not self._finished.wait(timeout):
+            raise TimeoutError(f"{self.kind} job did not finish in {timeout} s.")
+        if self.state == CANCELLED:
+            raise JobCancelled()
+        if self.state == FAILED:
+            raise self.error
+        return self.result
+
+    def _notify_progress(self, fraction, message):
+        for listener in self.progress_listeners:
+            listener(self, fraction, message)
+
+    def _notify_done(self):
+        for listener in self.done_listeners:
+            listener(self)
+
+
+class FunctionJob(Job):
+    def __init__(self, kind, function, *args, priority=NORMAL, **kwargs):
+        """
+        Job running a plain function with the given arguments.
+        :param kind: Name of the job type.
+        :param function: Callable to run on a worker thread.
+        """
+        super().__init__(priority)
+        self.kind = kind
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+
+    def run(self):
+        return self.function(*self.args, **self.kwargs)
+
+
+class SaveImageJob(Job):
+    kind = "save"
+
+    def __init__(self, pixels, path, priority=NORMAL):
+        """
+        Encode and write an image; the format follows the file extension.
+        :param pixels: BGR image; it is not copied, so pass a snapshot.
+        :param path: File to write.
+        """
+        super().__init__(priority)
+        self.pixels = pixels
+        self.path = path
+
+    def run(self):
+        extension = os.path.splitext(self.path)[1] or ".png"
+        ok, encoded = cv2.imencode(extension, self.pixels)
+        if not ok:
+            raise ValueError(f"Cannot encode an image as {extension!r}.")
+        self.set_progress(0.5, "Writing")
+        temporary = self.path + ".part"
+        with open(temporary, "wb") as file:
+            file.write(encoded.tobytes())
+        os.replace(temporary, self.path)  # Never leave a half-written file under the real name
+        self.set_progress(1.0)
+        return self.path
+
+
+class JobService:
+    def __init__(self, workers=None, dispatch=None):
+        """
+        Priority queue of background jobs run by a pool of worker threads.
+
+        Heavy numpy and OpenCV calls release the GIL, so jobs run in parallel with drawing.
+        Workers are started on the first submit. Listeners of jobs are called through
+        `dispatch(function, *args)`; the default calls them right away on the worker
+        thread, and the GUI replaces it with one that queues them to the GUI thread.
+
+        :param workers: Number of worker threads (defaults to the number of CPUs, at most 8).
+        :param dispatch: Callable delivering listener calls, see above.
+        """
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.dispatch = dispatch or _call
+        self.active = []  # Jobs submitted and not finished yet, in submission order
+        self._queue = []  # Heap of (-priority, sequence, job)
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._threads = []
+        self._closed = False
+
+    def submit(self, job):
+        """
+        Queue a job.
+        :return: The job, to wait for, cancel or add listeners to.
+        """
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("The job service was shut down.")
+            job.service = self
+            self.active.append(job)
+            heapq.heappush(self._queue, (-job.priority, next(self._sequence), job))
+            if len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f'job-worker-{len(self._threads)}', daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            self._condition.notify()
+        return job
+
+    def run(self, kind, function, *args, priority=NORMAL, **kwargs):
+        """Submit a plain function as a FunctionJob."""
+        return self.submit(FunctionJob(kind, function, *args, priority=priority, **kwargs))
+
+    def jobs(self, kind=None):
+        """Return the unfinished jobs, optionally only those of one kind."""
+        with self._condition:
+            return [job for job in self.active if kind is None or job.kind == kind]
+
+    def cancel(self, kind=None):
+        """Cancel every unfinished job, or those of one kind."""
+        for job in self.jobs(kind):
+            job.cancel()
+
+    def shutdown(self, cancel=True, wait=True):
+        """
+        Stop accepting jobs and let the workers exit once the queue is empty.
+        :param cancel: Cancel the jobs that did not finish yet.
+        :param wait: Wait for the running jobs to return.
+        """
+        if cancel:
+            self.cancel()
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._closed:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                _, _, job = heapq.heappop(self._queue)
+            self._execute(job)
+
+    def _execute(self, job):
+        if job.cancelled:
+            job.state = CANCELLED
+        else:
+            job.state = RUNNING
+            try:
+                job.result = job.run()
+                job.state = DONE
+            except JobCancelled:
+                job.state = CANCELLED
+            except Exception as e:
+                job.error = e
+                job.state = FAILED
+        with self._condition:
+            self.active.remove(job)
+        job._finished.set()
+        if job.done_listeners:
+            self.dispatch(job._notify_done)
+
+
+def _call(function, *args):
+    function(*args)
@@ -0,0 +1,370 @@
+import logging
+import os
+import queue
+import re
+import struct
+import threading
+import zlib
+import numpy as np
+
+_MAGIC = b'TJNL'
+_VERSION = 2
+_HEADER = struct.Struct('<4sHIIHB')  # magic, version, width, height, tile_size, channels of the bottom layer
+_RECORD = struct.Struct('<BI')  # kind, compressed payload length
+_TILE = struct.Struct('<IIIBB')  # tile_x, tile_y, layer_id, channels, blank flag
+
+STATE = 1  # New contents of the tiles an operation, undo or redo changed
+SPILL = 2  # Pixels of an undo entry moved out of memory
+
+logger = logging.getLogger(__name__)
+
+
+class JournalError(OSError):
+    """Raised when a record cannot be read back because it could not be written."""
+
+
+class JournalRecord:
+    """
+    Handle to a record; `offset` is known once the writer thread has written it.
+    `written` is set once the writer is done with the record, also when writing it failed (see `error`).
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.offset = None
+        self.error = None  # Exception that kept the record from being written
+        self.written = threading.Event()
+
+
+class Journal:
+    def __init__(self, path, width, height, tile_size, channels, compress_level=1, max_bytes=512 * 1024 * 1024):
+        """
+        Append-only on-disk journal of tile deltas, written by a background thread.
+
+        `append` only queues the tiles, so the GUI thread never waits for compression or
+        disk IO. The file starts with the document geometry, followed by zlib-compressed
+        records of changed tiles; replaying its STATE records rebuilds the document after a
+        crash. An existing journal at `path` is kept as `path + '.prev'` until the first
+        record of the new one is on disk, so a crash during startup loses nothing.
+
+        The file only grows while the session runs. Once it passes `max_bytes`,
+        `needs_compaction` turns true and the owner (TileHistory) hands `compact` a snapshot
+        of the document: the file is then rewritten from that snapshot plus the spilled
+        records still in use. If those alone exceed half the limit, the limit is raised to
+        twice the compacted size, so the file is never rewritten over and over.
+
+        Records that cannot be written are marked with their error and reported to the
+        logger and to `error_listeners`; reading them back raises JournalError.
+
+        :param path: File to write the journal to.
+        :param width: Width of the document.
+        :param height: Height of the document.
+        :param tile_size: Size of the document tiles.
+        :param channels: Number of colour channels per pixel of the bottom layer.
+        :param compress_level: zlib compression level of the records.
+        :param max_bytes: File size at which the journal asks to be compacted, or None to let it grow.
+        """
+        self.path = path
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.channels = channels
+        self.compress_level = compress_level
+        self.max_bytes = max_bytes
+        self.error_listeners = []  # Callbacks receiving (record, error) when a record could not be written
+        self.size = _HEADER.size  # Bytes written to the file so far
+        self._compact_at = max_bytes
+        self._compacting = False
+        if os.path.exists(path):
+            os.replace(path, path + '.prev')
+        self._file = open(path, 'wb')
+        self._file.write(self._header())
+        self._file.flush()
+        self._reader = open(path, 'rb')
+        self._read_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='journal-writer', daemon=True)
+        self._thread.start()
+
+    def append(self, kind, tiles):
+        """
+        Queue a record without blocking.
+        :param kind: STATE or SPILL.
+        :param tiles: {(tile_x, tile_y, layer_id): pixels or None for a blank tile}; the arrays must not change afterwards.
+        :return: A JournalRecord to read the tiles back with.
+        """
+        record = JournalRecord(kind)
+        self._queue.put((record, tiles))
+        return record
+
+    def read(self, record):
+        """
+        Read the tiles of a record back, waiting for the writer if it is not on disk yet.
+        :raises JournalError: If the record could not be written or read back.
+        """
+        record.written.wait()
+        if record.error is not None:
+            raise JournalError(f"Journal record was not written: {record.error}") from record.error
+        try:
+            with self._read_lock:
+                self._reader.seek(record.offset)
+                kind, tiles = _read_record(self._reader, self.tile_size)
+        except (OSError, struct.error, zlib.error, ValueError) as e:
+            raise JournalError(f"Journal record could not be read: {e}") from e
+        return tiles
+
+    @property
+    def needs_compaction(self):
+        """Whether the file passed its size limit and no compaction is queued yet."""
+        return self._compact_at is not None and self.size > self._compact_at and not self._compacting
+
+    def compact(self, snapshot, records):
+        """
+        Queue a rewrite of the file that drops every record before it.
+        :param snapshot: {(tile_x, tile_y, layer_id): pixels} of every allocated tile of the document now;
+                         the arrays must not change afterwards.
+        :param records: JournalRecords still in use, e.g. by spilled undo entries; they are copied
+                        into the new file and their offsets updated.
+        """
+        self._compacting = True
+        self._queue.put(_Compaction(snapshot, list(records)))
+
+    def flush(self):
+        """Block until every queued record is on disk."""
+        self._queue.join()
+
+    def close(self, discard=False):
+        """
+        Write the remaining records and stop the writer thread.
+        :param discard: Delete the journal, e.g. after a clean shutdown.
+        """
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+        self._reader.close()
+        if discard:
+            discard_journal(self.path)
+
+    def _header(self):
+        return _HEADER.pack(_MAGIC, _VERSION, self.width, self.height, self.tile_size, self.channels)
+
+    def _run(self):
+        first = True
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if isinstance(item, _Compaction):
+                    self._compact(item)
+                    continue
+                record, tiles = item
+                try:
+                    payload = zlib.compress(_encode_tiles(tiles), self.compress_level)
+                    record.offset = _write_record(self._file, record.kind, payload)
+                    self.size = self._file.tell()
+                except Exception as e:
+                    self._failed(record, e)
+                    continue
+                record.written.set()
+                if first:
+                    # The new journal is self-contained from its first record on
+                    os.fsync(self._file.fileno())
+                    if os.path.exists(self.path + '.prev'):
+                        os.remove(self.path + '.prev')
+                    first = False
+            finally:
+                self._queue.task_done()
+
+    def _failed(self, record, error):
+        """Mark a record as lost, so readers raise instead of waiting for it forever, and report it."""
+        record.error = error
+        record.written.set()
+        logger.error("Journal write failed: %s", error)
+        for listener in self.error_listeners:
+            listener(record, error)
+
+    def _compact(self, compaction):
+        """Rewrite the file as a snapshot followed by copies of the records still in use."""
+        temporary = self.path + '.compact'
+        try:
+            offsets = []
+            with open(temporary, 'wb') as file:
+                file.write(self._header())
+                _write_record(file, STATE, zlib.compress(_encode_tiles(compaction.snapshot), self.compress_level))
+                for record in compaction.records:
+                    if record.error is not None:
+                        continue
+                    with self._read_lock:
+                        self._reader.seek(record.offset)
+                        kind, length = _RECORD.unpack(self._reader.read(_RECORD.size))
+                        payload = self._reader.read(length)
+                    offsets.append((record, _write_record(file, kind, payload)))
+                file.flush()
+                os.fsync(file.fileno())
+            with self._read_lock:
+                self._file.close()
+                self._reader.close()
+                try:
+                    os.replace(temporary, self.path)
+                finally:
+                    self._file = open(self.path, 'ab')
+                    self._reader = open(self.path, 'rb')
+                for record, offset in offsets:
+                    record.offset = offset
+            self.size = self._file.tell()
+            if self.max_bytes is not None:
+                self._compact_at = max(self.max_bytes, 2 * self.size)
+        except Exception as e:
+            logger.error("Journal compaction failed: %s", e)
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        finally:
+            self._compacting = False
+
+
+class _Compaction:
+    """Queue item asking the writer thread to rewrite the file."""
+
+    def __init__(self, snapshot, records):
+        self.snapshot = snapshot
+        self.records = records
+
+
+def read_journal(path):
+    """
+    Read a journal file, stopping at a record truncated by a crash.
+    :return: ((width, height, tile_size, channels), [(kind, tiles), ...]), or None if the file is unusable.
+    """
+    try:
+        with open(path, 'rb') as file:
+            header = file.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return None
+            magic, version, width, height, tile_size, channels = _HEADER.unpack(header)
+            if magic != _MAGIC or version != _VERSION:
+                return None
+            records = []
+            while True:
+                try:
+                    record = _read_record(file, tile_size)
+                except (struct.error, zlib.error, ValueError):
+                    break  # Truncated tail of a crashed session
+                if record is None:
+                    break
+                records.append(record)
+    except OSError:
+        return None
+    return (width, height, tile_size, channels), records
+
+
+def find_journal(path):
+    """Return the readable journal of the last session at `path` (or its `.prev` copy), or None."""
+    for candidate in (path, path + '.prev'):
+        if os.path.exists(candidate):
+            journal = read_journal(candidate)
+            if journal is not None and journal[1]:
+                return journal
+    return None
+
+
+def discard_journal(path):
+    """Delete a journal and its `.prev` copy."""
+    for candidate in (path, path + '.prev'):
+        if os.path.exists(candidate):
+            os.remove(candidate)
+
+
+def session_journal(directory, name, pid=None):
+    """Return the journal path of the session run by process `pid` (this one by default)."""
+    return os.path.join(directory, f"{name}.{os.getpid() if pid is None else pid}.journal")
+
+
+def orphaned_journals(directory, name):
+    """
+    Return the session journals (see `session_journal`) in `directory` whose process is no
+    longer running, newest first. Journals of running sessions are never returned, so a
+    second instance does not pick up the live journal of the first.
+    """
+    pattern = re.compile(re.escape(name) + r'\.(\d+)\.journal(\.prev)?$')
+    found = {}
+    for entry in os.listdir(directory):
+        match = pattern.match(entry)
+        if match is None:
+            continue
+        pid = int(match.group(1))
+        if pid == os.getpid() or process_running(pid):
+            continue
+        path = session_journal(directory, name, pid)
+        found[path] = max(found.get(path, 0), os.path.getmtime(os.path.join(directory, entry)))
+    return sorted(found, key=found.get, reverse=True)
+
+
+def process_running(pid):
+    """Check whether a process with the given id is running."""
+    if os.name == 'nt':
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        exit_code = ctypes.c_ulong()
+        try:
+            kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        finally:
+            kernel32.CloseHandle(handle)
+        return exit_code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)  # Signal 0 only checks that the process exists
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Running, under another user
+    return True
+
+
+def _write_record(file, kind, payload):
+    """Append a record and return its offset; a failed write is cut off again so the file stays readable."""
+    offset = file.tell()
+    try:
+        file.write(_RECORD.pack(kind, len(payload)))
+        file.write(payload)
+        file.flush()
+    except OSError:
+        file.seek(offset)
+        file.truncate()
+        raise
+    return offset
+
+
+def _encode_tiles(tiles):
+    parts = [struct.pack('<I', len(tiles))]
+    for (tile_x, tile_y, layer_id), pixels in tiles.items():
+        parts.append(_TILE.pack(tile_x, tile_y, layer_id, 0 if pixels is None else pixels.shape[2], pixels is None))
+        if pixels is not None:
+            parts.append(np.ascontiguousarray(pixels).tobytes())
+    return b''.join(parts)
+
+
+def _read_record(file, tile_size):
+    header = file.read(_RECORD.size)
+    if not header:
+        return None
+    kind, length = _RECORD.unpack(header)
+    payload = file.read(length)
+    if len(payload) < length:
+        raise ValueError("Truncated journal record")
+    body = memoryview(zlib.decompress(payload))
+    (count,), position = struct.unpack_from('<I', body), 4
+    tiles = {}
+    for _ in range(count):
+        tile_x, tile_y, layer_id, channels, blank = _TILE.unpack_from(body, position)
+        position += _TILE.size
+        if blank:
+            tiles[(tile_x, tile_y, layer_id)] = None
+        else:
+            tile_bytes = tile_size * tile_size * channels
+            pixels = np.frombuffer(body[position:position + tile_bytes], dtype=np.uint8)
+            tiles[(tile_x, tile_y, layer_id)] = pixels.reshape(tile_size, tile_size, channels).copy()
+            position += tile_bytes
+    return kind, tiles
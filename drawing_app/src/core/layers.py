@@ -0,0 +1,322 @@
+import itertools
+import numpy as np
+from core.dirty_region import union
+from core.tile_store import TileStore
+
+NORMAL = "normal"
+MULTIPLY = "multiply"
+SCREEN = "screen"
+ADD = "add"
+BLEND_MODES = (NORMAL, MULTIPLY, SCREEN, ADD)
+
+TRANSPARENT = (0, 0, 0, 0)  # Background of the layers above the bottom one
+
+
+class Layer:
+    def __init__(self, layer_id, name, tiles, opacity=1.0, visible=True, blend_mode=NORMAL):
+        """
+        One layer of the document.
+
+        The bottom layer stores opaque BGR pixels. The layers above it store premultiplied
+        BGRA with a transparent background, so their blank tiles cost no memory and a
+        stroke is painted into them with the same `blend_over` as into the bottom layer
+        (its colour just carries an alpha of 255).
+
+        :param layer_id: Id that stays with the layer when it moves; history keys refer to it.
+        :param name: Name shown to the user.
+        :param tiles: TileStore holding the layer's pixels.
+        :param opacity: Opacity the layer is composited with (0..1).
+        :param visible: Whether the layer takes part in the composite.
+        :param blend_mode: One of BLEND_MODES.
+        """
+        self.layer_id = layer_id
+        self.name = name
+        self.tiles = tiles
+        self.opacity = opacity
+        self.visible = visible
+        self.blend_mode = blend_mode
+
+    @property
+    def bounds(self):
+        """Bounds of the layer's allocated tiles, or None if the layer is blank."""
+        rect = None
+        for tile_x, tile_y in self.tiles.allocated_tiles():
+            tile_rect = self.tiles.tile_rect(tile_x, tile_y)
+            rect = tile_rect if rect is None else union(rect, tile_rect)
+        return rect
+
+    def contributes(self):
+        """Check whether the layer can change the composite at all."""
+        return self.visible and self.opacity > 0 and bool(self.tiles.allocated_tiles())
+
+
+class LayerStack:
+    def __init__(self, width, height, background_color=(255, 255, 255), tile_size=256, backing_file=None):
+        """
+        Ordered layers of a document and a cached composite of them.
+
+        The composite is a TileStore of its own. Edits to any layer and changes of a layer's
+        visibility, opacity or blend mode only mark the tiles they affect as stale, and
+        `composite` recomposites just those tiles, the next time it is read. A property
+        change affects only the layer's allocated tiles, so toggling a sparse layer leaves
+        the rest of the document alone. While the bottom layer is the only one that shows,
+        `composite` returns it directly and nothing is copied.
+
+        :param width: Width of the document.
+        :param height: Height of the document.
+        :param background_color: Colour of blank areas of the bottom layer.
+        :param tile_size: Size of the tiles of every layer and of the composite.
+        :param backing_file: Optional file to memory-map the bottom layer into; see TileStore. The
+                             composite is then memory-mapped too, into `<backing_file>.composite`,
+                             so a document larger than RAM is never flattened into RAM.
+        """
+        self.width = width
+        self.height = height
+        self.background_color = tuple(background_color)
+        self.tile_size = tile_size
+        self.layers = [Layer(0, "Background", TileStore(width, height, background_color, tile_size=tile_size,
+                                                        backing_file=backing_file))]
+        self.active_index = 0
+        self.composite_tiles = TileStore(width, height, background_color, tile_size=tile_size,
+                                         backing_file=f"{backing_file}.composite" if backing_file else None)
+        self.stale_tiles = set()  # (tile_x, tile_y) of composite tiles that no longer match the layers
+        self.on_change = None  # Optional callback receiving the (x, y, w, h) rectangle of every change
+        self._ids = itertools.count(1)
+        self._watch(self.layers[0])
+
+    @property
+    def base(self):
+        """The bottom, opaque layer."""
+        return self.layers[0]
+
+    @property
+    def active(self):
+        """The layer tools draw into."""
+        return self.layers[self.active_index]
+
+    @property
+    def nbytes(self):
+        """Bytes held by the allocated tiles of all layers, not counting a memory-mapped bottom layer."""
+        return sum(layer.tiles.nbytes for layer in self.layers if not layer.tiles.backing_file)
+
+    @property
+    def composite_nbytes(self):
+        """Bytes held by the cached composite, not counting a memory-mapped one."""
+        return 0 if self.composite_tiles.backing_file else self.composite_tiles.nbytes
+
+    def add_layer(self, name=None, index=None, layer_id=None):
+        """
+        Insert a blank, transparent layer and make it the active one.
+        :param name: Name of the layer; defaults to "Layer <id>".
+        :param index: Position to insert at, at least 1; defaults to the top.
+        :param layer_id: Id to give the layer, e.g. when recovering a session.
+        :return: The new Layer.
+        """
+        if layer_id is None:
+            layer_id = next(self._ids)
+        else:
+            self._ids = itertools.count(max(layer_id + 1, next(self._ids)))
+        index = len(self.layers) if index is None else index
+        if index < 1:
+            raise ValueError("Layers can only be added above the background layer.")
+        tiles = TileStore(self.width, self.height, TRANSPARENT, tile_size=self.tile_size, channels=4)
+        layer = Layer(layer_id, name or f"Layer {layer_id}", tiles)
+        self._watch(layer)
+        self.layers.insert(index, layer)
+        self.active_index = index
+        return layer
+
+    def remove_layer(self, index):
+        """
+        Remove a layer above the background.
+        :return: The (x, y, w, h) rectangle of the composite that changed, or None.
+        """
+        if index < 1:
+            raise ValueError("The background layer cannot be removed.")
+        layer = self.layers.pop(index)
+        layer.tiles.on_change = None
+        self.active_index = min(self.active_index, len(self.layers) - 1)
+        return self._invalidate_layer(layer)
+
+    def move_layer(self, index, new_index):
+        """
+        Move a layer above the background to another position above the background.
+        :return: The (x, y, w, h) rectangle of the composite that changed, or None.
+        """
+        if index < 1 or new_index < 1:
+            raise ValueError("The background layer cannot be moved.")
+        active = self.active
+        layer = self.layers.pop(index)
+        self.layers.insert(new_index, layer)
+        self.active_index = self.layers.index(active)
+        return self._invalidate_layer(layer)
+
+    def set_active(self, index):
+        """Make the layer at `index` the one tools draw into."""
+        self.active_index = index
+
+    def set_visible(self, index, visible):
+        """
+        Show or hide a layer.
+        :return: The (x, y, w, h) rectangle of the composite that changed, or None.
+        """
+        layer = self.layers[index]
+        if layer.visible == visible:
+            return None
+        layer.visible = visible
+        return self._invalidate_layer(layer)
+
+    def set_opacity(self, index, opacity):
+        """
+        Change the opacity (0..1) a layer is composited with.
+        :return: The (x, y, w, h) rectangle of the composite that changed, or None.
+        """
+        layer = self.layers[index]
+        opacity = min(1.0, max(0.0, opacity))
+        if layer.opacity == opacity:
+            return None
+        layer.opacity = opacity
+        return self._invalidate_layer(layer) if layer.visible else None
+
+    def set_blend_mode(self, index, blend_mode):
+        """
+        Change how a layer is combined with the layers below it.
+        :return: The (x, y, w, h) rectangle of the composite that changed, or None.
+        """
+        if blend_mode not in BLEND_MODES:
+            raise ValueError(f"Unknown blend mode {blend_mode!r}; expected one of {BLEND_MODES}.")
+        layer = self.layers[index]
+        if layer.blend_mode == blend_mode:
+            return None
+        layer.blend_mode = blend_mode
+        return self._invalidate_layer(layer) if layer.visible and index > 0 else None
+
+    def clear(self):
+        """Make every tile of every layer blank again."""
+        for layer in self.layers:
+            layer.tiles.clear()
+
+    def invalidate(self, rect):
+        """Mark the composite tiles under an (x, y, w, h) rectangle as stale."""
+        if rect is None:
+            return
+        self.stale_tiles.update(self.composite_tiles.tiles_in_rect(rect))
+        if self.on_change is not None:
+            self.on_change(rect)
+
+    def release(self):
+        """Free the cached composite; it is rebuilt from the layers the next time it is needed."""
+        self.composite_tiles.clear()
+        self.stale_tiles.update(self.composite_tiles.tiles_in_rect((0, 0, self.width, self.height)))
+
+    def composite(self):
+        """
+        Return a TileStore holding the flattened document, recompositing only stale tiles.
+        The store must not be written to.
+        """
+        if self._passthrough():
+            return self.base.tiles  # Stale tiles stay recorded until the composite is needed
+        stale, self.stale_tiles = self.stale_tiles, set()
+        for tile_x, tile_y in stale:
+            self._composite_tile(tile_x, tile_y)
+        return self.composite_tiles
+
+    def read(self, rect, overlays=(), out=None):
+        """
+        Composite an (x, y, w, h) rectangle of the document from the layers.
+        :param rect: Rectangle to read; parts outside the document read as background.
+        :param overlays: Strokes in progress (see StrokeBuffer.composite_into), shown on the active layer.
+        :param out: Optional array of shape (h, w, 3) to composite into.
+        """
+        base = self.base
+        if base.visible:
+            out = base.tiles.read(rect, out)
+            if self.active_index == 0:
+                _apply_overlays(out, rect, overlays)
+            if base.opacity < 1.0:
+                _fade_to(out, self.background_color, base.opacity)
+        else:
+            if out is None:
+                out = np.empty((rect[3], rect[2], base.tiles.channels), dtype=np.uint8)
+            out[:] = self.background_color
+        for index, layer in enumerate(self.layers[1:], start=1):
+            if not layer.visible or layer.opacity <= 0:
+                continue
+            if index == self.active_index and overlays:
+                pixels = layer.tiles.read(rect)
+                _apply_overlays(pixels, rect, overlays)
+            elif layer.tiles.is_blank(rect):
+                continue
+            else:
+                pixels = layer.tiles.read(rect)
+            blend_layer(out, pixels, layer.opacity, layer.blend_mode)
+        return out
+
+    def _passthrough(self):
+        """Check whether the composite equals the bottom layer, because nothing else shows."""
+        base = self.base
+        return (base.visible and base.opacity >= 1.0 and
+                not any(layer.contributes() for layer in self.layers[1:]))
+
+    def _composite_tile(self, tile_x, tile_y):
+        rect = self.composite_tiles.tile_rect(tile_x, tile_y)
+        base = self.base
+        covered = [layer for layer in self.layers[1:]
+                   if layer.visible and layer.opacity > 0 and layer.tiles.is_allocated(tile_x, tile_y)]
+        if not covered and base.opacity >= 1.0 and (not base.visible or not base.tiles.is_allocated(tile_x, tile_y)):
+            self.composite_tiles.clear_rect(rect)  # Background only: keep the composite tile blank
+            return
+        self.composite_tiles.write(rect[:2], self.read(rect))
+
+    def _invalidate_layer(self, layer):
+        """Mark the composite tiles under the layer's allocated tiles as stale and return their bounds."""
+        self.stale_tiles.update(layer.tiles.allocated_tiles())
+        rect = layer.bounds
+        if rect is not None and self.on_change is not None:
+            self.on_change(rect)
+        return rect
+
+    def _watch(self, layer):
+        layer.tiles.on_change = self.invalidate
+
+
+def blend_layer(base, pixels, opacity=1.0, blend_mode=NORMAL):
+    """
+    Composite premultiplied BGRA layer pixels over an opaque BGR image, in place.
+
+    All modes use fixed-point integer math on the premultiplied colour `c` and alpha `a`:
+    normal is `c + base * (255 - a) / 255`, multiply `base * (255 - a + c) / 255`,
+    screen `base + c - base * c / 255` and add `min(base + c, 255)`.
+
+    :param base: uint8 image of shape (h, w, 3), modified in place.
+    :param pixels: uint8 premultiplied BGRA of shape (h, w, 4).
+    :param opacity: Opacity of the layer (0..1).
+    :param blend_mode: One of BLEND_MODES.
+    """
+    source = pixels.astype(np.uint32)
+    if opacity < 1.0:
+        source = (source * int(round(opacity * 255)) + 127) // 255
+    color, alpha = source[..., :3], source[..., 3:]
+    below = base.astype(np.uint32)
+    if blend_mode == MULTIPLY:
+        blended = (below * (255 - alpha + color) + 127) // 255
+    elif blend_mode == SCREEN:
+        blended = below + color - (below * color + 127) // 255
+    elif blend_mode == ADD:
+        blended = np.minimum(below + color, 255)
+    else:
+        blended = color + (below * (255 - alpha) + 127) // 255
+    base[:] = blended
+    return base
+
+
+def _fade_to(pixels, color, opacity):
+    """Blend opaque pixels towards a solid colour, in place, as if drawn with `opacity` over it."""
+    alpha = int(round(opacity * 255))
+    color = np.asarray(color, dtype=np.uint16)
+    pixels[:] = (pixels.astype(np.uint16) * alpha + color * (255 - alpha) + 127) // 255
+
+
+def _apply_overlays(pixels, rect, overlays):
+    for overlay in overlays:
+        overlay.composite_into(pixels, rect)
@@ -0,0 +1,137 @@
+import weakref
+import numpy as np
+
+
+class BufferRegistry:
+    def __init__(self, max_bytes=None):
+        """
+        Central accounting of the image memory a session holds.
+
+        Subsystems either allocate their buffers through the registry (`allocate`, `copy`),
+        which tracks each array until it is garbage collected, or register a meter that
+        reports the bytes they manage themselves (the tiles, the history). Owners that
+        hold rebuildable data also register an evict callback; when the total exceeds
+        `max_bytes`, evictable owners are asked to free memory, lowest priority first, so
+        caches go before undo history.
+
+        :param max_bytes: Cap on the total bytes, or None for no cap.
+        """
+        self.max_bytes = max_bytes
+        self._live = {}  # owner -> bytes of tracked arrays still alive
+        self._meters = {}  # owner -> callable returning bytes
+        self._evictors = []  # (priority, owner, callable(bytes_to_free))
+
+    def allocate(self, owner, shape, dtype=np.uint8, fill=None):
+        """
+        Allocate a tracked array.
+        :param owner: Name the bytes are reported under, e.g. "previews".
+        :param shape: Shape of the array.
+        :param dtype: Data type of the array.
+        :param fill: Optional value or colour to fill the array with.
+        """
+        array = np.empty(shape, dtype=dtype)
+        if fill is not None:
+            array[:] = fill
+        return self.track(owner, array)
+
+    def copy(self, owner, array):
+        """Return a tracked copy of an array."""
+        return self.track(owner, np.array(array))
+
+    def track(self, owner, array):
+        """Count an existing array under `owner` until it is garbage collected."""
+        self._live[owner] = self._live.get(owner, 0) + array.nbytes
+        weakref.finalize(array, self._release, owner, array.nbytes)
+        self.enforce()
+        return array
+
+    def _release(self, owner, nbytes):
+        self._live[owner] -= nbytes
+
+    def register(self, owner, meter, evict=None, priority=0):
+        """
+        Report memory a subsystem manages itself.
+        :param owner: Name the bytes are reported under.
+        :param meter: Callable returning the owner's current bytes.
+        :param evict: Optional callable `evict(bytes_to_free)` that frees rebuildable memory.
+        :param priority: Evictors with lower priority are asked first.
+        """
+        self._meters[owner] = meter
+        self._evictors = [item for item in self._evictors if item[1] != owner]
+        if evict is not None:
+            self._evictors.append((priority, owner, evict))
+            self._evictors.sort(key=lambda item: item[0])
+
+    def usage(self):
+        """Return {owner: bytes} for every owner currently holding memory."""
+        usage = {owner: nbytes for owner, nbytes in self._live.items() if nbytes}
+        for owner, meter in self._meters.items():
+            usage[owner] = usage.get(owner, 0) + meter()
+        return usage
+
+    def total(self):
+        """Total bytes held by all owners."""
+        return sum(self.usage().values())
+
+    def enforce(self):
+        """
+        Evict rebuildable memory until the total fits `max_bytes`.
+        :return: The total after eviction.
+        """
+        total = self.total()
+        if self.max_bytes is None:
+            return total
+        for priority, owner, evict in self._evictors:
+            if total <= self.max_bytes:
+                break
+            evict(total - self.max_bytes)
+            total = self.total()
+        return total
+
+    def summary(self):
+        """Short human-readable usage, largest owners first."""
+        usage = sorted(self.usage().items(), key=lambda item: -item[1])
+        parts = ", ".join(f"{owner} {nbytes / 2 ** 20:.1f}" for owner, nbytes in usage if nbytes)
+        text = f"Memory: {sum(nbytes for _, nbytes in usage) / 2 ** 20:.1f} MB"
+        if self.max_bytes is not None:
+            text += f" of {self.max_bytes / 2 ** 20:.0f} MB"
+        return f"{text} ({parts})" if parts else text
+
+
+class ScratchBuffers:
+    def __init__(self, registry=None, owner="scratch"):
+        """
+        Named scratch arrays reused across calls, e.g. per drag segment.
+
+        Each name keeps one buffer that only grows; `get` returns a view of the requested
+        shape, so steady-state work allocates nothing. The buffers are reported to the
+        registry under `owner` and dropped first when the memory cap is hit.
+
+        :param registry: Optional BufferRegistry to report to.
+        :param owner: Name the bytes are reported under.
+        """
+        self._buffers = {}  # name -> flat array
+        if registry is not None:
+            registry.register(owner, lambda: self.nbytes, evict=lambda nbytes: self.release(), priority=0)
+
+    @property
+    def nbytes(self):
+        """Bytes held by all scratch buffers."""
+        return sum(buffer.nbytes for buffer in self._buffers.values())
+
+    def get(self, name, shape, dtype=np.uint8):
+        """
+        Return a scratch array of `shape`; its contents are undefined.
+        :param name: Buffer name; callers must not use the same name for two live arrays.
+        """
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape))
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.dtype != dtype or buffer.size < size:
+            buffer = np.empty(size, dtype=dtype)
+            self._buffers[name] = buffer
+        return buffer[:size].reshape(shape)
+
+    def release(self):
+        """Drop every buffer; they are reallocated on next use."""
+        self._buffers.clear()
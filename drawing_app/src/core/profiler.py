@@ -0,0 +1,181 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+import numpy as np
+
+
+class _NullSpan:
+    """Context manager handed out while profiling is off; entering and leaving it does nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "category", "start")
+
+    def __init__(self, profiler, name, category):
+        self.profiler = profiler
+        self.name = name
+        self.category = category
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter_ns()
+        self.profiler.spans.append((self.name, self.category, threading.get_ident(), self.start, end - self.start))
+        return False
+
+
+class Profiler:
+    def __init__(self, capacity=100000, history=600):
+        """
+        Timing spans of the hot paths, plus frame and input-to-present statistics.
+
+        Profiling is off by default. While it is off, `span` returns a shared do-nothing
+        context manager and the frame and input hooks return at once, so the instrumented
+        paths cost one attribute check. While it is on, spans are appended to a bounded
+        ring buffer from any thread and can be exported as a Chrome trace.
+
+        :param capacity: Number of spans kept; older ones are dropped.
+        :param history: Number of frames, latencies and input events kept for `stats`.
+        """
+        self.enabled = False
+        self.spans = deque(maxlen=capacity)  # (name, category, thread id, start ns, duration ns)
+        self.frames = deque(maxlen=history)  # (end ns, duration ns) of every presented frame
+        self.latencies = deque(maxlen=history)  # (present ns, latency ns) from input to present
+        self.inputs = deque(maxlen=history)  # Arrival time (ns) of input events
+        self._frame_start = None
+        self._oldest_input = None  # Arrival of the oldest input not presented yet
+        self._origin = time.perf_counter_ns()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        self._frame_start = None
+        self._oldest_input = None
+
+    def clear(self):
+        """Drop every recorded span and statistic."""
+        self.spans.clear()
+        self.frames.clear()
+        self.latencies.clear()
+        self.inputs.clear()
+
+    def span(self, name, category="app"):
+        """
+        Time a block: `with profiler.span("render_view"): ...`.
+        :param name: Name shown in the HUD and the trace.
+        :param category: Trace category, e.g. "tool" or "render".
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, category)
+
+    def tool_span(self, tool, handler):
+        """Time a tool handler as "<Tool>.<handler>"; the name is only built while profiling."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, f"{type(tool).__name__}.{handler}", "tool")
+
+    def input_received(self):
+        """Record the arrival of an input event; its latency ends at the next present."""
+        if not self.enabled:
+            return
+        now = time.perf_counter_ns()
+        self.inputs.append(now)
+        if self._oldest_input is None:
+            self._oldest_input = now
+
+    def frame_started(self):
+        """Mark the start of a frame (the outermost `begin_frame`)."""
+        if self.enabled:
+            self._frame_start = time.perf_counter_ns()
+
+    def frame_finished(self):
+        """Mark the end of a frame; it becomes a "frame" span."""
+        if not self.enabled or self._frame_start is None:
+            return
+        end = time.perf_counter_ns()
+        self.frames.append((end, end - self._frame_start))
+        self.spans.append(("frame", "frame", threading.get_ident(), self._frame_start, end - self._frame_start))
+        self._frame_start = None
+
+    def presented(self):
+        """
+        Record that the display buffer was updated, ending the latency of pending input.
+        The widget paints the buffer on the next Qt paint event, so this is the latency up to
+        the point the pixels are ready to be shown.
+        """
+        if not self.enabled or self._oldest_input is None:
+            return
+        now = time.perf_counter_ns()
+        self.latencies.append((now, now - self._oldest_input))
+        self._oldest_input = None
+
+    def stats(self, window=1.0, top=5):
+        """
+        Summarize the last `window` seconds.
+        :param top: Number of span names to list, by total time.
+        :return: Dict with "fps", "frame_ms" and "latency_ms" (p50, p95, max), "events_per_second" and
+                 "top_spans" [(name, total ms, count)].
+        """
+        since = time.perf_counter_ns() - int(window * 1e9)
+        frames = [duration for end, duration in list(self.frames) if end >= since]
+        latencies = [latency for end, latency in list(self.latencies) if end >= since]
+        totals = {}
+        for name, _, _, start, duration in list(self.spans)[-5000:]:
+            if start >= since and name != "frame":
+                total, count = totals.get(name, (0, 0))
+                totals[name] = (total + duration, count + 1)
+        ranked = sorted(totals.items(), key=lambda item: item[1][0], reverse=True)[:top]
+        return {
+            "fps": len(frames) / window,
+            "frame_ms": _percentiles(frames),
+            "latency_ms": _percentiles(latencies),
+            "events_per_second": sum(1 for arrival in list(self.inputs) if arrival >= since) / window,
+            "top_spans": [(name, total / 1e6, count) for name, (total, count) in ranked],
+        }
+
+    def chrome_trace(self):
+        """Return the recorded spans and latencies as a Chrome trace-event document (chrome://tracing, Perfetto)."""
+        pid = os.getpid()
+        threads = {}
+        events = []
+        for name, category, thread, start, duration in list(self.spans):
+            tid = threads.setdefault(thread, len(threads) + 1)
+            events.append({"name": name, "cat": category, "ph": "X", "pid": pid, "tid": tid,
+                           "ts": (start - self._origin) / 1000.0, "dur": duration / 1000.0})
+        for end, latency in list(self.latencies):
+            events.append({"name": "input latency", "ph": "C", "pid": pid, "ts": (end - self._origin) / 1000.0,
+                           "args": {"ms": latency / 1e6}})
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread, tid in threads.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                           "args": {"name": names.get(thread, f"thread {thread}")}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path):
+        """Write `chrome_trace` to a JSON file."""
+        with open(path, "w") as file:
+            json.dump(self.chrome_trace(), file)
+
+
+def _percentiles(durations):
+    if not durations:
+        return {"p50": 0.0, "p95": 0.0, "max": 0.0}
+    samples = np.asarray(durations) / 1e6
+    p50, p95 = np.percentile(samples, (50, 95))
+    return {"p50": float(p50), "p95": float(p95), "max": float(samples.max())}
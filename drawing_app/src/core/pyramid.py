@@ -0,0 +1,132 @@
+import math
+import cv2
+from core.dirty_region import DirtyRegion, intersect
+from core.tile_store import TileStore
+
+
+class ImagePyramid:
+    def __init__(self, width, height, background_color=(255, 255, 255), min_size=128, tile_size=64):
+        """
+        Incrementally maintained mipmap pyramid of the document.
+
+        Level 0 is the document's TileStore itself and is never copied; level k is a 2x box
+        downsample of level k - 1, down to the first level that fits in `min_size` pixels.
+        Levels are sparse TileStores too, so blank areas cost nothing at any level. Changes
+        are recorded with `mark_dirty` and only the tiles they touch are rebuilt, lazily,
+        the next time a level is requested.
+
+        :param width: Width of the document (level 0).
+        :param height: Height of the document (level 0).
+        :param background_color: Colour of blank document areas.
+        :param min_size: Levels stop once both sides are at most this many pixels.
+        :param tile_size: Size of the update tiles at every level.
+        """
+        self.background_color = background_color
+        self.tile_size = tile_size
+        self.min_size = min_size
+        self.levels = []  # Levels 1..n; level 0 is passed in by the caller
+        self.dirty_region = DirtyRegion(width, height)
+        self.resize(width, height)
+        self.dirty_region.take()  # Blank levels already match a blank document
+
+    def resize(self, width, height):
+        """Reallocate the levels for a new document size and mark everything dirty."""
+        self.width = width
+        self.height = height
+        self.levels = []
+        level_width, level_height = width, height
+        while max(level_width, level_height) > self.min_size:
+            level_width, level_height = math.ceil(level_width / 2), math.ceil(level_height / 2)
+            self.levels.append(TileStore(level_width, level_height, self.background_color, tile_size=self.tile_size))
+        self.dirty_region.resize(width, height)
+
+    @property
+    def level_count(self):
+        """Number of levels including level 0."""
+        return len(self.levels) + 1
+
+    @property
+    def nbytes(self):
+        """Bytes held by the allocated tiles of all levels."""
+        return sum(level.nbytes for level in self.levels)
+
+    def release(self):
+        """Free every level; they are rebuilt from the document the next time they are needed."""
+        for level in self.levels:
+            level.clear()
+        self.mark_dirty()
+
+    def mark_dirty(self, rect=None):
+        """
+        Record that an (x, y, w, h) region of level 0 changed.
+        :param rect: Changed region in document coordinates, or None for the whole document.
+        """
+        if rect is None:
+            self.dirty_region.add_all()
+        else:
+            self.dirty_region.add(rect)
+
+    def level_for_zoom(self, zoom):
+        """Return the index of the coarsest level that still has at least one pixel per view pixel."""
+        if zoom >= 1.0:
+            return 0
+        return min(int(math.floor(math.log2(1.0 / zoom))), len(self.levels))
+
+    def level(self, index, source):
+        """
+        Return level `index`, bringing the pyramid up to date first.
+        :param index: Level index, 0 being the document itself.
+        :param source: The full-resolution document TileStore (level 0).
+        """
+        if index == 0:
+            return source
+        self.update(source)
+        return self.levels[index - 1]
+
+    def smallest(self, source):
+        """Return the smallest level, e.g. for a navigator thumbnail."""
+        return self.level(len(self.levels), source)
+
+    def update(self, source):
+        """Rebuild the tiles of every level touched by the pending dirty regions."""
+        for rect in self.dirty_region.take():
+            parent = source
+            for level in self.levels:
+                rect = self._parent_to_child_rect(rect, level)
+                if rect is None:
+                    break
+                self._downsample_into(parent, level, rect)
+                parent = level
+
+    def _parent_to_child_rect(self, rect, level):
+        """Map a dirty rectangle of the parent level to the tile-aligned rectangle of the child."""
+        tile = self.tile_size
+        x0 = (rect[0] // 2) // tile * tile
+        y0 = (rect[1] // 2) // tile * tile
+        x1 = math.ceil(math.ceil((rect[0] + rect[2]) / 2) / tile) * tile
+        y1 = math.ceil(math.ceil((rect[1] + rect[3]) / 2) / tile) * tile
+        return intersect((x0, y0, x1 - x0, y1 - y0), (0, 0, level.width, level.height))
+
+    def _downsample_into(self, parent, level, rect):
+        """Box-filter the parent pixels under a tile-aligned child rectangle into the child level, tile by tile."""
+        x0, y0, width, height = rect
+        for y in range(y0, y0 + height, self.tile_size):
+            for x in range(x0, x0 + width, self.tile_size):
+                tile_rect = intersect((x, y, self.tile_size, self.tile_size), rect)
+                parent_rect = (2 * x, 2 * y, 2 * tile_rect[2], 2 * tile_rect[3])
+                if parent.is_blank(parent_rect):
+                    level.clear_rect(tile_rect)  # Blank stays blank without reading any pixels
+                else:
+                    self._downsample_tile(parent, level, tile_rect)
+
+    @staticmethod
+    def _downsample_tile(parent, level, rect):
+        """Box-filter the parent pixels under a child rectangle into the child level."""
+        x, y, width, height = rect
+        region = parent.read(intersect((2 * x, 2 * y, 2 * width, 2 * height), (0, 0, parent.width, parent.height)))
+        pad_bottom = 2 * height - region.shape[0]
+        pad_right = 2 * width - region.shape[1]
+        if pad_bottom or pad_right:
+            # Odd-sized parent: replicate the last row/column so every child pixel has 2x2 parents
+            region = cv2.copyMakeBorder(region, 0, pad_bottom, 0, pad_right, cv2.BORDER_REPLICATE)
+        level.write((x, y), cv2.resize(region, (width, height), interpolation=cv2.INTER_AREA))
@@ -0,0 +1,50 @@
+from core.dirty_region import line_bounds, rect_bounds, ellipse_bounds
+
+LINE = "line"
+RECTANGLE = "rectangle"
+ELLIPSE = "ellipse"
+
+
+class ShapePreview:
+    def __init__(self, kind, start_point, end_point, color, thickness, opacity=1.0):
+        """
+        Vector description of a rubber-band shape that is shown but not rasterized.
+
+        The canvas widget paints it with QPainter over the display buffer, so dragging a
+        preview never copies or re-renders document pixels. Points are in document
+        coordinates and the colour is in the document's BGR order, like every other colour
+        passed to the DrawingManager.
+
+        :param kind: LINE, RECTANGLE or ELLIPSE (the ellipse inscribed in the two corners).
+        :param start_point: Point where the drag started.
+        :param end_point: Current point of the drag.
+        :param color: Colour of the outline.
+        :param thickness: Outline thickness in document pixels.
+        :param opacity: Opacity of the outline (0..1).
+        """
+        self.kind = kind
+        self.start_point = tuple(int(v) for v in start_point)
+        self.end_point = tuple(int(v) for v in end_point)
+        self.color = tuple(color)
+        self.thickness = thickness
+        self.opacity = opacity
+
+    def ellipse_geometry(self):
+        """Return the (center, axes) of the ellipse inscribed in the preview's corners."""
+        return ellipse_geometry(self.start_point, self.end_point)
+
+    @property
+    def bounds(self):
+        """Document rectangle the preview covers, including its outline."""
+        if self.kind == ELLIPSE:
+            return ellipse_bounds(*self.ellipse_geometry(), self.thickness)
+        if self.kind == RECTANGLE:
+            return rect_bounds(self.start_point, self.end_point, self.thickness)
+        return line_bounds(self.start_point, self.end_point, self.thickness)
+
+
+def ellipse_geometry(start_point, end_point):
+    """Return the (center, axes) of the ellipse inscribed in the rectangle spanned by two corners."""
+    center = ((start_point[0] + end_point[0]) // 2, (start_point[1] + end_point[1]) // 2)
+    axes = (abs(start_point[0] - end_point[0]) // 2, abs(start_point[1] - end_point[1]) // 2)
+    return center, axes
@@ -0,0 +1,312 @@
+import json
+import os
+import re
+import struct
+import time
+import zlib
+from array import array
+import numpy as np
+from core.events import PointerEvent
+from core.journal import process_running
+
+_MAGIC = b'SLOG'
+_VERSION = 1
+_HEADER = struct.Struct('<4sH')  # magic, version
+_CHUNK = struct.Struct('<I')  # compressed payload length
+_STROKE = struct.Struct('<dI3BhfB')  # start time, event count, colour, thickness, opacity, coordinate format
+
+PRESS = 0
+DRAG = 1
+RELEASE = 2
+
+_INT16 = 0
+_FLOAT32 = 1
+
+
+class StrokeRecord:
+    def __init__(self, tool_id, color, thickness, opacity, start_time=0.0, parameters=None,
+                 kinds=None, times=None, points=None):
+        """
+        One tool interaction, from press to release, as compact arrays.
+
+        :param tool_id: Name of the tool class, e.g. "Pen"; see tools.registry.TOOL_TYPES.
+        :param color: Drawing colour of the DrawingManager when the stroke started.
+        :param thickness: Drawing thickness of the DrawingManager when the stroke started.
+        :param opacity: Drawing opacity of the DrawingManager when the stroke started.
+        :param start_time: Seconds from the start of the log to the press.
+        :param parameters: Tool settings from `Tool.stroke_parameters`, e.g. a brush seed.
+        :param kinds: uint8 array of PRESS, DRAG and RELEASE per event.
+        :param times: float32 array of seconds from the press to each event.
+        :param points: (n, 2) int16 or float32 array of document positions.
+        """
+        self.tool_id = tool_id
+        self.color = tuple(int(c) for c in color)
+        self.thickness = int(thickness)
+        self.opacity = float(opacity)
+        self.start_time = start_time
+        self.parameters = parameters or {}
+        self.kinds = np.zeros(0, dtype=np.uint8) if kinds is None else kinds
+        self.times = np.zeros(0, dtype=np.float32) if times is None else times
+        self.points = np.zeros((0, 2), dtype=np.int16) if points is None else points
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def events(self):
+        """Yield (kind, seconds since the press, PointerEvent) for every event."""
+        for kind, offset, (x, y) in zip(self.kinds.tolist(), self.times.tolist(), self.points.tolist()):
+            yield kind, offset, PointerEvent(x, y)
+
+
+class StrokeRecorder:
+    def __init__(self, writer=None, clock=time.perf_counter):
+        """
+        Capture tool interactions as StrokeRecords.
+
+        Events are appended to growable typed arrays while the stroke is in progress and
+        packed into numpy arrays when it ends; finished strokes go to `writer` and to
+        `listeners`.
+
+        :param writer: Optional StrokeLogWriter that receives every finished stroke.
+        :param clock: Monotonic clock in seconds.
+        """
+        self.writer = writer
+        self.clock = clock
+        self.listeners = []  # Callbacks receiving every finished StrokeRecord
+        self._origin = clock()
+        self._record = None
+        self._start = 0.0
+        self._kinds = array('B')
+        self._times = array('f')
+        self._coords = array('d')
+
+    @property
+    def recording(self):
+        """True between `begin` and `end`."""
+        return self._record is not None
+
+    def begin(self, tool, drawing_manager, event):
+        """
+        Start a stroke at a press; call it before the tool's `on_press`.
+        :param tool: The tool receiving the events.
+        :param drawing_manager: The manager the tool draws through; its colour, thickness and opacity are recorded.
+        :param event: The press PointerEvent.
+        """
+        now = self.clock()
+        drawing_manager = getattr(drawing_manager, 'drawing_manager', drawing_manager)
+        self._record = StrokeRecord(type(tool).__name__, drawing_manager.color, drawing_manager.thickness,
+                                    drawing_manager.opacity, start_time=now - self._origin)
+        self._start = now
+        self._kinds, self._times, self._coords = array('B'), array('f'), array('d')
+        self._add(PRESS, event, now)
+
+    def capture_parameters(self, tool):
+        """Record the tool's settings; call it after `on_press`, which may pick e.g. a random seed."""
+        if self._record is not None and hasattr(tool, 'stroke_parameters'):
+            self._record.parameters = tool.stroke_parameters()
+
+    def drag(self, event):
+        """Record a drag event, at the time it arrived."""
+        if self._record is not None:
+            self._add(DRAG, event, self.clock())
+
+    def end(self, event):
+        """
+        Record the release and finish the stroke.
+        :return: The StrokeRecord, or None if no stroke was in progress.
+        """
+        record, self._record = self._record, None
+        if record is None:
+            return None
+        self._add(RELEASE, event, self.clock())
+        record.kinds = np.frombuffer(self._kinds, dtype=np.uint8).copy()
+        record.times = np.frombuffer(self._times, dtype=np.float32).copy()
+        record.points = _pack_points(np.frombuffer(self._coords, dtype=np.float64).reshape(-1, 2))
+        if self.writer is not None:
+            self.writer.append(record)
+        for listener in self.listeners:
+            listener(record)
+        return record
+
+    def _add(self, kind, event, now):
+        self._kinds.append(kind)
+        self._times.append(now - self._start)
+        self._coords.append(event.x)
+        self._coords.append(event.y)
+
+
+def _pack_points(points):
+    """Store integral positions that fit as int16, anything else as float32."""
+    if len(points) and np.all(points == np.round(points)) and points.min() >= -32768 and points.max() <= 32767:
+        return points.astype(np.int16)
+    return points.astype(np.float32)
+
+
+class StrokeLogWriter:
+    def __init__(self, path):
+        """
+        Chunked binary stroke log; each stroke is one zlib-compressed chunk.
+
+        Chunks are written and flushed as strokes finish, so a crash loses at most the stroke
+        in progress, and `read_stroke_log` stops cleanly at a truncated last chunk.
+
+        :param path: File to write the log to; an existing file is replaced.
+        """
+        self.path = path
+        self._file = open(path, 'wb')
+        self._file.write(_HEADER.pack(_MAGIC, _VERSION))
+        self._file.flush()
+
+    def append(self, record):
+        """Write one StrokeRecord as a chunk."""
+        payload = zlib.compress(_encode_record(record), 1)
+        self._file.write(_CHUNK.pack(len(payload)))
+        self._file.write(payload)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def _encode_record(record):
+    points = record.points
+    coordinate_format = _INT16 if points.dtype == np.int16 else _FLOAT32
+    tool_id = record.tool_id.encode('utf-8')
+    parameters = json.dumps(record.parameters).encode('utf-8')
+    return b''.join((
+        _STROKE.pack(record.start_time, len(record), *record.color[:3], record.thickness, record.opacity,
+                     coordinate_format),
+        struct.pack('<H', len(tool_id)), tool_id,
+        struct.pack('<I', len(parameters)), parameters,
+        np.ascontiguousarray(record.kinds, dtype=np.uint8).tobytes(),
+        np.ascontiguousarray(record.times, dtype=np.float32).tobytes(),
+        np.ascontiguousarray(points, dtype=np.int16 if coordinate_format == _INT16 else np.float32).tobytes(),
+    ))
+
+
+def _decode_record(body):
+    body = memoryview(body)
+    fields = _STROKE.unpack_from(body)
+    start_time, count, color, (thickness, opacity, coordinate_format) = fields[0], fields[1], fields[2:5], fields[5:]
+    position = _STROKE.size
+    (length,), position = struct.unpack_from('<H', body, position), position + 2
+    tool_id, position = bytes(body[position:position + length]).decode('utf-8'), position + length
+    (length,), position = struct.unpack_from('<I', body, position), position + 4
+    parameters, position = json.loads(bytes(body[position:position + length]).decode('utf-8')), position + length
+    kinds = np.frombuffer(body, dtype=np.uint8, count=count, offset=position).copy()
+    position += count
+    times = np.frombuffer(body, dtype=np.float32, count=count, offset=position).copy()
+    position += 4 * count
+    dtype = np.int16 if coordinate_format == _INT16 else np.float32
+    points = np.frombuffer(body, dtype=dtype, count=2 * count, offset=position).reshape(count, 2).copy()
+    return StrokeRecord(tool_id, color, thickness, opacity, start_time, parameters, kinds, times, points)
+
+
+def session_stroke_log(directory, name, when=None, pid=None):
+    """
+    Return a path for the stroke log of a new session, `<name>.<start time>.<pid>.strokes`,
+    that no file uses yet, so a new session never replaces the log of a crashed one.
+    :param when: Start time of the session, seconds since the epoch (now by default).
+    :param pid: Process running the session (this one by default).
+    """
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(when))
+    base = os.path.join(directory, f"{name}.{stamp}.{os.getpid() if pid is None else pid}")
+    path, copy = base + ".strokes", 1
+    while os.path.exists(path):  # Another window of this process started in the same second
+        path, copy = f"{base}-{copy}.strokes", copy + 1
+    return path
+
+
+def prune_stroke_logs(directory, name, keep):
+    """
+    Delete all but the newest `keep` session stroke logs (see `session_stroke_log`) in
+    `directory`. Logs of sessions that are still running are never deleted.
+    :return: The deleted paths.
+    """
+    pattern = re.compile(re.escape(name) + r'\.(\d{8}-\d{6})\.(\d+)(?:-\d+)?\.strokes$')
+    logs = []
+    for entry in os.listdir(directory):
+        match = pattern.match(entry)
+        if match is not None:
+            logs.append((match.group(1), entry, int(match.group(2))))
+    logs.sort(reverse=True)  # Newest first
+    deleted = []
+    for _, entry, pid in logs[keep:]:
+        if pid == os.getpid() or process_running(pid):
+            continue
+        path = os.path.join(directory, entry)
+        os.remove(path)
+        deleted.append(path)
+    return deleted
+
+
+def read_stroke_log(path):
+    """
+    Read every complete stroke of a log, stopping at a chunk truncated by a crash.
+    :raises ValueError: If the file is not a stroke log of this version.
+    """
+    records = []
+    with open(path, 'rb') as file:
+        header = file.read(_HEADER.size)
+        if len(header) < _HEADER.size or _HEADER.unpack(header) != (_MAGIC, _VERSION):
+            raise ValueError(f"{path} is not a version {_VERSION} stroke log.")
+        while True:
+            size = file.read(_CHUNK.size)
+            if len(size) < _CHUNK.size:
+                break
+            payload = file.read(_CHUNK.unpack(size)[0])
+            try:
+                records.append(_decode_record(zlib.decompress(payload)))
+            except (zlib.error, struct.error, ValueError):
+                break  # Truncated tail of a crashed session
+    return records
+
+
+def replay(records, drawing_manager, tool_types, speed=None, clock=time.perf_counter, sleep=time.sleep):
+    """
+    Re-run recorded strokes through fresh tools.
+
+    At full speed (`speed=None`) each stroke's drags are presented once, at its release,
+    which makes a replay into a headless DrawingManager a rendering throughput benchmark.
+    With a `speed` the original timing is reproduced (2.0 = twice as fast) and every event
+    is presented as it happens.
+
+    :param records: StrokeRecords, e.g. from `read_stroke_log`.
+    :param drawing_manager: What the tools draw through: a DrawingManager (e.g. headless) or a CanvasManager;
+                            both offer the same drawing interface.
+    :param tool_types: {tool_id: tool class}, e.g. tools.registry.TOOL_TYPES.
+    :param speed: None for full speed, otherwise a factor on the recorded timing.
+    :return: {"strokes", "events", "seconds"} of the replay.
+    """
+    manager = getattr(drawing_manager, 'drawing_manager', drawing_manager)  # Frames are batched on the DrawingManager
+    started = clock()
+    strokes = events = 0
+    for record in records:
+        tool_type = tool_types.get(record.tool_id)
+        if tool_type is None:
+            print(f"Skipping stroke of unknown tool {record.tool_id!r}")
+            continue
+        tool = tool_type(drawing_manager)
+        manager.set_color(record.color)  # Recorded values are already zoom-scaled
+        manager.set_thickness(record.thickness)
+        manager.set_opacity(record.opacity)
+        if hasattr(tool, 'apply_stroke_parameters'):
+            tool.apply_stroke_parameters(record.parameters)
+        batched = speed is None
+        if batched:
+            manager.begin_frame()
+        try:
+            for kind, offset, event in record.events():
+                if not batched:
+                    delay = started + (record.start_time + offset) / speed - clock()
+                    if delay > 0:
+                        sleep(delay)
+                handler = {PRESS: 'on_press', DRAG: 'on_drag', RELEASE: 'on_release'}[kind]
+                if hasattr(tool, handler):
+                    getattr(tool, handler)(event)
+                events += 1
+        finally:
+            if batched:
+                manager.end_frame()
+        strokes += 1
+    return {"strokes": strokes, "events": events, "seconds": clock() - started}
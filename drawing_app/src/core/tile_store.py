@@ -0,0 +1,245 @@
+import math
+import numpy as np
+from core.dirty_region import intersect
+
+
+class TileStore:
+    def __init__(self, width, height, background_color=(255, 255, 255), tile_size=256, channels=3, backing_file=None):
+        """
+        Sparse canvas storage split into fixed-size square tiles.
+
+        Tiles are allocated on first write; tiles that were never written are blank and
+        read back as `background_color` without using any memory. With `backing_file` the
+        tiles live in a `np.memmap` on disk instead of RAM, so documents larger than memory
+        can be edited (the file is sparse on filesystems that support it).
+
+        :param width: Width of the canvas in pixels.
+        :param height: Height of the canvas in pixels.
+        :param background_color: Colour of blank tiles.
+        :param tile_size: Width and height of a tile in pixels.
+        :param channels: Number of colour channels per pixel.
+        :param backing_file: Optional path of a file to memory-map the tiles into.
+        """
+        self.width = width
+        self.height = height
+        self.background_color = tuple(background_color)
+        self.tile_size = tile_size
+        self.channels = channels
+        self.tiles_x = math.ceil(width / tile_size)
+        self.tiles_y = math.ceil(height / tile_size)
+        self.backing_file = backing_file
+        self.on_change = None  # Optional callback receiving the (x, y, w, h) rectangle of every change
+        self.before_change = None  # Optional callback receiving (tile_x, tile_y) right before a tile is modified
+
+        if backing_file:
+            self._memmap = np.memmap(backing_file, dtype=np.uint8, mode='w+',
+                                     shape=(self.tiles_y, self.tiles_x, tile_size, tile_size, channels))
+            self._allocated = np.zeros((self.tiles_y, self.tiles_x), dtype=bool)
+        else:
+            self._memmap = None
+            self._tiles = {}  # (tile_x, tile_y) -> ndarray
+
+    def tile_rect(self, tile_x, tile_y):
+        """Return the (x, y, w, h) canvas rectangle covered by a tile, clipped to the canvas."""
+        x, y = tile_x * self.tile_size, tile_y * self.tile_size
+        return x, y, min(self.tile_size, self.width - x), min(self.tile_size, self.height - y)
+
+    def tiles_in_rect(self, rect):
+        """Return the (tile_x, tile_y) indices of all tiles overlapping an (x, y, w, h) rectangle."""
+        rect = intersect(rect, (0, 0, self.width, self.height))
+        if rect is None:
+            return []
+        x, y, width, height = rect
+        size = self.tile_size
+        return [(tile_x, tile_y)
+                for tile_y in range(y // size, (y + height - 1) // size + 1)
+                for tile_x in range(x // size, (x + width - 1) // size + 1)]
+
+    def is_allocated(self, tile_x, tile_y):
+        """Check whether a tile has its own pixels (False means it is blank)."""
+        if self._memmap is not None:
+            return bool(self._allocated[tile_y, tile_x])
+        return (tile_x, tile_y) in self._tiles
+
+    def get_tile(self, tile_x, tile_y):
+        """Return the pixels of a tile, or None if the tile is blank."""
+        if self._memmap is not None:
+            return self._memmap[tile_y, tile_x] if self._allocated[tile_y, tile_x] else None
+        return self._tiles.get((tile_x, tile_y))
+
+    def allocate_tile(self, tile_x, tile_y):
+        """Return a writable tile, allocating it filled with the background colour if it was blank."""
+        if self.before_change is not None:
+            self.before_change(tile_x, tile_y)
+        tile = self.get_tile(tile_x, tile_y)
+        if tile is not None:
+            return tile
+        if self._memmap is not None:
+            tile = self._memmap[tile_y, tile_x]
+            tile[:] = self.background_color
+            self._allocated[tile_y, tile_x] = True
+        else:
+            tile = np.empty((self.tile_size, self.tile_size, self.channels), dtype=np.uint8)
+            tile[:] = self.background_color
+            self._tiles[(tile_x, tile_y)] = tile
+        return tile
+
+    def release_tile(self, tile_x, tile_y):
+        """Turn a tile back into a blank tile and free its memory."""
+        if self.before_change is not None:
+            self.before_change(tile_x, tile_y)
+        if self._memmap is not None:
+            self._allocated[tile_y, tile_x] = False
+        else:
+            self._tiles.pop((tile_x, tile_y), None)
+
+    def allocated_tiles(self):
+        """Return the indices of all tiles that are not blank."""
+        if self._memmap is not None:
+            return [(int(tile_x), int(tile_y)) for tile_y, tile_x in np.argwhere(self._allocated)]
+        return list(self._tiles)
+
+    def is_blank(self, rect):
+        """Check whether an (x, y, w, h) rectangle lies entirely on blank tiles."""
+        return not any(self.is_allocated(tile_x, tile_y) for tile_x, tile_y in self.tiles_in_rect(rect))
+
+    def clear_rect(self, rect):
+        """Reset an (x, y, w, h) rectangle to the background, releasing tiles it fully covers."""
+        rect = intersect(rect, (0, 0, self.width, self.height))
+        if rect is None:
+            return
+        for tile_x, tile_y in self.tiles_in_rect(rect):
+            if not self.is_allocated(tile_x, tile_y):
+                continue
+            tile_rect = self.tile_rect(tile_x, tile_y)
+            part = intersect(rect, tile_rect)
+            if part == tile_rect:
+                self.release_tile(tile_x, tile_y)
+            else:
+                px, py, pw, ph = part
+                tx, ty = px - tile_rect[0], py - tile_rect[1]
+                self.allocate_tile(tile_x, tile_y)[ty:ty + ph, tx:tx + pw] = self.background_color
+        self._changed(rect)
+
+    @property
+    def nbytes(self):
+        """Bytes held by allocated tiles."""
+        return len(self.allocated_tiles()) * self.tile_size * self.tile_size * self.channels
+
+    def read(self, rect, out=None):
+        """
+        Assemble the pixels of an (x, y, w, h) rectangle into a dense array.
+        :param rect: Rectangle to read; parts outside the canvas read as background.
+        :param out: Optional array of shape (h, w, channels) to read into.
+        """
+        x, y, width, height = rect
+        if out is None:
+            out = np.empty((height, width, self.channels), dtype=np.uint8)
+        out[:] = self.background_color
+        for tile_x, tile_y in self.tiles_in_rect(rect):
+            tile = self.get_tile(tile_x, tile_y)
+            if tile is None:
+                continue
+            part = intersect(rect, self.tile_rect(tile_x, tile_y))
+            px, py, pw, ph = part
+            tx, ty = px - tile_x * self.tile_size, py - tile_y * self.tile_size
+            out[py - y:py - y + ph, px - x:px - x + pw] = tile[ty:ty + ph, tx:tx + pw]
+        return out
+
+    def write(self, origin, pixels):
+        """
+        Write a dense array into the canvas with its top-left corner at `origin`.
+        Blank tiles stay blank when the pixels written into them equal the background.
+        """
+        x, y = origin
+        height, width = pixels.shape[:2]
+        rect = (x, y, width, height)
+        for tile_x, tile_y in self.tiles_in_rect(rect):
+            px, py, pw, ph = intersect(rect, self.tile_rect(tile_x, tile_y))
+            source = pixels[py - y:py - y + ph, px - x:px - x + pw]
+            if not self.is_allocated(tile_x, tile_y) and self._is_background(source):
+                continue
+            tile = self.allocate_tile(tile_x, tile_y)
+            tx, ty = px - tile_x * self.tile_size, py - tile_y * self.tile_size
+            tile[ty:ty + ph, tx:tx + pw] = source
+        self._changed(intersect(rect, (0, 0, self.width, self.height)))
+
+    def draw(self, bounds, draw_func):
+        """
+        Run a drawing primitive on the tiles it touches.
+
+        The primitive is rasterized into a scratch copy of its bounding box, which is then
+        written back, so it is never clipped at tile edges (thin cv2 lines would otherwise
+        shift where they cross a tile boundary) and blank tiles it misses stay blank.
+
+        :param bounds: (x, y, w, h) bounding box of the primitive in canvas coordinates.
+        :param draw_func: Callable `draw_func(region, origin_x, origin_y)` that draws into
+                          `region` after subtracting the origin from its canvas coordinates.
+        """
+        rect = intersect(bounds, (0, 0, self.width, self.height))
+        if rect is None:
+            return
+        region = self.read(rect)
+        draw_func(region, rect[0], rect[1])
+        self.write(rect[:2], region)
+
+    def restore_tile(self, tile_x, tile_y, pixels):
+        """
+        Replace a whole tile, e.g. from an undo step.
+        :param pixels: Full tile pixels, or None to make the tile blank.
+        """
+        if pixels is None:
+            self.release_tile(tile_x, tile_y)
+        else:
+            self.allocate_tile(tile_x, tile_y)[:] = pixels
+        self._changed(self.tile_rect(tile_x, tile_y))
+
+    def clear(self):
+        """Make every tile blank again."""
+        for tile_x, tile_y in self.allocated_tiles():
+            self.release_tile(tile_x, tile_y)
+        self._changed((0, 0, self.width, self.height))
+
+    def copy(self, rect=None):
+        """
+        Return an in-memory TileStore with copies of the allocated tiles, e.g. to read from
+        another thread while this one keeps changing.
+        :param rect: Optional (x, y, w, h) rectangle; only tiles overlapping it are copied.
+        """
+        store = TileStore(self.width, self.height, self.background_color, self.tile_size, self.channels)
+        keys = self.allocated_tiles() if rect is None else self.tiles_in_rect(rect)
+        for tile_x, tile_y in keys:
+            tile = self.get_tile(tile_x, tile_y)
+            if tile is not None:
+                store._tiles[(tile_x, tile_y)] = np.array(tile)
+        return store
+
+    def to_array(self):
+        """Return the whole canvas as a dense array."""
+        return self.read((0, 0, self.width, self.height))
+
+    def set_array(self, image):
+        """
+        Replace the canvas contents with a dense image of the same size.
+        Only tiles whose pixels actually differ are written.
+        """
+        for tile_y in range(self.tiles_y):
+            for tile_x in range(self.tiles_x):
+                x, y, width, height = self.tile_rect(tile_x, tile_y)
+                source = image[y:y + height, x:x + width]
+                tile = self.get_tile(tile_x, tile_y)
+                if tile is None:
+                    if self._is_background(source):
+                        continue
+                elif np.array_equal(tile[:height, :width], source):
+                    continue
+                self.allocate_tile(tile_x, tile_y)[:height, :width] = source
+                self._changed((x, y, width, height))
+
+    def _is_background(self, pixels):
+        """Check whether every pixel equals the background colour."""
+        return bool(np.all(pixels == np.asarray(self.background_color, dtype=np.uint8)))
+
+    def _changed(self, rect):
+        if rect is not None and self.on_change is not None:
+            self.on_change(rect)
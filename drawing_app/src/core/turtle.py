@@ -0,0 +1,201 @@
+import cv2
+import numpy as np
+
+FORWARD = "forward"  # Move and draw if the pen is down
+MOVE = "move"  # Move without drawing
+TURN = "turn"  # Turn counter-clockwise by the argument, in degrees
+PEN_UP = "penup"
+PEN_DOWN = "pendown"
+GOTO = "goto"  # Jump to an (x, y) position without drawing
+SET_ANGLE = "setangle"
+PUSH = "push"  # Save position and angle
+POP = "pop"  # Restore the last saved position and angle
+
+_ALIASES = {
+    "forward": FORWARD, "fd": FORWARD, "back": FORWARD, "bk": FORWARD,
+    "left": TURN, "lt": TURN, "right": TURN, "rt": TURN,
+    "penup": PEN_UP, "pu": PEN_UP, "pendown": PEN_DOWN, "pd": PEN_DOWN,
+    "goto": GOTO, "setangle": SET_ANGLE, "seth": SET_ANGLE, "push": PUSH, "pop": POP,
+}
+_NEGATED = {"back", "bk", "right", "rt"}
+
+
+def expand_lsystem(axiom, rules, iterations):
+    """
+    Rewrite an L-system axiom `iterations` times.
+    :param axiom: Start string, e.g. "F".
+    :param rules: {symbol: replacement}; symbols without a rule are kept.
+    :param iterations: Number of rewriting passes.
+    """
+    table = str.maketrans({symbol: replacement for symbol, replacement in rules.items()})
+    for _ in range(iterations):
+        axiom = axiom.translate(table)
+    return axiom
+
+
+def lsystem_commands(string, step, angle, draw_symbols="FG", move_symbols="f"):
+    """
+    Turn an expanded L-system string into turtle commands.
+
+    `+` turns left and `-` right by `angle`, `[` and `]` save and restore the turtle,
+    symbols in `draw_symbols` move forward drawing and those in `move_symbols` without
+    drawing; every other symbol only drives the rewriting and is skipped.
+    """
+    commands = []
+    for symbol in string:
+        if symbol in draw_symbols:
+            commands.append((FORWARD, step))
+        elif symbol in move_symbols:
+            commands.append((MOVE, step))
+        elif symbol == "+":
+            commands.append((TURN, angle))
+        elif symbol == "-":
+            commands.append((TURN, -angle))
+        elif symbol == "[":
+            commands.append((PUSH, None))
+        elif symbol == "]":
+            commands.append((POP, None))
+    return commands
+
+
+def parse_program(text):
+    """
+    Parse a small turtle language into commands.
+
+    Commands are separated by whitespace, newlines or `;`: `fd/forward d`, `bk/back d`,
+    `lt/left a`, `rt/right a`, `pu/penup`, `pd/pendown`, `goto x y`, `seth/setangle a`,
+    `push`, `pop` and `repeat n [ ... ]`, which may be nested. `#` starts a comment.
+
+    :raises ValueError: On an unknown command or a missing argument.
+    """
+    tokens = []
+    for line in text.splitlines():
+        tokens.extend(line.split("#", 1)[0].replace(";", " ").replace("[", " [ ").replace("]", " ] ").split())
+    commands, position = _parse_block(tokens, 0)
+    if position != len(tokens):
+        raise ValueError("Unmatched ']' in turtle program.")
+    return commands
+
+
+def _parse_block(tokens, position):
+    commands = []
+    while position < len(tokens):
+        word = tokens[position].lower()
+        position += 1
+        if word == "]":
+            return commands, position - 1
+        if word == "repeat":
+            count = int(_argument(tokens, position, word))
+            if position + 1 >= len(tokens) or tokens[position + 1] != "[":
+                raise ValueError("'repeat' needs a block in [ ].")
+            body, position = _parse_block(tokens, position + 2)
+            if position >= len(tokens):
+                raise ValueError("Missing ']' after 'repeat' block.")
+            commands.extend(body * count)
+            position += 1
+        elif word not in _ALIASES:
+            raise ValueError(f"Unknown turtle command {tokens[position - 1]!r}.")
+        elif _ALIASES[word] == GOTO:
+            commands.append((GOTO, (float(_argument(tokens, position, word)), float(_argument(tokens, position + 1, word)))))
+            position += 2
+        elif _ALIASES[word] in (FORWARD, TURN, SET_ANGLE):
+            value = float(_argument(tokens, position, word))
+            commands.append((_ALIASES[word], -value if word in _NEGATED else value))
+            position += 1
+        else:
+            commands.append((_ALIASES[word], None))
+    return commands, position
+
+
+def _argument(tokens, position, word):
+    if position >= len(tokens):
+        raise ValueError(f"'{word}' needs an argument.")
+    return tokens[position]
+
+
+class TurtleState:
+    def __init__(self, position=(0.0, 0.0), angle=0.0, pen_down=True):
+        """
+        Position, heading and pen of a turtle.
+        Angles are in degrees, counter-clockwise, with y growing downwards as in the image.
+        """
+        self.position = (float(position[0]), float(position[1]))
+        self.angle = float(angle)
+        self.pen_down = pen_down
+
+
+def trace(commands, state=None):
+    """
+    Compute the path of a turtle program without drawing anything.
+
+    Runs of moves and turns are evaluated at once: headings are the cumulative sum of the
+    turns and positions the cumulative sum of the steps along them. Only commands that
+    jump (`goto`, `pop`) or change the pen split the program into separate runs.
+
+    :param commands: List of (command, argument) tuples, e.g. from `parse_program`.
+    :param state: TurtleState to start from; it is updated to where the program ends.
+    :return: List of float arrays of shape (n, 2), one per drawn polyline, in document coordinates.
+    """
+    state = state or TurtleState()
+    polylines = []
+    stack = []
+    run = []  # (turn, distance, draws) of the current run
+
+    def flush():
+        if run:
+            _trace_run(run, state, polylines)
+            run.clear()
+
+    for command, argument in commands:
+        if command in (FORWARD, MOVE):
+            run.append((0.0, argument, command == FORWARD and state.pen_down))
+        elif command == TURN:
+            run.append((argument, 0.0, False))
+        else:
+            flush()
+            if command == PEN_UP:
+                state.pen_down = False
+            elif command == PEN_DOWN:
+                state.pen_down = True
+            elif command == GOTO:
+                state.position = (float(argument[0]), float(argument[1]))
+            elif command == SET_ANGLE:
+                state.angle = float(argument) % 360
+            elif command == PUSH:
+                stack.append((state.position, state.angle))
+            elif command == POP and stack:
+                state.position, state.angle = stack.pop()
+    flush()
+    return polylines
+
+
+def _trace_run(run, state, polylines):
+    """Evaluate a run of moves and turns with cumulative numpy trig and append its drawn polylines."""
+    steps = np.array(run, dtype=np.float64)
+    turns, distances, draws = steps[:, 0], steps[:, 1], steps[:, 2].astype(bool)
+    headings = np.deg2rad(state.angle + np.cumsum(turns))
+    points = np.empty((len(run) + 1, 2))
+    points[0] = state.position
+    points[1:, 0] = state.position[0] + np.cumsum(distances * np.cos(headings))
+    points[1:, 1] = state.position[1] - np.cumsum(distances * np.sin(headings))  # Subtract for upward direction in image
+
+    # A polyline is a maximal stretch of drawing steps; turns (zero-length) do not break it
+    moving = distances != 0
+    segment_steps = np.flatnonzero(moving)
+    drawn = draws[segment_steps]
+    if drawn.any():
+        breaks = np.flatnonzero(np.diff(drawn.astype(np.int8)))
+        for chunk in np.split(np.arange(len(segment_steps)), breaks + 1):
+            if drawn[chunk[0]]:
+                indices = segment_steps[chunk]
+                polylines.append(np.vstack((points[indices[0]], points[indices + 1])))
+
+    state.position = (float(points[-1, 0]), float(points[-1, 1]))
+    state.angle = float((state.angle + turns.sum()) % 360)
+
+
+def rasterize(image, polylines, color, thickness=1):
+    """Draw traced polylines into an image with a single cv2.polylines call, e.g. without a GUI."""
+    if polylines:
+        cv2.polylines(image, [np.rint(line).astype(np.int32) for line in polylines], False, color, thickness)
+    return image
@@ -0,0 +1,164 @@
+import math
+import cv2
+import numpy as np
+from core.dirty_region import intersect
+
+
+class ViewTransform:
+    def __init__(self, view_width, view_height, document_width, document_height, zoom=1.0, min_zoom=0.1, max_zoom=32.0):
+        """
+        Affine mapping between document pixels and the visible viewport.
+
+        A document point p maps to the view as `p * zoom - offset`. The transform is shared
+        by everything that renders or hit-tests the canvas so they always agree on what is
+        visible, and rendering only ever touches the document region under the viewport.
+
+        :param view_width: Width of the viewport in pixels.
+        :param view_height: Height of the viewport in pixels.
+        :param document_width: Width of the document in pixels.
+        :param document_height: Height of the document in pixels.
+        :param zoom: Initial zoom factor (1.0 = 100%).
+        :param min_zoom: Smallest allowed zoom factor.
+        :param max_zoom: Largest allowed zoom factor.
+        """
+        self.view_width = view_width
+        self.view_height = view_height
+        self.document_width = document_width
+        self.document_height = document_height
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.zoom = min(max(zoom, min_zoom), max_zoom)
+        self.offset_x = 0  # Viewport position in zoomed (view) pixels
+        self.offset_y = 0
+
+    def set_zoom(self, zoom, anchor=None):
+        """
+        Change the zoom factor while keeping the document point under `anchor` in place.
+        :param zoom: New zoom factor.
+        :param anchor: (x, y) view point to zoom around (defaults to the viewport centre).
+        """
+        zoom = min(max(zoom, self.min_zoom), self.max_zoom)
+        if anchor is None:
+            anchor = (self.view_width / 2, self.view_height / 2)
+        doc_x, doc_y = self.to_document(anchor, as_int=False)
+        self.zoom = zoom
+        self.offset_x = int(round(doc_x * zoom - anchor[0]))
+        self.offset_y = int(round(doc_y * zoom - anchor[1]))
+        self.clamp()
+
+    def pan(self, delta_x, delta_y):
+        """Move the viewport by the given number of view pixels."""
+        self.offset_x += int(delta_x)
+        self.offset_y += int(delta_y)
+        self.clamp()
+
+    def center_on(self, point):
+        """Pan so that a document point sits at the centre of the viewport."""
+        self.offset_x = int(round(point[0] * self.zoom - self.view_width / 2))
+        self.offset_y = int(round(point[1] * self.zoom - self.view_height / 2))
+        self.clamp()
+
+    def clamp(self):
+        """Keep the viewport inside the zoomed document where possible."""
+        max_x = max(0, int(round(self.document_width * self.zoom)) - self.view_width)
+        max_y = max(0, int(round(self.document_height * self.zoom)) - self.view_height)
+        self.offset_x = min(max(self.offset_x, 0), max_x)
+        self.offset_y = min(max(self.offset_y, 0), max_y)
+
+    def resize_document(self, width, height):
+        """Update the document size the viewport is clamped to."""
+        self.document_width = width
+        self.document_height = height
+        self.clamp()
+
+    def matrix(self):
+        """Return the 2x3 document-to-view affine matrix."""
+        return np.array([[self.zoom, 0.0, -self.offset_x],
+                         [0.0, self.zoom, -self.offset_y]], dtype=np.float64)
+
+    def to_view(self, point, as_int=True):
+        """Map a document point to view coordinates."""
+        x = point[0] * self.zoom - self.offset_x
+        y = point[1] * self.zoom - self.offset_y
+        return (int(math.floor(x)), int(math.floor(y))) if as_int else (x, y)
+
+    def to_document(self, point, as_int=True):
+        """Map a view point (e.g. a mouse position) to document coordinates."""
+        x = (point[0] + self.offset_x) / self.zoom
+        y = (point[1] + self.offset_y) / self.zoom
+        return (int(math.floor(x)), int(math.floor(y))) if as_int else (x, y)
+
+    def document_rect_to_view(self, rect):
+        """Map an (x, y, w, h) document rectangle to the visible view rectangle it covers, or None."""
+        x0 = math.floor(rect[0] * self.zoom) - self.offset_x
+        y0 = math.floor(rect[1] * self.zoom) - self.offset_y
+        x1 = math.ceil((rect[0] + rect[2]) * self.zoom) - self.offset_x
+        y1 = math.ceil((rect[1] + rect[3]) * self.zoom) - self.offset_y
+        return intersect((x0, y0, x1 - x0, y1 - y0), (0, 0, self.view_width, self.view_height))
+
+    def view_rect_to_document(self, rect, margin=1):
+        """
+        Map an (x, y, w, h) view rectangle to the document rectangle needed to render it.
+        :param margin: Extra document pixels on each side for interpolation.
+        :return: The clipped document rectangle, or None if it lies outside the document.
+        """
+        x0 = math.floor((rect[0] + self.offset_x) / self.zoom) - margin
+        y0 = math.floor((rect[1] + self.offset_y) / self.zoom) - margin
+        x1 = math.ceil((rect[0] + rect[2] + self.offset_x) / self.zoom) + margin
+        y1 = math.ceil((rect[1] + rect[3] + self.offset_y) / self.zoom) + margin
+        return intersect((x0, y0, x1 - x0, y1 - y0), (0, 0, self.document_width, self.document_height))
+
+    def visible_document_rect(self):
+        """Return the document rectangle currently visible in the viewport."""
+        return self.view_rect_to_document((0, 0, self.view_width, self.view_height), margin=0)
+
+    def render(self, source, view_rect, dst, source_scale=1.0, outside_color=(128, 128, 128)):
+        """
+        Render the part of `source` under a view rectangle into `dst`.
+
+        Only the document region visible through `view_rect` is cropped and scaled, with one
+        cv2.warpAffine into the destination, so the cost depends on the viewport size and
+        not on the zoom level or the document size.
+
+        :param source: Document image as an array or a TileStore, or a downsampled copy of it
+                       (see `source_scale`). TileStores are only read under the view rectangle.
+        :param view_rect: (x, y, w, h) rectangle in view coordinates.
+        :param dst: Writable array of shape (h, w, 3) receiving the rendered pixels.
+        :param source_scale: Size of `image` relative to the document, e.g. 0.25 for pyramid level 2.
+        :param outside_color: Colour used for view pixels outside the document.
+        """
+        zoom = self.zoom / source_scale  # View pixels per source pixel
+        view_x, view_y, view_w, view_h = view_rect
+
+        # Source pixels under the view rectangle, with a one pixel margin for interpolation
+        x0 = math.floor((view_x + self.offset_x) / zoom) - 1
+        y0 = math.floor((view_y + self.offset_y) / zoom) - 1
+        x1 = math.ceil((view_x + view_w + self.offset_x) / zoom) + 1
+        y1 = math.ceil((view_y + view_h + self.offset_y) / zoom) + 1
+        if hasattr(source, 'read'):
+            source_size = (source.width, source.height)
+        else:
+            source_size = (source.shape[1], source.shape[0])
+        source_rect = intersect((x0, y0, x1 - x0, y1 - y0), (0, 0) + source_size)
+        if source_rect is None:
+            dst[:] = outside_color
+            return dst
+
+        sx, sy, sw, sh = source_rect
+        source = source.read(source_rect) if hasattr(source, 'read') else source[sy:sy + sh, sx:sx + sw]
+
+        if zoom == 1.0:
+            # Pixel-aligned: a plain copy of the visible crop
+            crop_x, crop_y = view_x + self.offset_x - sx, view_y + self.offset_y - sy
+            crop = source[max(0, crop_y):crop_y + view_h, max(0, crop_x):crop_x + view_w]
+            if crop.shape[:2] == (view_h, view_w):
+                dst[:] = crop
+                return dst
+
+        # Pixel centres: view index v maps to source index (v + 0.5 + offset) / zoom - 0.5
+        matrix = np.array([[zoom, 0.0, zoom * (sx + 0.5) - 0.5 - self.offset_x - view_x],
+                           [0.0, zoom, zoom * (sy + 0.5) - 0.5 - self.offset_y - view_y]])
+        interpolation = cv2.INTER_NEAREST if zoom >= 1.0 else cv2.INTER_LINEAR
+        cv2.warpAffine(source, matrix, (view_w, view_h), dst=dst, flags=interpolation,
+                       borderMode=cv2.BORDER_CONSTANT, borderValue=outside_color)
+        return dst
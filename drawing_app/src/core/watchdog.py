@@ -0,0 +1,155 @@
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # drawing_app/src
+WATCHDOG_VARIABLE = "DRAWING_APP_WATCHDOG"  # Stall budget in milliseconds; the watchdog is off without it
+
+logger = logging.getLogger(__name__)
+
+
+class StallSite:
+    def __init__(self, site):
+        """
+        Stalls attributed to one call site.
+        :param site: "file:line in function" of the innermost application frame of the stalls.
+        """
+        self.site = site
+        self.count = 0
+        self.total = 0.0  # Seconds stalled, summed
+        self.longest = 0.0
+        self.stack = ""  # Formatted main-thread stack of the longest stall
+
+    def add(self, duration, stack):
+        self.count += 1
+        self.total += duration
+        if duration >= self.longest:
+            self.longest = duration
+            self.stack = stack
+
+
+class StallWatchdog:
+    def __init__(self, budget=0.05, interval=None, thread=None, root=APP_ROOT, log=None):
+        """
+        Notice when a thread stops servicing heartbeats, and find out where it was stuck.
+
+        The watched thread (normally the GUI thread, through a QTimer) calls `heartbeat`
+        every `interval` seconds. A background thread checks the heartbeats; once one is
+        late by more than `budget`, it samples the watched thread's Python stack until the
+        heartbeats resume. The stall is then attributed to the innermost application frame
+        seen most often in the samples, so a long session's stalls add up per call site.
+
+        :param budget: Seconds a heartbeat may be late before it counts as a stall.
+        :param interval: Seconds between heartbeats (defaults to a quarter of the budget).
+        :param thread: Thread to watch; defaults to the thread creating the watchdog.
+        :param root: Directory of the application's sources; frames outside it (Qt, numpy, cv2
+                     wrappers, the standard library) are skipped when attributing a stall.
+        :param log: Callback receiving a line of text per stall (defaults to a warning on this module's logger).
+        """
+        if budget <= 0:
+            raise ValueError("The stall budget must be positive.")
+        self.budget = budget
+        self.interval = interval or budget / 4
+        self.thread_id = (thread or threading.current_thread()).ident
+        self.root = root
+        self.log = log or logger.warning
+        self.sites = {}  # call site -> StallSite
+        self.listeners = []  # Callbacks receiving (duration, site, stack) for every stall
+        self._last_beat = time.perf_counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start watching in a daemon thread."""
+        if self._thread is None:
+            self._last_beat = time.perf_counter()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='stall-watchdog', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop watching; a stall in progress is not recorded."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def heartbeat(self):
+        """Call from the watched thread every `interval` seconds."""
+        self._last_beat = time.perf_counter()
+
+    def _run(self):
+        poll = max(0.005, min(self.interval, self.budget) / 2)
+        while not self._stop.wait(poll):
+            beat = self._last_beat
+            if time.perf_counter() - beat <= self.interval + self.budget:
+                continue
+            samples = []
+            while self._last_beat == beat and not self._stop.is_set():
+                stack = self._sample()
+                if stack is not None:
+                    samples.append(stack)
+                self._stop.wait(poll)
+            if self._stop.is_set():
+                return
+            if samples:
+                self._record(self._last_beat - beat - self.interval, samples)
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        return traceback.extract_stack(frame) if frame is not None else None
+
+    def _record(self, duration, samples):
+        """Attribute a finished stall to the call site seen in most of its stack samples."""
+        sites = [self._call_site(stack) for stack in samples]
+        site = Counter(sites).most_common(1)[0][0]
+        stack = "".join(traceback.format_list(samples[sites.index(site)]))
+        entry = self.sites.get(site)
+        if entry is None:
+            entry = self.sites[site] = StallSite(site)
+            self.log(f"GUI thread stalled for {duration * 1000:.0f} ms in {site}:\n{stack}")
+        else:
+            self.log(f"GUI thread stalled for {duration * 1000:.0f} ms in {site} ({entry.count + 1} times)")
+        entry.add(duration, stack)
+        for listener in self.listeners:
+            listener(duration, site, stack)
+
+    def _call_site(self, stack):
+        """Return "file:line in function" of the innermost application frame, or of the innermost frame."""
+        for frame in reversed(stack):
+            if frame.filename.startswith(self.root):
+                return f"{os.path.relpath(frame.filename, self.root)}:{frame.lineno} in {frame.name}"
+        frame = stack[-1]
+        return f"{frame.filename}:{frame.lineno} in {frame.name}"
+
+    def report(self, top=10):
+        """Return the call sites with the most stalled time, longest first, as text."""
+        if not self.sites:
+            return "No GUI thread stalls."
+        sites = sorted(self.sites.values(), key=lambda entry: entry.total, reverse=True)[:top]
+        lines = [f"GUI thread stalls over {self.budget * 1000:.0f} ms, by call site:"]
+        for entry in sites:
+            lines.append(f"  {entry.total * 1000:8.0f} ms total  {entry.count:4d}x  "
+                         f"longest {entry.longest * 1000:6.0f} ms  {entry.site}")
+        return "\n".join(lines)
+
+
+def budget_from_environment(environ=os.environ):
+    """
+    Return the stall budget, in seconds, set by the DRAWING_APP_WATCHDOG variable, or None if it is not set.
+    :raises ValueError: If the variable is not a positive number of milliseconds.
+    """
+    value = environ.get(WATCHDOG_VARIABLE, "").strip()
+    if not value:
+        return None
+    try:
+        budget = float(value) / 1000
+    except ValueError:
+        budget = 0
+    if not budget > 0:
+        raise ValueError(f"{WATCHDOG_VARIABLE} must be a positive number of milliseconds, not {value!r}.")
+    return budget
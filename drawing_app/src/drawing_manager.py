@@ -1,37 +1,324 @@
 import cv2
 import numpy as np
-from PySide6.QtGui import QImage, QPixmap
-from PySide6.QtWidgets import QLabel
-from PySide6.QtCore import Qt
+from core.dirty_region import DirtyRegion, points_bounds, rect_bounds, ellipse_bounds, intersect
+from core.view_transform import ViewTransform
+from core.pyramid import ImagePyramid
+from core.layers import LayerStack
+from core.history import TileHistory
+from core.journal import Journal, STATE, discard_journal, find_journal
+from core.memory import BufferRegistry, ScratchBuffers
+from core.compositing import blend_over
+from core.headless import HeadlessCanvas
+from core.profiler import Profiler
+from core.jobs import JobService, DONE
+from core.filters import filter_tiles, FilterJob
 
 class DrawingManager:
-    def __init__(self, canvas: QLabel, width=800, height=600, background_color=(255, 255, 255), drawing_app=None):
+    def __init__(self, canvas=None, width=800, height=600, background_color=(255, 255, 255), drawing_app=None,
+                 tile_size=256, backing_file=None, journal_path=None, memory_limit=None):
         """
         Initialize the drawing manager.
 
-        :param canvas: The QWidget (label) where the image is drawn.
-        :param width: Initial width of the canvas.
-        :param height: Initial height of the canvas.
+        :param canvas: Where the view is rendered: a GUI.canvas_widget.CanvasWidget, or None
+                       for a HeadlessCanvas of the document size, without any GUI.
+        :param width: Initial width of the document (may be larger than the canvas widget).
+        :param height: Initial height of the document (may be larger than the canvas widget).
         :param background_color: The background color of the canvas.
         :param drawing_app: Reference to the drawing application (optional).
+        :param tile_size: Size of the tiles the document is stored in.
+        :param backing_file: Optional file to memory-map the background layer (and the composite) into, for documents larger than RAM.
+        :param journal_path: Optional crash-recovery journal; see `open_journal`.
+        :param memory_limit: Optional cap in bytes; caches and then undo history are evicted to stay under it.
         """
-        self.canvas = canvas
+        self.canvas = canvas if canvas is not None else HeadlessCanvas(width, height)
+        canvas = self.canvas
         self.width = width
         self.height = height
         self.background_color = background_color
-        self.image = np.full((height, width, 3), background_color, dtype=np.uint8)
+        # Layers in sparse tiled storage; blank tiles cost no memory and primitives only touch the tiles they cover
+        self.layers = LayerStack(width, height, background_color, tile_size=tile_size, backing_file=backing_file)
+        self.layers.on_change = self._on_tiles_changed
+        self.history = TileHistory(self.layers.base.tiles)  # Tile-delta undo/redo shared by every BackButton
         self.color = (0, 0, 0)  # Default drawing color (black)
         self.thickness = 2  # Default thickness
         self.opacity = 1.0  # Default opacity (fully opaque)
         self.is_pen_down = False  # Control drawing state (pen down = drawing)
-        self.zoom_factor = 1.0  # Default zoom factor (no zoom)
-        self.offset_x = 0  # Offset to pan the zoomed image
-        self.offset_y = 0  # Offset to pan the zoomed image
+        self.view = ViewTransform(canvas.width(), canvas.height(), width, height)  # Zoom and pan shared with the CanvasManager
+        canvas.view = self.view  # The canvas paints shape previews through the same transform
+        self.profiler = Profiler()  # Timing spans of the hot paths; off until the HUD or a trace turns it on
+        canvas.profiler = self.profiler
+        self.jobs = JobService()  # Background work (saving, exporting, filters, caches) off the GUI thread
         self.drawing_app = drawing_app  # Reference to the parent drawing app (optional)
+        self.dirty_region = DirtyRegion(width, height)  # Canvas areas changed since the last repaint
+        self._frame_depth = 0  # Nesting level of begin_frame/end_frame; repaints are deferred while > 0
+        self._pending_preview = None  # Latest preview image requested while repaints were deferred
+        self.pyramid = ImagePyramid(width, height, background_color)  # Downsampled levels served when zoomed out
+        self.present_listeners = []  # Callbacks run after the canvas was repainted (e.g. the navigator)
+        self.change_listeners = []  # Callbacks receiving the (x, y, w, h) rectangle of every change to the layers
+        self.status_listeners = []  # Callbacks receiving short messages for the user (the GUI's status bar)
+        self.in_stroke = False  # True from a press to its release; see begin_stroke
+        self._after_stroke = []  # Callbacks deferred until the stroke in progress is released
+        self.overlays = []  # Strokes in progress (StrokeBuffers), composited over the document when rendered
+
+        # Every image buffer of the session is accounted here, per owner
+        self.memory = BufferRegistry(memory_limit)
+        self.memory.register("document", lambda: self.layers.nbytes)
+        self.memory.register("composite", lambda: self.layers.composite_nbytes,
+                             evict=lambda nbytes: self.layers.release(), priority=0)
+        self.memory.register("display", lambda: self.canvas.bridge.buffer.nbytes)
+        self.memory.register("pyramid", lambda: self.pyramid.nbytes,
+                             evict=lambda nbytes: self.pyramid.release(), priority=0)
+        self.memory.register("history", lambda: self.history.nbytes,
+                             evict=lambda nbytes: self.history.shrink(self.history.nbytes - nbytes), priority=10)
+        self.history.listeners.append(self.memory.enforce)
+        self.scratch = ScratchBuffers(self.memory)  # Reusable per-segment work buffers of the tools
+
+        self.recovered = False  # True if open_journal restored a previous session
+        if journal_path:
+            self.open_journal(journal_path)
 
         # Update the canvas with the initial blank image
         self.update_canvas()
 
+    def open_journal(self, path, recover=True, previous_path=None):
+        """
+        Start journaling every change to `path` from a background thread.
+
+        If `recover` is set and a journal of a previous session that was not closed cleanly
+        exists there, its changes are replayed first, so the document is rebuilt after a crash.
+
+        :param path: Journal file.
+        :param recover: Replay an existing journal before starting the new one.
+        :param previous_path: Journal of another session to recover instead of the one at `path`,
+                              e.g. from core.journal.orphaned_journals; it is deleted once recovered.
+        :return: True if a previous session was recovered.
+        """
+        self.close_journal()
+        self.recovered = False
+        previous = find_journal(previous_path or path) if recover else None
+        if previous is not None:
+            width, height, tile_size, channels = previous[0]
+            base = self.layers.base.tiles
+            if (width, height, tile_size, channels) == (self.width, self.height, base.tile_size, base.channels):
+                for kind, tiles in previous[1]:
+                    if kind == STATE:
+                        for layer_id in sorted({key[2] for key in tiles} - set(self.history.stores)):
+                            self.add_layer(layer_id=layer_id)  # Layers come back with default properties
+                        self.history.restore(tiles)
+                self.history.clear()
+                self.recovered = True
+                self.update_canvas()
+            else:
+                print(f"Journal {previous_path or path} does not match the document size; not recovering it.")
+
+        base = self.layers.base.tiles
+        journal = Journal(path, self.width, self.height, base.tile_size, base.channels)
+        # The new journal starts with a snapshot of the document, so it never depends on the old one
+        journal.append(STATE, self.history.snapshot())
+        self.history.journal = journal
+        if self.recovered and previous_path:
+            journal.flush()  # The recovered document is in the new journal before the old one goes
+            discard_journal(previous_path)
+        return self.recovered
+
+    def close_journal(self, discard=False):
+        """
+        Finish writing the journal.
+        :param discard: Delete it, e.g. on a clean shutdown, so it is not recovered next time.
+        """
+        journal, self.history.journal = self.history.journal, None
+        if journal is not None:
+            self.history.clear()  # Spilled entries cannot be paged in without the journal
+            journal.close(discard)
+
+    @property
+    def tiles(self):
+        """TileStore of the active layer, which the tools draw into."""
+        return self.layers.active.tiles
+
+    @property
+    def image(self):
+        """
+        The whole document, with all layers composited, as a dense array.
+        This is a copy: modify it and assign it back to change the active layer.
+        """
+        return self.layers.composite().to_array()
+
+    @image.setter
+    def image(self, new_image):
+        """
+        Put the pixels in which `new_image` differs from the composite onto the active layer,
+        opaque; only tiles whose pixels differ are written.
+        """
+        changed = np.any(new_image != self.image, axis=2)
+        if not changed.any():
+            return
+        layer = self.tiles.to_array()
+        if layer.shape[2] == 4:
+            new_image = np.dstack((new_image, np.full(changed.shape, 255, dtype=np.uint8)))
+        layer[changed] = new_image[changed]
+        self.tiles.set_array(layer)
+
+    def copy_image(self, owner="previews"):
+        """Return a copy of the composited document allocated through the memory registry under `owner`."""
+        return self.layers.composite().read((0, 0, self.width, self.height),
+                                            out=self.memory.allocate(owner, (self.height, self.width, 3)))
+
+    def read_region(self, rect):
+        """Return the pixels of an (x, y, w, h) rectangle of the active layer as a dense array."""
+        return self.tiles.read(rect)
+
+    def write_region(self, origin, pixels):
+        """Write a dense array into the active layer at `origin` and repaint that area."""
+        with self.profiler.span("write_region", "raster"):
+            self.tiles.write(origin, pixels)
+        self.mark_dirty((origin[0], origin[1], pixels.shape[1], pixels.shape[0]))
+        self.present()
+
+    def apply_filter(self, image_filter, rect=None):
+        """
+        Filter the active layer now, in parallel pieces, as one undo step.
+        Blocks until the filter is done; `filter_job` runs it in the background instead.
+        :param image_filter: core.filters.ImageFilter to apply.
+        :param rect: (x, y, w, h) rectangle to filter; defaults to the whole document.
+        """
+        layer = self.layers.active
+        rect = rect or (0, 0, self.width, self.height)
+        with self.profiler.span(image_filter.name, "filter"):
+            results = filter_tiles(layer.tiles, rect, image_filter)
+        self._write_filtered(layer, rect, results)
+
+    def filter_job(self, image_filter, rect=None):
+        """
+        Return a job that filters a snapshot of the active layer on worker threads; submit it to `jobs`.
+
+        When it is done, the result is written back into the layer as one undo step, on the
+        thread the service dispatches to (the GUI thread in the app), and not before the
+        stroke in progress is released, so the stroke stays one undo step too. Everything
+        that changed since the snapshot (strokes, undo, redo) is filtered again from the
+        current pixels at that point, so no work done while the filter ran is lost.
+
+        :param image_filter: core.filters.ImageFilter to apply.
+        :param rect: (x, y, w, h) rectangle to filter; defaults to the whole document.
+        """
+        layer = self.layers.active
+        rect = rect or (0, 0, self.width, self.height)
+        snapshot = layer.tiles.copy(_expand(rect, image_filter.halo))
+        changed = DirtyRegion(self.width, self.height)  # Changes since the snapshot
+        self.change_listeners.append(changed.add)
+        job = FilterJob(snapshot, rect, image_filter)
+
+        def finished(job):
+            if job.state == DONE:
+                self.after_stroke(lambda: self._land_filter(layer, rect, image_filter, job.result, changed))
+            else:
+                self.change_listeners.remove(changed.add)
+
+        job.done_listeners.append(finished)
+        return job
+
+    def _land_filter(self, layer, rect, image_filter, results, changed):
+        """Write a background filter's result, filtering the areas changed since its snapshot again."""
+        self.change_listeners.remove(changed.add)
+        if layer not in self.layers.layers:
+            return  # The layer was removed while the filter ran
+        refiltered = []
+        for changed_rect in changed.take():
+            # A changed pixel alters the filtered pixels up to a halo away
+            stale = intersect(_expand(changed_rect, image_filter.halo), rect)
+            if stale is not None:
+                refiltered.append((stale, filter_tiles(layer.tiles, stale, image_filter)))
+        self._write_filtered(layer, rect, results, refiltered)
+
+    def _write_filtered(self, layer, rect, results, refiltered=()):
+        """
+        Stitch filtered pieces into a layer as a single history entry and repaint.
+        :param refiltered: (rect, results) pairs written over `results`; each rect is cleared
+                           first, since filter_tiles leaves out pieces that stay background.
+        """
+        if layer not in self.layers.layers:
+            return  # The layer was removed while the filter ran
+        self.history.checkpoint()  # Keep earlier changes out of the filter's undo step
+        for origin, pixels in results:
+            layer.tiles.write(origin, pixels)
+        for stale, stale_results in refiltered:
+            layer.tiles.clear_rect(stale)
+            for origin, pixels in stale_results:
+                layer.tiles.write(origin, pixels)
+        self.history.checkpoint()
+        self._repaint(rect)
+
+    def _on_tiles_changed(self, rect):
+        """Keep the pyramid in step with every change to the layers, and tell the change listeners."""
+        self.pyramid.mark_dirty(rect)
+        for listener in self.change_listeners:
+            listener(rect)
+
+    def begin_stroke(self):
+        """
+        Mark the start of a stroke (a press); work that must not land in the middle of it, like
+        a finished background filter, waits for `end_stroke`.
+        """
+        self.in_stroke = True
+
+    def end_stroke(self):
+        """Mark the release of the stroke in progress and run the work deferred until then."""
+        self.in_stroke = False
+        deferred, self._after_stroke = self._after_stroke, []
+        for callback in deferred:
+            callback()
+
+    def after_stroke(self, callback):
+        """Call `callback` now, or once the stroke in progress is released."""
+        if self.in_stroke:
+            self._after_stroke.append(callback)
+        else:
+            callback()
+
+    def report(self, message):
+        """Tell the user about something that went wrong in the background, e.g. in the status bar."""
+        if not self.status_listeners:
+            print(message)
+        for listener in self.status_listeners:
+            listener(message)
+
+    def add_layer(self, name=None, index=None, layer_id=None):
+        """
+        Add a blank layer, record it in the history and make it the active one.
+        See LayerStack.add_layer; the new layer changes nothing on screen until it is drawn on.
+        """
+        layer = self.layers.add_layer(name, index, layer_id)
+        self.history.track(layer.layer_id, layer.tiles)
+        return layer
+
+    def remove_layer(self, index):
+        """Delete a layer above the background; its earlier undo steps no longer restore it."""
+        self.history.checkpoint()
+        layer_id = self.layers.layers[index].layer_id
+        rect = self.layers.remove_layer(index)
+        self.history.untrack(layer_id)
+        return self._repaint(rect)
+
+    def move_layer(self, index, new_index):
+        """Move a layer above the background to another position in the stack."""
+        return self._repaint(self.layers.move_layer(index, new_index))
+
+    def set_active_layer(self, index):
+        """Make the layer at `index` the one tools draw into."""
+        self.layers.set_active(index)
+
+    def set_layer_visible(self, index, visible):
+        """Show or hide a layer, recompositing only the tiles it covers."""
+        return self._repaint(self.layers.set_visible(index, visible))
+
+    def set_layer_opacity(self, index, opacity):
+        """Change a layer's opacity (0..1), recompositing only the tiles it covers."""
+        return self._repaint(self.layers.set_opacity(index, opacity))
+
+    def set_layer_blend_mode(self, index, blend_mode):
+        """Change a layer's blend mode (see core.layers.BLEND_MODES), recompositing only the tiles it covers."""
+        return self._repaint(self.layers.set_blend_mode(index, blend_mode))
+
     def enable_drawing(self):
         """Enable drawing (simulate pen down)."""
         self.is_pen_down = True
@@ -46,8 +333,20 @@ class DrawingManager:
         :param factor: Zoom factor (1.0 = 100%, 2.0 = 200%, etc.)
         """
         if factor > 0:
-            self.zoom_factor = factor
-            self.update_canvas()
+            self.view.set_zoom(factor)
+            self._update_view()
+
+    @property
+    def zoom_factor(self):
+        return self.view.zoom
+
+    @property
+    def offset_x(self):
+        return self.view.offset_x
+
+    @property
+    def offset_y(self):
+        return self.view.offset_y
 
     def set_color(self, color: tuple):
         """Set the color for drawing."""
@@ -61,64 +360,276 @@ class DrawingManager:
         """Set the opacity level for drawing."""
         self.opacity = opacity
 
-    def _apply_opacity(self, color: tuple):
-        """Apply the specified opacity to the given color."""
-        return tuple(int(c * self.opacity) for c in color)
+    def _draw_shape(self, shape_func, bounds, *args):
+        """
+        Internal helper to draw a shape on the canvas if drawing is enabled.
+        `args` are the shape's geometry arguments; `_paint` shifts their points into tile storage.
+        """
+        if self.is_pen_down:
+            self._paint(shape_func, bounds, args, self.color, self.thickness, self.opacity)
 
-    def _adjust_for_zoom(self, point: tuple):
-        """Adjust a given point for the current zoom factor."""
-        return int(point[0] * self.zoom_factor), int(point[1] * self.zoom_factor)
+    def _paint(self, shape_func, bounds, args, color, thickness, opacity=1.0):
+        """
+        Rasterize a cv2 primitive into the active layer's tiles its bounding box touches, then
+        repaint that box. Point arguments (`_Point`s and point arrays) are translated into the box's coordinates.
+        Below full opacity the primitive is rasterized as a coverage mask and alpha-blended
+        over the tiles, so it is see-through instead of darkened.
+        """
+        def draw(region, origin_x, origin_y):
+            shifted = [_shift_geometry(arg, origin_x, origin_y) for arg in args]
+            if opacity >= 1.0:
+                shape_func(region, *shifted, tuple(color[:3]) + (255,) * (region.shape[2] - 3), thickness)
+                return
+            mask = self.scratch.get("coverage", region.shape[:2])
+            mask[:] = 0
+            shape_func(mask, *shifted, 255, thickness)
+            blend_over(region, color, mask, opacity, out=region)
 
-    def _draw_shape(self, shape_func, *args):
-        """Internal helper to draw a shape on the canvas if drawing is enabled."""
-        if self.is_pen_down:
-            color_with_opacity = self._apply_opacity(self.color)
-            shape_func(self.image, *args, color_with_opacity, self.thickness)
-            self.update_canvas()
+        with self.profiler.span(shape_func.__name__, "raster"):
+            self.tiles.draw(bounds, draw)
+        self.mark_dirty(bounds)
+        self.present()
+
+    def draw_line(self, start_point: tuple, end_point: tuple, color=None):
+        """
+        Draw a line between two points (in document coordinates) with the current thickness.
+        Lines are drawn whether or not the pen is down; the tools decide when to draw them.
+        :param color: The color to use for the line (if None, use the current color).
+        """
+        self.stroke_polyline([start_point, end_point], self.color if color is None else color, self.thickness,
+                             self.opacity)
 
-    def draw_line(self, start_point: tuple, end_point: tuple):
-        """Draw a line between two points on the canvas, adjusted for zoom."""
-        zoomed_start = self._adjust_for_zoom(start_point)
-        zoomed_end = self._adjust_for_zoom(end_point)
-        self._draw_shape(cv2.line, zoomed_start, zoomed_end)
+    def draw_polyline(self, points, color=None):
+        """
+        Draw connected line segments through a batch of points with a single cv2.polylines call.
+        :param points: List of (x, y) points, at least two.
+        :param color: The color to use for the line (if None, use the current color).
+        """
+        self.stroke_polyline(points, self.color if color is None else color, self.thickness, self.opacity)
+
+    def draw_polylines(self, polylines, color=None):
+        """
+        Draw several polylines at once, e.g. a whole turtle program, with a single repaint.
+        :param polylines: List of (n, 2) point arrays in document coordinates.
+        :param color: The color to use (if None, use the current color).
+        """
+        self.stroke_polylines(polylines, self.color if color is None else color, self.thickness, self.opacity)
+
+    def draw_circle(self, center_point, radius, color=None, thickness=None):
+        """
+        Draw a circle whether or not the pen is down.
+        :param center_point: Center of the circle in document coordinates.
+        :param radius: Radius of the circle in pixels.
+        :param color: The color to use (if None, use the current color).
+        :param thickness: Line thickness (if None, use the current thickness).
+        """
+        self.stroke_circle(center_point, radius, self.color if color is None else color,
+                           self.thickness if thickness is None else thickness, self.opacity)
 
     def draw_rectangle(self, start_point: tuple, end_point: tuple):
-        """Draw a rectangle on the canvas, adjusted for zoom."""
-        zoomed_start = self._adjust_for_zoom(start_point)
-        zoomed_end = self._adjust_for_zoom(end_point)
-        self._draw_shape(cv2.rectangle, zoomed_start, zoomed_end)
+        """Draw a rectangle while the pen is down (points are in document coordinates)."""
+        bounds = rect_bounds(start_point, end_point, self.thickness)
+        self._draw_shape(cv2.rectangle, bounds, _Point(start_point), _Point(end_point))
 
     def draw_ellipse(self, center_point: tuple, axes_lengths: tuple):
-        """Draw an ellipse on the canvas, adjusted for zoom."""
-        zoomed_center = self._adjust_for_zoom(center_point)
-        zoomed_axes = tuple(map(self._adjust_for_zoom, axes_lengths))
-        self._draw_shape(cv2.ellipse, zoomed_center, zoomed_axes, 0, 0, 360)
+        """Draw an ellipse while the pen is down (center and axes are in document coordinates)."""
+        axes_lengths = tuple(int(axis) for axis in axes_lengths)
+        bounds = ellipse_bounds(center_point, axes_lengths, self.thickness)
+        self._draw_shape(cv2.ellipse, bounds, _Point(center_point), axes_lengths, 0, 0, 360)
+
+    def stroke_polyline(self, points, color, thickness, opacity=1.0):
+        """Draw a polyline with an explicit color, thickness and opacity, regardless of the pen state."""
+        points = np.asarray(points, dtype=np.int32)
+        if len(points) == 2:
+            self._paint(cv2.line, points_bounds(points, thickness), (_Point(points[0]), _Point(points[1])),
+                        color, thickness, opacity)
+        else:
+            self._paint(cv2.polylines, points_bounds(points, thickness), ([points], False), color, thickness, opacity)
+
+    def stroke_polylines(self, polylines, color, thickness, opacity=1.0):
+        """
+        Draw several polylines with one cv2.polylines call and a single repaint, regardless of the pen state.
+        :param polylines: Iterable of (n, 2) point arrays in document coordinates; they are rounded to pixels.
+        """
+        polylines = [np.rint(np.asarray(line)).astype(np.int32) for line in polylines if len(line) >= 2]
+        if polylines:
+            bounds = points_bounds(np.vstack(polylines), thickness)
+            self._paint(cv2.polylines, bounds, (polylines, False), color, thickness, opacity)
+
+    def stroke_circle(self, center_point, radius, color, thickness, opacity=1.0):
+        """Draw a circle with an explicit color, thickness and opacity, regardless of the pen state."""
+        bounds = ellipse_bounds(center_point, (radius, radius), thickness)
+        self._paint(cv2.circle, bounds, (_Point(center_point), int(radius)), color, thickness, opacity)
 
     def clear_canvas(self):
-        """Clear the canvas by resetting the image to the background color."""
-        self.image = np.full((self.height, self.width, 3), self.background_color, dtype=np.uint8)
+        """Clear the canvas by making every layer blank; the layers themselves are kept."""
+        self.layers.clear()
         self.update_canvas()
 
+    def undo(self):
+        """
+        Undo the last operation, repainting only the tiles it restored.
+        :return: True if anything was undone.
+        """
+        with self.profiler.span("undo", "history"):
+            return self._repaint(self.history.undo())
+
+    def redo(self):
+        """
+        Redo the last undone operation, repainting only the tiles it restored.
+        :return: True if anything was redone.
+        """
+        with self.profiler.span("redo", "history"):
+            return self._repaint(self.history.redo())
+
+    def add_overlay(self, overlay):
+        """
+        Show a stroke in progress over the document without writing it into the tiles.
+        :param overlay: A core.compositing.StrokeBuffer (or anything with `painted` and `composite_into`).
+        """
+        self.overlays.append(overlay)
+
+    def update_overlay(self, overlay, rect):
+        """Repaint the (x, y, w, h) document rectangle in which an overlay changed."""
+        if rect is not None:
+            self.mark_dirty(rect)
+            self.present()
+
+    def commit_overlay(self, overlay):
+        """Blend an overlay into the active layer's tiles it covers, once, and stop showing it separately."""
+        self.cancel_overlay(overlay)
+        if overlay.painted is None:
+            return
+        self.tiles.draw(overlay.painted, lambda region, origin_x, origin_y:
+                        overlay.composite_into(region, (origin_x, origin_y, region.shape[1], region.shape[0])))
+        self.mark_dirty(overlay.painted)
+        self.present()
+
+    def cancel_overlay(self, overlay):
+        """Stop showing an overlay and repaint what it covered."""
+        if overlay in self.overlays:
+            self.overlays.remove(overlay)
+            if overlay.painted is not None:
+                self.mark_dirty(overlay.painted)
+
+    def show_shape_preview(self, preview):
+        """
+        Show a rubber-band shape over the canvas without rasterizing it into the document.
+        Only the widget area under the old and the new outline is repainted.
+        :param preview: A core.shape_preview.ShapePreview, replacing the previous one.
+        """
+        self._repaint_shape_previews()
+        self.canvas.shape_previews = [preview]
+        self._repaint_shape_previews()
+
+    def clear_shape_preview(self):
+        """Stop showing the shape preview."""
+        self._repaint_shape_previews()
+        self.canvas.shape_previews = []
+
+    def _repaint_shape_previews(self):
+        for preview in self.canvas.shape_previews:
+            view_rect = self.view.document_rect_to_view(preview.bounds)
+            if view_rect is not None:
+                self.canvas.mark_updated(*view_rect)
+
+    def _repaint(self, rect):
+        """Repaint a document rectangle changed by undo, redo or a layer change; False if it is None."""
+        if rect is None:
+            return False
+        self.mark_dirty(rect)
+        self.present()
+        return True
+
+    def mark_dirty(self, rect=None):
+        """
+        Mark an (x, y, w, h) region of the image as changed so the next `present` repaints it.
+        :param rect: Region in image coordinates, or None to mark the whole canvas.
+        """
+        if rect is None:
+            self.dirty_region.add_all()
+        else:
+            self.dirty_region.add(rect)
+
+    def present(self):
+        """Repaint only the dirty regions of the canvas, applying zoom and pan."""
+        if self._frame_depth:
+            return  # end_frame presents everything at once
+        rects = self.dirty_region.take()
+        for rect in rects:
+            self._present_rect(rect)
+        if rects:
+            self._notify_presented()
+
+    def begin_frame(self):
+        """Defer all repaints until the matching `end_frame`, so a batch of edits is presented once."""
+        if not self._frame_depth:
+            self.profiler.frame_started()
+        self._frame_depth += 1
+
+    def end_frame(self):
+        """Finish a batch started with `begin_frame` and present the accumulated changes."""
+        self._frame_depth = max(0, self._frame_depth - 1)
+        if self._frame_depth:
+            return
+        if self._pending_preview is not None:
+            preview, self._pending_preview = self._pending_preview, None
+            self.dirty_region.take()  # The preview is a full frame
+            self._render_view((0, 0, self.view.view_width, self.view.view_height), preview)
+        else:
+            self.present()
+        self.profiler.frame_finished()
+
     def update_canvas(self):
         """Update the canvas with the current image, applying the zoom factor."""
-        zoomed_image = cv2.resize(self.image, None, fx=self.zoom_factor, fy=self.zoom_factor, interpolation=cv2.INTER_NEAREST)
+        if self._frame_depth:
+            self._pending_preview = None  # The committed image supersedes any preview
+            self.mark_dirty()
+            return
+        self.dirty_region.take()  # A full repaint covers anything pending
+        self._render_view((0, 0, self.view.view_width, self.view.view_height))
+        self._notify_presented()
 
-        # Adjust offsets to ensure they are within bounds
-        self.offset_x = min(max(self.offset_x, 0), max(0, zoomed_image.shape[1] - self.width))
-        self.offset_y = min(max(self.offset_y, 0), max(0, zoomed_image.shape[0] - self.height))
+    def show_preview(self, image: np.ndarray):
+        """Display a full-size preview image with zoom and pan applied, without storing it."""
+        if self._frame_depth:
+            self._pending_preview = image  # Only the latest preview of a frame is shown
+            return
+        self._render_view((0, 0, self.view.view_width, self.view.view_height), image)
 
-        # Crop the zoomed image based on the offsets
-        cropped_image = zoomed_image[self.offset_y:self.offset_y + self.height, self.offset_x:self.offset_x + self.width]
+    def _present_rect(self, rect):
+        """Render a single dirty image region through the view transform into the display buffer."""
+        view_rect = self.view.document_rect_to_view(rect)
+        if view_rect is not None:
+            self._render_view(view_rect)
 
-        # Display the cropped zoomed image on the canvas
-        self._set_canvas_image(cropped_image)
+    def _render_view(self, view_rect, image=None):
+        """
+        Render the document region visible under `view_rect` straight into the display buffer.
+        Only the tiles under that region are read and scaled, so the cost is independent of
+        the zoom level and the document size. The layers are read through their cached
+        composite; when zoomed out, the nearest pyramid level of it is read instead. Overlays
+        are composited into the active layer as the layers are read.
+        :param image: Optional full-size preview image to show instead of the document.
+        """
+        x, y, width, height = view_rect
+        source, source_scale = image, 1.0
+        if source is None and self.overlays:
+            source = _OverlaySource(self.layers, self.overlays)
+        elif source is None:
+            with self.profiler.span("composite", "render"):
+                level = self.pyramid.level_for_zoom(self.zoom_factor)
+                source = self.pyramid.level(level, self.layers.composite())
+            source_scale = 0.5 ** level
+        with self.profiler.span("render_view", "render"):
+            self.view.render(source, view_rect, self.canvas.bridge.view(x, y, width, height), source_scale)
+        self.canvas.mark_updated(x, y, width, height)
+        self.profiler.presented()
 
-    def _set_canvas_image(self, image: np.ndarray):
-        """Convert the image to QPixmap and set it on the QLabel canvas."""
-        height, width, channel = image.shape
-        bytes_per_line = 3 * width
-        q_image = QImage(image.data, width, height, bytes_per_line, QImage.Format_RGB888).rgbSwapped()
-        self.canvas.setPixmap(QPixmap.fromImage(q_image))
+    def _notify_presented(self):
+        """Tell listeners such as the navigator that the canvas changed."""
+        for listener in self.present_listeners:
+            listener()
 
     def update_canvas_with_image(self, image: np.ndarray):
         """Update the canvas with an external image, resizing it to fit the canvas."""
@@ -128,6 +639,49 @@ class DrawingManager:
 
     def pan(self, delta_x: int, delta_y: int):
         """Pan the canvas by adjusting the offset."""
-        self.offset_x += delta_x
-        self.offset_y += delta_y
-        self.update_canvas()
+        self.view.pan(delta_x, delta_y)
+        self._update_view()
+
+    def center_on(self, point: tuple):
+        """Pan so that a document point is at the centre of the canvas."""
+        self.view.center_on(point)
+        self._update_view()
+
+    def _update_view(self):
+        """Repaint after the view (zoom or pan) changed; the image itself is unchanged."""
+        self._render_view((0, 0, self.view.view_width, self.view.view_height))
+        self._notify_presented()
+
+
+class _OverlaySource:
+    """Document source for the view transform that composites the layers with the overlays on the active one."""
+
+    def __init__(self, layers, overlays):
+        self.layers = layers
+        self.overlays = overlays
+        self.width = layers.width
+        self.height = layers.height
+
+    def read(self, rect):
+        return self.layers.read(rect, self.overlays)
+
+
+class _Point(tuple):
+    """Marks a primitive argument as a document point that must be shifted into region coordinates."""
+
+
+def _expand(rect, margin):
+    """Grow an (x, y, w, h) rectangle by `margin` pixels on every side."""
+    x, y, width, height = rect
+    return x - margin, y - margin, width + 2 * margin, height + 2 * margin
+
+
+def _shift_geometry(arg, origin_x, origin_y):
+    """Translate a primitive argument from document to region coordinates; other arguments pass through."""
+    if isinstance(arg, _Point):
+        return int(arg[0]) - origin_x, int(arg[1]) - origin_y
+    if isinstance(arg, np.ndarray):
+        return arg - np.array([origin_x, origin_y], dtype=arg.dtype)
+    if isinstance(arg, list):
+        return [_shift_geometry(item, origin_x, origin_y) for item in arg]
+    return arg
@@ -0,0 +1,14 @@
+import os
+import sys
+import pytest
+
+# The application imports its packages (core, tools, GUI) from the source root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from drawing_manager import DrawingManager  # noqa: E402
+
+
+@pytest.fixture
+def drawing_manager():
+    """Headless 300x200 document with small tiles, so strokes span several of them."""
+    return DrawingManager(width=300, height=200, tile_size=64)
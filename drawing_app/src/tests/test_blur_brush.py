@@ -0,0 +1,86 @@
+import threading
+import time
+import numpy as np
+from core.events import PointerEvent
+from core.jobs import JobService
+from tools.Brush.BlurBrush import BlurBrush
+
+
+def checkerboard(drawing_manager):
+    """Paint a fine black and white pattern the blur visibly softens."""
+    pattern = (np.indices((drawing_manager.height, drawing_manager.width)).sum(axis=0) % 2 * 255).astype(np.uint8)
+    drawing_manager.write_region((0, 0), np.dstack([pattern] * 3))
+    drawing_manager.history.checkpoint()
+
+
+def stroke(tool, points):
+    tool.on_press(PointerEvent(*points[0]))
+    for point in points[1:]:
+        tool.on_drag(PointerEvent(*point))
+    tool.on_release(PointerEvent(*points[-1]))
+
+
+def test_blur_stays_near_the_stroke(drawing_manager):
+    checkerboard(drawing_manager)
+    before = drawing_manager.image
+    drawing_manager.set_thickness(10)
+    stroke(BlurBrush(drawing_manager), [(20, 100), (60, 100), (100, 100)])
+
+    changed = np.argwhere(np.any(drawing_manager.image != before, axis=2))
+    assert len(changed)
+    assert changed[:, 0].min() >= 90 and changed[:, 0].max() <= 110
+    assert changed[:, 1].min() >= 10 and changed[:, 1].max() <= 110
+    assert drawing_manager.memory.usage()["previews"] < drawing_manager.width * drawing_manager.height * 3
+
+
+def block_jobs(drawing_manager):
+    """Give the document a single worker busy until the returned event is set, so blur levels stay queued."""
+    drawing_manager.jobs = JobService(workers=1)
+    started, unblock = threading.Event(), threading.Event()
+    drawing_manager.jobs.run("busy", lambda: started.set() or unblock.wait())
+    started.wait()
+    return unblock
+
+
+def test_release_does_not_hang_on_cancelled_levels(drawing_manager):
+    checkerboard(drawing_manager)
+    before = drawing_manager.image
+    messages = []
+    drawing_manager.status_listeners.append(messages.append)
+    unblock = block_jobs(drawing_manager)
+
+    tool = BlurBrush(drawing_manager)
+    tool.on_press(PointerEvent(50, 50))
+    tool.on_drag(PointerEvent(80, 50))
+    drawing_manager.jobs.cancel("blur_levels")
+    started = time.perf_counter()
+    tool.on_release(PointerEvent(90, 50))
+    assert time.perf_counter() - started < 0.5
+
+    unblock.set()
+    drawing_manager.jobs.shutdown(cancel=False)
+    assert np.array_equal(drawing_manager.image, before)  # Nothing to blend without levels
+    assert len(messages) == 1 and "dropped" in messages[0]
+
+
+def test_late_levels_land_after_the_release_as_their_own_step(drawing_manager):
+    """A release returns within a frame; the segments still waiting land once their levels are computed."""
+    checkerboard(drawing_manager)
+    before = drawing_manager.image
+    unblock = block_jobs(drawing_manager)
+
+    tool = BlurBrush(drawing_manager)
+    started = time.perf_counter()
+    stroke(tool, [(50, 50), (80, 50), (110, 60)])
+    assert time.perf_counter() - started < 0.5
+    assert np.array_equal(drawing_manager.image, before)
+
+    drawing_manager.begin_stroke()  # The next stroke is in progress when the levels arrive
+    unblock.set()
+    drawing_manager.jobs.shutdown(cancel=False)
+    assert np.array_equal(drawing_manager.image, before)
+    drawing_manager.end_stroke()
+    assert not np.array_equal(drawing_manager.image, before)
+
+    assert drawing_manager.undo()
+    assert np.array_equal(drawing_manager.image, before)
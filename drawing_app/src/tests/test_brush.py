@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from core.events import PointerEvent
+from drawing_manager import DrawingManager
+from tools.Brush.brush import Brush
+from tools.Brush.stamp_engine import PRESETS, StampEngine
+
+STROKE = [(30, 40), (70, 60), (120, 100), (170, 90), (220, 140)]
+
+
+def paint(brush_type, seed, batches=None):
+    """Paint STROKE on a fresh document and return the brush and the resulting image."""
+    drawing_manager = DrawingManager(width=256, height=192, tile_size=64)
+    drawing_manager.set_color((40, 90, 200))
+    brush = Brush(drawing_manager, brush_type)
+    brush.seed = seed
+    brush.on_press(PointerEvent(*STROKE[0]))
+    for batch in batches or [[point] for point in STROKE[1:-1]]:
+        brush.on_drag_batch(batch)
+    brush.on_release(PointerEvent(*STROKE[-1]))
+    return brush, drawing_manager.image
+
+
+@pytest.mark.parametrize("brush_type", sorted(PRESETS))
+def test_same_seed_paints_identical_pixels(brush_type):
+    _, first = paint(brush_type, 1234)
+    _, second = paint(brush_type, 1234, batches=[STROKE[1:3], STROKE[3:-1]])  # Also batched differently
+    assert np.array_equal(first, second)
+
+
+def test_different_seeds_paint_different_bristles():
+    _, first = paint("bristle", 1)
+    _, second = paint("bristle", 2)
+    assert not np.array_equal(first, second)
+    engine = StampEngine()
+    assert not np.array_equal(engine.dab("bristle", 16, 0.8, 1.0, seed=1), engine.dab("bristle", 16, 0.8, 1.0, seed=2))
+
+
+def test_thickness_comes_from_the_seed():
+    assert len({paint("soft", 7)[0].stroke.size for _ in range(3)}) == 1
+    assert len({paint("soft", seed)[0].stroke.size for seed in range(20)}) > 1
+
+
+@pytest.mark.parametrize("brush_type", sorted(PRESETS))
+def test_replaying_a_recorded_stroke_reproduces_it(brush_type):
+    brush, painted = paint(brush_type, seed=None)  # A fresh random seed
+    assert brush.stroke.seed is not None
+
+    drawing_manager = DrawingManager(width=256, height=192, tile_size=64)
+    Brush(drawing_manager, brush_type).replay(brush.stroke)
+    assert np.array_equal(drawing_manager.image, painted)
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+from core.compositing import StrokeBuffer, blend_over, blend_pixels
+from core.events import PointerEvent
+from drawing_manager import DrawingManager
+from tools.Brush.brush import Brush
+
+LEVELS = np.arange(256, dtype=np.uint8)
+
+
+def reference_blend(base, color, alpha):
+    """Float "over" blend, rounded to the nearest integer."""
+    return np.floor(base * (1 - alpha / 255) + color * (alpha / 255) + 0.5)
+
+
+def paint_soft_stroke(points):
+    drawing_manager = DrawingManager(width=256, height=192, tile_size=64)
+    drawing_manager.set_color((0, 0, 0))
+    brush = Brush(drawing_manager, "soft")
+    brush.seed = 3
+    brush.on_press(PointerEvent(*points[0]))
+    for point in points[1:]:
+        brush.on_drag(PointerEvent(*point))
+    brush.on_release(PointerEvent(*points[-1]))
+    return drawing_manager.image
+
+
+def test_blend_over_matches_a_rounded_float_blend():
+    base, coverage = np.meshgrid(LEVELS, LEVELS)  # Every base value under every coverage
+    blended = blend_over(base, (200,), coverage)
+    assert np.array_equal(blended, reference_blend(base.astype(float), 200, coverage.astype(float)))
+
+
+@pytest.mark.parametrize("blend", [blend_over, blend_pixels])
+def test_opacity_zero_keeps_the_base_and_one_replaces_it(blend):
+    base = np.random.default_rng(4).integers(0, 256, (16, 16, 3), dtype=np.uint8)
+    color = (10, 128, 250)
+    source = color if blend is blend_over else np.broadcast_to(np.array(color, dtype=np.uint8), base.shape)
+    full = np.full((16, 16), 255, dtype=np.uint8)
+
+    assert np.array_equal(blend(base, source, full, opacity=0.0), base)
+    assert np.array_equal(blend(base, source, np.zeros_like(full)), base)
+    assert np.array_equal(blend(base, source, full, opacity=1.0), np.broadcast_to(color, base.shape))
+
+
+def test_blend_in_place():
+    base = np.full((4, 4, 3), 100, dtype=np.uint8)
+    out = blend_over(base, (200, 200, 200), np.full((4, 4), 255, dtype=np.uint8), opacity=0.5, out=base)
+    assert out is base
+    assert base[0, 0].tolist() == [150, 150, 150]
+
+
+def test_blend_over_paints_premultiplied_layers():
+    """On BGRA the colour gets an alpha of 255, so coverage becomes the layer's alpha."""
+    layer = np.zeros((1, 1, 4), dtype=np.uint8)
+    blended = blend_over(layer, (0, 0, 255), np.array([[128]], dtype=np.uint8))
+    assert blended[0, 0].tolist() == [0, 0, 128, 128]
+
+
+def test_stroke_buffer_grows_without_losing_coverage():
+    buffer = StrokeBuffer(300, 200, (0, 0, 0), padding=8)
+    buffer.ensure((10, 10, 4, 4))
+    buffer.coverage.reshape(-1)[buffer.flat_index(12, 12)] = 200
+    buffer.ensure((250, 150, 10, 10))
+    x, y = 12 - buffer.rect[0], 12 - buffer.rect[1]
+    assert buffer.coverage[y, x] == 200
+    assert buffer.ensure((400, 400, 5, 5)) is None  # Outside the document
+
+
+def test_composite_into_touches_only_the_painted_area():
+    buffer = StrokeBuffer(100, 100, (0, 0, 255), opacity=0.5)
+    buffer.ensure((40, 40, 10, 10))
+    buffer.coverage[:] = 255
+    buffer.mark_painted((40, 40, 10, 10))
+    pixels = np.full((100, 100, 3), 255, dtype=np.uint8)
+
+    assert buffer.composite_into(pixels, (0, 0, 100, 100)) == (40, 40, 10, 10)
+    assert pixels[45, 45].tolist() == [127, 127, 255]
+    assert (pixels[:40] == 255).all() and (pixels[50:] == 255).all()
+    assert buffer.composite_into(pixels, (0, 0, 30, 30)) is None
+
+
+def test_self_overlapping_stroke_does_not_build_up():
+    """A stroke crossing itself gets no darker than a straight one: coverage is combined with a maximum."""
+    straight = paint_soft_stroke([(20, 100), (200, 100)])
+    crossing = paint_soft_stroke([(20, 100), (150, 100), (150, 40), (90, 40), (90, 160), (60, 160)])
+    assert crossing.min() == straight.min()
+    assert 0 < straight.min() < 255  # Partly transparent, so a build-up would show
+
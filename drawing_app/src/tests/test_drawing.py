@@ -1 +1,22 @@
-ECHO is off.
+import numpy as np
+
+
+def test_stroke_repaints_and_undoes(drawing_manager):
+    blank = drawing_manager.image
+    drawing_manager.stroke_polyline([(10, 10), (250, 150)], (0, 0, 255), 5)
+    assert not np.array_equal(drawing_manager.image, blank)
+    assert drawing_manager.canvas.take_damage() is not None
+
+    assert drawing_manager.undo()
+    assert np.array_equal(drawing_manager.image, blank)
+    assert drawing_manager.redo()
+    assert drawing_manager.image[80, 130].tolist() == [0, 0, 255]
+
+
+def test_history_budget_bounds_memory(drawing_manager):
+    drawing_manager.history.max_bytes = 64 * 64 * 3 * 12
+    for step in range(10):
+        drawing_manager.stroke_polyline([(0, step * 20), (299, step * 20)], (step, 0, 0), 3)
+        drawing_manager.history.checkpoint()
+    assert drawing_manager.history.nbytes <= drawing_manager.history.max_bytes
+    assert 0 < len(drawing_manager.history.undo_stack) < 10
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+from core.filters import PRESETS, filter_tiles, gaussian_blur
+from core.jobs import JobService
+
+RED = (0, 0, 255)  # BGR
+STROKE = [(30, 40), (150, 120), (260, 60)]
+
+
+def scribble(drawing_manager):
+    drawing_manager.stroke_polyline(STROKE, (20, 160, 90), 9)
+    drawing_manager.history.checkpoint()
+
+
+def run_job(drawing_manager, job):
+    """Run a job on a worker and return its done listeners, queued as the GUI thread would get them."""
+    queued = []
+    service = JobService(workers=1, dispatch=lambda function, *args: queued.append((function, args)))
+    service.submit(job).wait(timeout=10)
+    service.shutdown()
+    return queued
+
+
+def deliver(queued):
+    for function, args in queued:
+        function(*args)
+
+
+@pytest.mark.parametrize("name", sorted(PRESETS))
+def test_chunked_filter_equals_filtering_the_whole_image(drawing_manager, name):
+    """Chunks read with a halo stitch together to what one `apply` on the whole image gives."""
+    scribble(drawing_manager)
+    image_filter = PRESETS[name]()
+    tiles = drawing_manager.layers.active.tiles
+    expected = image_filter.apply(tiles.to_array())
+
+    chunked = tiles.copy()
+    for origin, pixels in filter_tiles(tiles, (0, 0, tiles.width, tiles.height), image_filter, chunk_size=48):
+        chunked.write(origin, pixels)
+    assert np.array_equal(chunked.to_array(), expected)
+
+
+def test_filter_is_one_undo_step(drawing_manager):
+    scribble(drawing_manager)
+    before = drawing_manager.image
+    drawing_manager.apply_filter(gaussian_blur(3))
+    assert not np.array_equal(drawing_manager.image, before)
+
+    assert drawing_manager.undo()
+    assert np.array_equal(drawing_manager.image, before)
+    assert drawing_manager.redo()
+    assert drawing_manager.undo()
+    assert np.array_equal(drawing_manager.image, before)
+
+
+def test_background_filter_keeps_strokes_drawn_while_it_ran(drawing_manager):
+    """A stroke drawn between submit and write-back is filtered from the live pixels, not overwritten."""
+    queued = run_job(drawing_manager, drawing_manager.filter_job(PRESETS["Invert"]()))
+    drawing_manager.stroke_polyline([(100, 100), (140, 100)], RED, 5)
+    drawing_manager.history.checkpoint()
+    deliver(queued)
+
+    image = drawing_manager.image
+    assert tuple(image[100, 120]) == (255, 255, 0)
+    assert tuple(image[10, 10]) == (0, 0, 0)  # Inverted white background
+    assert drawing_manager.change_listeners == []
+
+
+def test_background_filter_refilters_undone_areas(drawing_manager):
+    drawing_manager.stroke_polyline([(100, 100), (140, 100)], RED, 5)
+    drawing_manager.history.checkpoint()
+    queued = run_job(drawing_manager, drawing_manager.filter_job(gaussian_blur(2)))
+    drawing_manager.undo()
+    deliver(queued)
+
+    assert np.array_equal(drawing_manager.image, np.full_like(drawing_manager.image, 255))
+
+
+def test_background_filter_waits_for_the_stroke_to_be_released(drawing_manager):
+    scribble(drawing_manager)
+    queued = run_job(drawing_manager, drawing_manager.filter_job(PRESETS["Invert"]()))
+    before = drawing_manager.image
+
+    drawing_manager.begin_stroke()
+    drawing_manager.stroke_polyline([(100, 100), (140, 100)], RED, 5)
+    deliver(queued)
+    assert np.array_equal(drawing_manager.image[150:], before[150:])  # Not written mid-stroke
+    drawing_manager.stroke_polyline([(140, 100), (180, 100)], RED, 5)
+    drawing_manager.end_stroke()
+
+    filtered = drawing_manager.image
+    assert tuple(filtered[100, 160]) == (255, 255, 0)
+    assert drawing_manager.undo()  # The filter
+    assert drawing_manager.undo()  # The whole stroke
+    assert np.array_equal(drawing_manager.image, before)
@@ -0,0 +1,89 @@
+import numpy as np
+from core.tile_store import TileStore
+from core.history import TileHistory
+
+TILE = 32
+
+
+def make_history(max_bytes=256 * 1024 * 1024):
+    tiles = TileStore(128, 96, tile_size=TILE)
+    return tiles, TileHistory(tiles, max_bytes=max_bytes)
+
+
+def paint(tiles, x, y, value, size=8):
+    tiles.write((x, y), np.full((size, size, 3), value, dtype=np.uint8))
+
+
+def test_undo_restores_only_changed_tiles():
+    tiles, history = make_history()
+    paint(tiles, 0, 0, 10)
+    history.checkpoint()
+    paint(tiles, 40, 40, 20)
+    history.checkpoint()
+
+    assert history.undo_stack[-1].keys() == {(1, 1, 0)}
+    assert history.undo() == tiles.tile_rect(1, 1)
+    assert tiles.is_blank(tiles.tile_rect(1, 1))
+    assert (tiles.read((0, 0, 8, 8)) == 10).all()
+
+
+def test_redo_reapplies_and_new_change_drops_redo():
+    tiles, history = make_history()
+    paint(tiles, 0, 0, 10)
+    history.checkpoint()
+    before = tiles.to_array()
+    history.undo()
+    assert history.can_redo()
+
+    history.redo()
+    assert np.array_equal(tiles.to_array(), before)
+    history.undo()
+    paint(tiles, 70, 10, 30)
+    history.checkpoint()
+    assert not history.can_redo()
+
+
+def test_operation_without_changes_leaves_no_entry():
+    tiles, history = make_history()
+    paint(tiles, 0, 0, 255)  # Same as the white background
+    assert not history.checkpoint()
+    assert not history.can_undo()
+
+
+def test_open_operation_is_closed_by_undo():
+    tiles, history = make_history()
+    paint(tiles, 0, 0, 10)
+    assert history.can_undo()
+    history.undo()
+    assert tiles.is_blank((0, 0, 8, 8))
+
+
+def test_byte_budget_evicts_oldest_entries():
+    tile_bytes = TILE * TILE * 3
+    tiles, history = make_history(max_bytes=2 * tile_bytes)
+    for step in range(4):
+        paint(tiles, step * TILE, 0, 10)
+    history.checkpoint()  # Blank tiles cost nothing to keep
+    for step in range(4):
+        paint(tiles, step * TILE, 0, 20)  # Each step keeps one full tile
+        history.checkpoint()
+
+    assert history.nbytes <= 2 * tile_bytes
+    assert len(history.undo_stack) == 2
+    while history.undo() is not None:
+        pass
+    # Only the two newest steps could be undone; the older ones were evicted
+    assert [int(tiles.read((step * TILE, 0, 1, 1))[0, 0, 0]) for step in range(4)] == [20, 20, 10, 10]
+
+
+def test_layers_share_one_history():
+    tiles, history = make_history()
+    layer = TileStore(128, 96, (0, 0, 0, 0), tile_size=TILE, channels=4)
+    history.track(1, layer)
+    paint(tiles, 0, 0, 10)
+    layer.write((0, 0), np.full((8, 8, 4), 200, dtype=np.uint8))
+    history.checkpoint()
+
+    assert history.undo_stack[-1].keys() == {(0, 0, 0), (0, 0, 1)}
+    history.undo()
+    assert tiles.is_blank((0, 0, 8, 8)) and layer.is_blank((0, 0, 8, 8))
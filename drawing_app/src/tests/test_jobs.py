@@ -0,0 +1,159 @@
+import os
+import threading
+import cv2
+import numpy as np
+import pytest
+from core import jobs as jobs_module
+from core.jobs import CANCELLED, DONE, FAILED, HIGH, LOW, NORMAL, Job, JobCancelled, JobService, SaveImageJob
+
+
+def call_now(function, *args):
+    """Synchronous dispatch: listeners run on the worker right away, so they have run once a job is finished."""
+    function(*args)
+
+
+@pytest.fixture
+def service():
+    """One worker, so the queue order is the execution order."""
+    service = JobService(workers=1, dispatch=call_now)
+    yield service
+    service.shutdown()
+
+
+def block(service):
+    """Occupy the worker until the returned event is set, so later jobs stay queued."""
+    started, unblock = threading.Event(), threading.Event()
+    service.run("busy", lambda: started.set() or unblock.wait())
+    started.wait()
+    return unblock
+
+
+class SteppingJob(Job):
+    kind = "stepping"
+
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+        self.step = threading.Event()
+
+    def run(self):
+        self.started.set()
+        for index in range(10):
+            self.step.wait()
+            self.set_progress(index / 10, "Stepping")
+        return "finished"
+
+
+def test_jobs_run_by_priority_then_submission_order(service):
+    ran = []
+    unblock = block(service)
+    for name, priority in [("low", LOW), ("normal", NORMAL), ("high", HIGH), ("high again", HIGH)]:
+        service.run("order", ran.append, name, priority=priority)
+    assert len(service.jobs("order")) == 4
+    unblock.set()
+    service.shutdown(cancel=False)
+    assert ran == ["high", "high again", "normal", "low"]
+    assert service.jobs() == []
+
+
+def test_cancelled_pending_job_never_runs(service):
+    ran, done = [], []
+    unblock = block(service)
+    job = service.run("skipped", ran.append, 1)
+    job.done_listeners.append(done.append)
+    service.cancel("skipped")
+    unblock.set()
+
+    with pytest.raises(JobCancelled):
+        job.wait(5)
+    service.shutdown(cancel=False)  # Done listeners are called just after `wait` returns
+    assert job.state == CANCELLED and ran == [] and done == [job]
+
+
+def test_set_progress_raises_once_cancelled(service):
+    progress = []
+    job = SteppingJob()
+    job.progress_listeners.append(lambda job, fraction, message: progress.append((fraction, message)))
+    service.submit(job)
+    job.started.wait()
+    job.cancel()  # While it runs: it stops at its next progress report
+    job.step.set()
+
+    with pytest.raises(JobCancelled):
+        job.wait(5)
+    assert job.state == CANCELLED and job.result is None
+    assert progress == []
+    with pytest.raises(JobCancelled):
+        job.set_progress(0.5)
+
+
+def test_progress_is_reported_through_the_dispatch(service):
+    progress = []
+    job = SteppingJob()
+    job.progress_listeners.append(lambda job, fraction, message: progress.append(fraction))
+    job.step.set()
+    assert service.submit(job).wait(5) == "finished"
+    assert job.state == DONE
+    assert progress == [index / 10 for index in range(10)] and job.progress == 0.9
+
+
+def test_wait_reraises_the_error_of_the_job(service):
+    error = KeyError("layer")
+
+    def fail():
+        raise error
+
+    job = service.run("failing", fail)
+    with pytest.raises(KeyError) as raised:
+        job.wait(5)
+    assert raised.value is error
+    assert job.state == FAILED and job.error is error
+
+
+def test_wait_times_out(service):
+    unblock = block(service)
+    job = service.run("queued", lambda: None)
+    with pytest.raises(TimeoutError):
+        job.wait(0.01)
+    unblock.set()
+    assert job.wait(5) is None
+
+
+def test_shutdown_without_cancel_finishes_the_queue(service):
+    unblock = block(service)
+    queued = [service.run("queued", pow, 2, exponent) for exponent in range(5)]
+    unblock.set()
+    service.shutdown(cancel=False)
+
+    assert [job.state for job in queued] == [DONE] * 5
+    assert [job.result for job in queued] == [1, 2, 4, 8, 16]
+    with pytest.raises(RuntimeError):
+        service.run("late", pow, 2, 2)
+
+
+def test_shutdown_cancels_the_queue_by_default(service):
+    unblock = block(service)
+    queued = service.run("queued", pow, 2, 2)
+    service.shutdown(wait=False)  # Cancels while the job is still queued
+    unblock.set()
+    service.shutdown()
+    assert queued.state == CANCELLED
+
+
+def test_save_image_job_writes_a_part_file_then_replaces(service, tmp_path, monkeypatch):
+    """The image is written under a temporary name and moved into place in one step."""
+    path = str(tmp_path / "drawing.png")
+    replaced = []
+
+    def replace(source, destination):
+        replaced.append((source, destination, os.path.getsize(source)))
+        os.rename(source, destination)
+
+    monkeypatch.setattr(jobs_module.os, "replace", replace)
+    pixels = np.random.default_rng(2).integers(0, 256, (40, 60, 3), dtype=np.uint8)
+    job = service.submit(SaveImageJob(pixels, path))
+
+    assert job.wait(5) == path
+    assert replaced == [(path + ".part", path, os.path.getsize(path))]
+    assert not os.path.exists(path + ".part")
+    assert np.array_equal(cv2.imread(path), pixels)
@@ -0,0 +1,145 @@
+import os
+import subprocess
+import sys
+import numpy as np
+import pytest
+from core import journal as journal_module
+from core.journal import Journal, JournalError, STATE, SPILL, orphaned_journals, read_journal, session_journal
+from drawing_manager import DrawingManager
+
+TILE = 64
+TILE_BYTES = TILE * TILE * 3
+
+
+def new_document(path, **kwargs):
+    return DrawingManager(width=256, height=128, tile_size=TILE, journal_path=str(path), **kwargs)
+
+
+def draw_steps(drawing_manager, steps):
+    """Repaint the same four tiles `steps` times, one undo step each."""
+    for step in range(steps):
+        drawing_manager.stroke_polyline([(0, 60), (255, 60)], (step * 7, 0, 0), 140)
+        drawing_manager.history.checkpoint()
+
+
+def test_spilled_entries_page_back_in(tmp_path):
+    drawing_manager = new_document(tmp_path / "session.journal")
+    drawing_manager.history.max_bytes = 4 * TILE_BYTES  # Room for one step in memory
+    draw_steps(drawing_manager, 4)
+    history = drawing_manager.history
+    assert sum(type(entry).__name__ == "_SpilledEntry" for entry in history.undo_stack) == 3
+
+    images = []
+    while drawing_manager.undo():
+        images.append(drawing_manager.image[60, 100].tolist())
+    assert images == [[14, 0, 0], [7, 0, 0], [0, 0, 0], [255, 255, 255]]
+    drawing_manager.close_journal(discard=True)
+
+
+def test_open_journal_recovers_crashed_session(tmp_path):
+    path = tmp_path / "session.journal"
+    crashed = new_document(path)
+    crashed.add_layer()
+    crashed.stroke_polyline([(10, 10), (200, 100)], (0, 0, 255), 9)
+    crashed.history.checkpoint()
+    crashed.history.journal.flush()  # The process dies here without close_journal
+
+    recovered = new_document(path)
+    assert recovered.recovered
+    assert len(recovered.layers.layers) == 2
+    assert np.array_equal(recovered.image, crashed.image)
+    assert not recovered.history.can_undo()
+    recovered.close_journal(discard=True)
+    assert not path.exists()
+
+
+def finished_pid():
+    """Id of a process that has exited."""
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_only_journals_of_exited_sessions_are_orphaned(tmp_path):
+    """A second window must not recover the live journal of the first one."""
+    dead = session_journal(str(tmp_path), "session", finished_pid())
+    for path in (session_journal(str(tmp_path), "session"), session_journal(str(tmp_path), "session", os.getppid()),
+                 dead, str(tmp_path / "other.1.journal")):
+        open(path, 'wb').close()
+    assert orphaned_journals(str(tmp_path), "session") == [dead]
+
+
+def test_recovering_another_sessions_journal_takes_it_over(tmp_path):
+    orphan = session_journal(str(tmp_path), "session", finished_pid())
+    crashed = new_document(orphan)
+    crashed.stroke_polyline([(10, 10), (200, 100)], (0, 0, 255), 9)
+    crashed.history.checkpoint()
+    crashed.history.journal.flush()
+
+    own = session_journal(str(tmp_path), "session")
+    recovered = DrawingManager(width=256, height=128, tile_size=TILE)
+    assert orphaned_journals(str(tmp_path), "session") == [orphan]
+    assert recovered.open_journal(own, previous_path=orphan)
+    assert np.array_equal(recovered.image, crashed.image)
+    assert not os.path.exists(orphan)  # Recovered once, not again by the next window
+    assert orphaned_journals(str(tmp_path), "session") == []
+    recovered.close_journal(discard=True)
+
+
+def test_failed_write_does_not_block_undo(tmp_path, monkeypatch):
+    drawing_manager = new_document(tmp_path / "session.journal")
+    journal = drawing_manager.history.journal
+    errors = []
+    journal.error_listeners.append(lambda record, error: errors.append(error))
+    drawing_manager.history.max_bytes = 4 * TILE_BYTES
+    draw_steps(drawing_manager, 1)
+    journal.flush()
+
+    def fail(tiles):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(journal_module, "_encode_tiles", fail)
+    draw_steps(drawing_manager, 2)  # The first step spills into the failing journal
+    journal.flush()
+    monkeypatch.undo()
+    assert errors
+
+    assert drawing_manager.undo()  # The newest step is still in memory
+    assert not drawing_manager.undo()  # The lost step is dropped instead of waited for
+    assert not drawing_manager.history.can_undo()
+    drawing_manager.close_journal(discard=True)
+
+
+def test_read_raises_for_failed_record(tmp_path, monkeypatch):
+    journal = Journal(str(tmp_path / "j"), 64, 64, TILE, 3)
+    monkeypatch.setattr(journal_module, "_encode_tiles", lambda tiles: 1 / 0)
+    record = journal.append(SPILL, {(0, 0, 0): None})
+    journal.flush()
+    with pytest.raises(JournalError):
+        journal.read(record)
+    journal.close(discard=True)
+
+
+def test_journal_is_compacted_past_its_limit(tmp_path):
+    path = tmp_path / "session.journal"
+    drawing_manager = new_document(path)
+    journal = drawing_manager.history.journal
+    journal.max_bytes = journal._compact_at = 4096  # Flat tiles compress to a few hundred bytes
+    drawing_manager.history.max_bytes = 4 * TILE_BYTES
+    draw_steps(drawing_manager, 30)
+    journal.flush()
+
+    assert path.stat().st_size <= journal._compact_at + 4096
+    header, records = read_journal(str(path))
+    assert records[0][0] == STATE  # Rewritten from a snapshot
+    assert len(records) < 30 * 2  # Fewer than the STATE and SPILL records of every step
+    # Spilled steps survive the rewrite and can still be undone
+    undone = 0
+    while drawing_manager.undo():
+        undone += 1
+    assert undone == 30
+    assert drawing_manager.image[60, 100].tolist() == [255, 255, 255]
+
+    image = drawing_manager.image
+    journal.flush()
+    assert np.array_equal(new_document(path).image, image)
@@ -0,0 +1,102 @@
+import os
+import numpy as np
+import pytest
+from core.layers import LayerStack, MULTIPLY
+from drawing_manager import DrawingManager
+
+TILE = 32
+DOCUMENT = (0, 0, 128, 96)
+
+
+def make_stack():
+    """Background with a grey stripe, and a red square in the middle of a layer above it."""
+    stack = LayerStack(128, 96, tile_size=TILE)
+    stack.base.tiles.write((0, 40), np.full((16, 128, 3), 128, dtype=np.uint8))
+    layer = stack.add_layer()
+    layer.tiles.write((40, 40), np.full((16, 16, 4), (0, 0, 255, 255), dtype=np.uint8))
+    return stack, layer
+
+
+def assert_composite_matches_layers(stack):
+    """The cached composite must equal compositing every layer from scratch."""
+    assert np.array_equal(stack.composite().to_array(), stack.read(DOCUMENT))
+
+
+def test_only_background_layer_is_passed_through():
+    stack = LayerStack(128, 96, tile_size=TILE)
+    assert stack.composite() is stack.base.tiles
+    stack.add_layer()  # A blank layer does not show
+    assert stack.composite() is stack.base.tiles
+
+
+def test_edit_marks_only_touched_tiles_stale():
+    stack, layer = make_stack()
+    stack.composite()
+    assert not stack.stale_tiles
+
+    layer.tiles.write((70, 5), np.full((4, 4, 4), 255, dtype=np.uint8))
+    assert stack.stale_tiles == {(2, 0)}
+    assert_composite_matches_layers(stack)
+    assert not stack.stale_tiles
+
+
+def test_property_changes_invalidate_the_layer_bounds():
+    stack, layer = make_stack()
+    stack.composite()
+
+    assert stack.set_visible(1, False) == (32, 32, 32, 32)
+    assert stack.stale_tiles == {(1, 1)}
+    assert stack.composite().read((42, 42, 1, 1))[0, 0].tolist() == [128, 128, 128]
+    assert_composite_matches_layers(stack)
+
+    stack.set_visible(1, True)
+    stack.set_opacity(1, 0.5)
+    assert_composite_matches_layers(stack)
+    stack.set_blend_mode(1, MULTIPLY)
+    assert_composite_matches_layers(stack)
+    assert stack.set_opacity(1, 0.5) is None  # Unchanged properties invalidate nothing
+
+
+def test_layer_order_and_removal_recomposite():
+    stack, layer = make_stack()
+    top = stack.add_layer()
+    top.tiles.write((44, 44), np.full((4, 4, 4), (255, 0, 0, 255), dtype=np.uint8))
+    assert stack.composite().read((44, 44, 1, 1))[0, 0].tolist() == [255, 0, 0]
+
+    stack.move_layer(2, 1)  # Red layer on top now
+    assert stack.composite().read((44, 44, 1, 1))[0, 0].tolist() == [0, 0, 255]
+    stack.remove_layer(2)
+    assert_composite_matches_layers(stack)
+    stack.remove_layer(1)
+    assert stack.composite().read((44, 44, 1, 1))[0, 0].tolist() == [128, 128, 128]
+
+
+def test_released_composite_is_rebuilt():
+    stack, layer = make_stack()
+    expected = stack.composite().to_array()
+    stack.release()
+    assert not stack.composite_tiles.allocated_tiles()
+    assert np.array_equal(stack.composite().to_array(), expected)
+
+
+def test_memory_mapped_document_gets_a_memory_mapped_composite(tmp_path):
+    """A document larger than RAM must not be flattened into an in-RAM composite."""
+    backing_file = str(tmp_path / "document.raw")
+    manager = DrawingManager(width=128, height=96, tile_size=TILE, backing_file=backing_file)
+    stack = manager.layers
+    in_ram, _ = make_stack()
+    stack.base.tiles.write((0, 40), np.full((16, 128, 3), 128, dtype=np.uint8))
+    stack.add_layer().tiles.write((40, 40), np.full((16, 16, 4), (0, 0, 255, 255), dtype=np.uint8))
+
+    composite = stack.composite()
+    assert composite.backing_file == f"{backing_file}.composite"
+    assert os.path.exists(composite.backing_file)
+    assert np.array_equal(composite.to_array(), in_ram.composite().to_array())
+    assert composite.allocated_tiles()
+    assert manager.memory.usage()["composite"] == 0  # Mapped pages are not RAM the session holds
+
+
+def test_background_layer_cannot_be_removed():
+    stack, layer = make_stack()
+    with pytest.raises(ValueError):
+        stack.remove_layer(0)
@@ -0,0 +1,101 @@
+import gc
+import numpy as np
+from core.memory import BufferRegistry, ScratchBuffers
+
+MB = 2 ** 20
+
+
+class Cache:
+    """Evictable owner holding `nbytes` until evicted; records the order evictions happen in."""
+
+    def __init__(self, registry, owner, nbytes, priority, evicted):
+        self.nbytes = nbytes
+        self.owner = owner
+        self.evicted = evicted
+        registry.register(owner, lambda: self.nbytes, evict=self.evict, priority=priority)
+
+    def evict(self, bytes_to_free):
+        self.evicted.append((self.owner, bytes_to_free))
+        self.nbytes = 0
+
+
+def test_usage_is_reported_per_owner():
+    registry = BufferRegistry()
+    previews = registry.allocate("previews", (100, 100, 3))
+    copy = registry.copy("exports", np.zeros((10, 10), dtype=np.float32))
+    registry.register("document", lambda: 5 * MB)
+
+    assert registry.usage() == {"previews": 30000, "exports": 400, "document": 5 * MB}
+    assert registry.total() == 5 * MB + 30400
+    assert copy.dtype == np.float32 and previews.shape == (100, 100, 3)
+    assert registry.summary().startswith("Memory: 5.0 MB (document 5.0")
+
+
+def test_tracked_arrays_are_released_when_collected():
+    registry = BufferRegistry()
+    kept = registry.allocate("previews", (10, 10), fill=7)
+    dropped = registry.allocate("previews", (20, 20))
+    assert registry.usage() == {"previews": 500}
+
+    del dropped
+    gc.collect()
+    assert registry.usage() == {"previews": 100}
+    assert int(kept[0, 0]) == 7
+    del kept
+    gc.collect()
+    assert registry.usage() == {}
+
+
+def test_evictors_run_lowest_priority_first_and_stop_under_the_cap():
+    registry = BufferRegistry(max_bytes=10 * MB)
+    evicted = []
+    history = Cache(registry, "history", 6 * MB, 10, evicted)
+    pyramid = Cache(registry, "pyramid", 4 * MB, 0, evicted)
+    Cache(registry, "caches", 3 * MB, 0, evicted)  # Same priority: registration order
+
+    assert registry.enforce() == 9 * MB
+    assert evicted == [("pyramid", 3 * MB)]  # Under the cap again: caches and history are kept
+
+    history.nbytes = 12 * MB
+    evicted.clear()
+    assert registry.enforce() == 0
+    assert evicted == [("pyramid", 5 * MB), ("caches", 5 * MB), ("history", 2 * MB)]
+
+
+def test_enforce_asks_each_evictor_once_when_nothing_can_be_freed():
+    registry = BufferRegistry(max_bytes=MB)
+    calls = []
+    registry.register("pinned", lambda: 4 * MB, evict=calls.append)
+    assert registry.enforce() == 4 * MB
+    assert calls == [3 * MB]
+
+
+def test_allocation_enforces_the_cap():
+    registry = BufferRegistry(max_bytes=MB)
+    evicted = []
+    Cache(registry, "caches", MB, 0, evicted)
+    registry.allocate("previews", (512, 512))  # 256 KB over the cap
+    assert evicted == [("caches", MB // 4)]
+
+
+def test_reregistering_an_owner_replaces_it():
+    registry = BufferRegistry(max_bytes=0)
+    evicted = []
+    Cache(registry, "caches", MB, 0, evicted)
+    registry.register("caches", lambda: 0)  # Not evictable any more
+    assert registry.enforce() == 0
+    assert evicted == []
+
+
+def test_scratch_buffers_grow_and_are_evictable():
+    registry = BufferRegistry()
+    scratch = ScratchBuffers(registry)
+    small = scratch.get("mask", (10, 10))
+    big = scratch.get("mask", (20, 20))
+    assert scratch.get("mask", (5, 5)).base is big.base  # Reused, not reallocated
+    assert small.base is not big.base
+    assert registry.usage() == {"scratch": 400}
+
+    registry.max_bytes = 0
+    registry.enforce()
+    assert scratch.nbytes == 0
@@ -0,0 +1,112 @@
+import json
+import threading
+import time
+import pytest
+from core.profiler import Profiler
+
+MS = 1_000_000  # Nanoseconds
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = Profiler()
+    first, second = profiler.span("a"), profiler.tool_span(object(), "on_drag")
+    assert first is second  # One shared do-nothing span
+    with first:
+        pass
+    profiler.input_received()
+    profiler.frame_started()
+    profiler.frame_finished()
+    profiler.presented()
+    assert not (profiler.spans or profiler.frames or profiler.latencies or profiler.inputs)
+
+
+def test_spans_are_recorded_while_enabled():
+    profiler = Profiler()
+    profiler.enable()
+
+    class Pen:
+        pass
+
+    with profiler.span("render_view", "render"):
+        pass
+    with profiler.tool_span(Pen(), "on_drag"):
+        pass
+    assert [span[:3] for span in profiler.spans] == [("render_view", "render", threading.get_ident()),
+                                                     ("Pen.on_drag", "tool", threading.get_ident())]
+    assert all(span[4] >= 0 for span in profiler.spans)
+
+
+def test_ring_buffers_keep_the_newest_entries():
+    profiler = Profiler(capacity=3, history=2)
+    profiler.enable()
+    for index in range(5):
+        with profiler.span(f"span {index}"):
+            pass
+        profiler.input_received()
+    assert [span[0] for span in profiler.spans] == ["span 2", "span 3", "span 4"]
+    assert len(profiler.inputs) == 2
+
+
+def test_latency_runs_from_the_oldest_pending_input_to_the_present():
+    profiler = Profiler()
+    profiler.enable()
+    profiler.input_received()
+    oldest = profiler.inputs[0]
+    profiler.input_received()
+    profiler.presented()
+    profiler.presented()  # Nothing pending: no second latency
+    assert len(profiler.latencies) == 1
+    end, latency = profiler.latencies[0]
+    assert end - latency == oldest
+
+
+def test_stats():
+    """Frames and spans are injected with known durations, so the percentiles can be computed by hand."""
+    profiler = Profiler()
+    now = time.perf_counter_ns()
+    for index in range(10):
+        profiler.frames.append((now - index * MS, (index + 1) * MS))  # 1..10 ms frames
+    profiler.frames.append((now - 5000 * MS, 500 * MS))  # Outside the window
+    profiler.latencies.extend([(now, 8 * MS), (now, 4 * MS)])
+    profiler.inputs.extend([now] * 30)
+    profiler.spans.extend([("render", "render", 1, now, 3 * MS), ("render", "render", 1, now, 2 * MS),
+                           ("tool", "tool", 1, now, 4 * MS), ("frame", "frame", 1, now, 99 * MS),
+                           ("old", "app", 1, now - 5000 * MS, 50 * MS)])
+
+    stats = profiler.stats(window=2.0, top=5)
+    assert stats["fps"] == 5.0
+    assert stats["frame_ms"] == pytest.approx({"p50": 5.5, "p95": 9.55, "max": 10.0})
+    assert stats["latency_ms"] == pytest.approx({"p50": 6.0, "p95": 7.8, "max": 8.0})
+    assert stats["events_per_second"] == 15.0
+    assert stats["top_spans"] == [("render", 5.0, 2), ("tool", 4.0, 1)]
+    assert profiler.stats(window=2.0, top=1)["top_spans"] == [("render", 5.0, 2)]
+    assert Profiler().stats()["frame_ms"] == {"p50": 0.0, "p95": 0.0, "max": 0.0}
+
+
+def test_chrome_trace_is_valid_json(tmp_path):
+    profiler = Profiler()
+    profiler.enable()
+
+    def job():
+        with profiler.span("blur", "job"):
+            pass
+
+    profiler.frame_started()
+    profiler.input_received()
+    with profiler.span("render_view", "render"):
+        worker = threading.Thread(target=job)
+        worker.start()
+        worker.join()
+    profiler.frame_finished()
+    profiler.presented()
+
+    path = tmp_path / "trace.json"
+    profiler.export_chrome_trace(str(path))
+    trace = json.loads(path.read_text())
+    events = trace["traceEvents"]
+    complete = [event for event in events if event["ph"] == "X"]
+    assert sorted(event["name"] for event in complete) == ["blur", "frame", "render_view"]
+    assert all(event["ts"] >= 0 and event["dur"] >= 0 for event in complete)
+    assert [event["name"] for event in events if event["ph"] == "C"] == ["input latency"]
+    threads = {event["tid"]: event["args"]["name"] for event in events if event["ph"] == "M"}
+    assert len(threads) == 2 and "MainThread" in threads.values()  # One track per thread
@@ -0,0 +1,69 @@
+import cv2
+import numpy as np
+import pytest
+from core.pyramid import ImagePyramid
+from core.tile_store import TileStore
+
+SIZE = 1024  # Levels of 512, 256 and 128 pixels
+
+
+@pytest.fixture
+def document():
+    return TileStore(SIZE, SIZE, tile_size=64)
+
+
+@pytest.fixture
+def downsampled(monkeypatch):
+    """Record the child rectangles the pyramid box-filters."""
+    rects = []
+    downsample_tile = ImagePyramid._downsample_tile
+
+    def record(parent, level, rect):
+        rects.append((level.width, rect))
+        downsample_tile(parent, level, rect)
+
+    monkeypatch.setattr(ImagePyramid, '_downsample_tile', staticmethod(record))
+    return rects
+
+
+@pytest.mark.parametrize("zoom, level", [(2.0, 0), (1.0, 0), (0.5, 1), (0.3, 1), (0.2, 2), (0.1, 3), (0.01, 3)])
+def test_level_for_zoom(zoom, level):
+    assert ImagePyramid(SIZE, SIZE).level_for_zoom(zoom) == level
+
+
+def test_levels_are_box_downsamples(document):
+    image = np.random.default_rng(2).integers(0, 256, (SIZE, SIZE, 3), dtype=np.uint8)
+    document.write((0, 0), image)
+    pyramid = ImagePyramid(SIZE, SIZE)
+    pyramid.mark_dirty()
+
+    assert pyramid.level(0, document) is document
+    expected = image
+    for index in range(1, pyramid.level_count):
+        expected = cv2.resize(expected, (expected.shape[1] // 2, expected.shape[0] // 2), interpolation=cv2.INTER_AREA)
+        assert np.array_equal(pyramid.level(index, document).to_array(), expected)
+
+
+def test_only_tiles_under_a_change_are_downsampled_again(document, downsampled):
+    pyramid = ImagePyramid(SIZE, SIZE)
+    document.write((0, 0), np.zeros((SIZE, SIZE, 3), dtype=np.uint8))
+    pyramid.mark_dirty()
+    pyramid.update(document)
+    downsampled.clear()
+
+    pyramid.level(1, document)
+    assert downsampled == []  # Nothing changed: nothing rebuilt
+
+    document.write((700, 300), np.full((10, 10, 3), 255, dtype=np.uint8))
+    pyramid.mark_dirty((700, 300, 10, 10))
+    pyramid.level(3, document)
+    assert downsampled == [(512, (320, 128, 64, 64)), (256, (128, 64, 64, 64)), (128, (64, 0, 64, 64))]
+    assert tuple(pyramid.levels[0].read((352, 150, 1, 1))[0, 0]) == (255, 255, 255)
+
+
+def test_blank_document_allocates_no_levels(document, downsampled):
+    pyramid = ImagePyramid(SIZE, SIZE)
+    pyramid.mark_dirty()
+    pyramid.update(document)
+    assert downsampled == []
+    assert pyramid.nbytes == 0
@@ -0,0 +1,89 @@
+import pytest
+from core.events import PointerEvent
+
+QtCore = pytest.importorskip("PySide6.QtCore")
+from GUI.render_scheduler import RenderScheduler  # noqa: E402
+
+POINTS = [(20 + 9 * i, 30 + 4 * i) for i in range(12)]
+
+
+class DragTool:
+    """Draws each drag and records the presents seen while it was called."""
+
+    def __init__(self, drawing_manager, presents):
+        self.drawing_manager = drawing_manager
+        self.presents = presents
+        self.events = []
+        self.presents_during_drag = []
+
+    def on_drag(self, event):
+        self.events.append((event.x, event.y))
+        self.drawing_manager.stroke_polyline([(event.x, event.y), (event.x + 3, event.y)], (0, 0, 0), 2)
+        self.presents_during_drag.append(len(self.presents))
+
+
+class BatchTool(DragTool):
+    def __init__(self, drawing_manager, presents):
+        super().__init__(drawing_manager, presents)
+        self.batches = []
+
+    def on_drag_batch(self, points):
+        self.batches.append(list(points))
+        self.drawing_manager.stroke_polyline(points, (0, 0, 0), 2)
+
+
+@pytest.fixture(scope="module")
+def app():
+    """The scheduler's QTimer needs an application; no event loop runs, the tests flush by hand."""
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+
+@pytest.fixture
+def scheduler(app, drawing_manager):
+    return RenderScheduler(drawing_manager, refresh_rate=60)
+
+
+def presented(drawing_manager):
+    presents = []
+    drawing_manager.present_listeners.append(lambda *args: presents.append(args))
+    return presents
+
+
+def test_batch_tool_gets_all_points_of_a_frame_at_once(drawing_manager, scheduler):
+    presents = presented(drawing_manager)
+    tool = BatchTool(drawing_manager, presents)
+    for point in POINTS:
+        scheduler.queue_drag(tool, PointerEvent(*point))
+    assert tool.batches == [] and presents == []
+
+    scheduler.flush()
+    assert tool.batches == [POINTS]
+    assert tool.events == []
+    assert len(presents) == 1
+    assert scheduler.stats() == {"events_received": len(POINTS), "frames_presented": 1,
+                                 "coalesced_events": len(POINTS) - 1}
+
+    scheduler.flush()  # Nothing pending: no second frame
+    assert len(tool.batches) == 1 and len(presents) == 1
+
+
+def test_tool_without_batching_gets_every_event_in_one_frame(drawing_manager, scheduler):
+    presents = presented(drawing_manager)
+    tool = DragTool(drawing_manager, presents)
+    for point in POINTS:
+        scheduler.queue_drag(tool, PointerEvent(*point))
+    scheduler.flush()
+
+    assert tool.events == POINTS
+    assert tool.presents_during_drag == [0] * len(POINTS)  # Nothing presented between events
+    assert len(presents) == 1
+
+
+def test_switching_tools_flushes_the_previous_batch(drawing_manager, scheduler):
+    presents = presented(drawing_manager)
+    first, second = BatchTool(drawing_manager, presents), BatchTool(drawing_manager, presents)
+    scheduler.queue_drag(first, PointerEvent(*POINTS[0]))
+    scheduler.queue_drag(second, PointerEvent(*POINTS[1]))
+    assert first.batches == [[POINTS[0]]]
+    scheduler.flush()
+    assert second.batches == [[POINTS[1]]]
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+from core.compositing import StrokeBuffer
+from tools.Brush.stamp_engine import PRESETS, StampEngine
+
+PATH = [(20.0, 30.0), (61.0, 44.0), (90.0, 90.0), (150.0, 95.0), (171.0, 40.0), (230.0, 120.0)]
+
+
+def resample_in_chunks(points, chunks, spacing=3.5):
+    """Dab positions of a path fed to one engine in the given chunk sizes."""
+    engine = StampEngine()
+    engine.begin_stroke(points[0])
+    positions, start = [], 1
+    for size in chunks:
+        positions.append(engine.resample(points[start:start + size], spacing))
+        start += size
+    return np.concatenate(positions)
+
+
+def read_coverage(buffer, rect):
+    """Coverage of a StrokeBuffer over a document rectangle, 0 where nothing was allocated."""
+    x, y, width, height = rect
+    out = np.zeros((height, width), dtype=np.uint8)
+    if buffer.rect is not None:
+        bx, by, bw, bh = buffer.rect
+        out[by - y:by - y + bh, bx - x:bx - x + bw] = buffer.coverage
+    return out
+
+
+@pytest.mark.parametrize("chunks", [[1] * 5, [2, 3], [4, 1], [1, 2, 2]])
+def test_dab_positions_do_not_depend_on_event_chunking(chunks):
+    whole = resample_in_chunks(PATH, [5])
+    assert np.allclose(resample_in_chunks(PATH, chunks), whole)
+
+
+def test_dabs_are_evenly_spaced_along_the_path():
+    positions = resample_in_chunks([(0.0, 0.0), (10.0, 0.0), (10.0, 10.0)], [1, 1], spacing=2.5)
+    assert positions[0].tolist() == [0.0, 0.0]  # First dab on the start point
+    distances = np.hypot(*np.diff(positions, axis=0).T)
+    assert np.allclose(distances[:3], 2.5) and len(positions) == 9
+
+
+def test_dab_cache_evicts_least_recently_used():
+    engine = StampEngine(cache_size=2)
+    small = engine.dab("round", 8, 0.5, 1.0)
+    engine.dab("round", 9, 0.5, 1.0)
+    assert engine.dab("round", 8, 0.5, 1.0) is small  # Hit, and now the most recent
+    engine.dab("round", 10, 0.5, 1.0)  # Evicts size 9
+    assert engine.dab("round", 8, 0.5, 1.0) is small
+    assert engine.nbytes == 8 * 8 + 10 * 10
+
+    engine.dab("round", 9, 0.5, 1.0)  # Rebuilt, evicting size 10
+    assert engine.nbytes == 8 * 8 + 9 * 9
+    engine.clear_cache()
+    assert engine.nbytes == 0
+
+
+def test_one_batched_stamp_equals_stamping_dab_by_dab():
+    """
+    Dabs are combined with a per-pixel maximum, so one vectorized stamp of all dabs gives
+    exactly what stamping them one at a time, in any order, gives.
+    """
+    engine = StampEngine()
+    dab = engine.dab("round", 13, 0.3, 0.8)
+    positions = np.array([(5.0, 5.0), (11.5, 7.0), (18.0, 9.5), (24.0, 12.0), (196.0, 98.0)])
+
+    batched = StrokeBuffer(200, 100, (0, 0, 0))
+    engine.stamp(batched, positions, dab)
+    one_by_one = StrokeBuffer(200, 100, (0, 0, 0))
+    for position in positions[::-1]:
+        engine.stamp(one_by_one, position[None], dab)
+
+    canvas = (0, 0, 200, 100)
+    assert np.array_equal(read_coverage(batched, canvas), read_coverage(one_by_one, canvas))
+    assert read_coverage(batched, canvas).max() == dab.max()  # Overlaps did not build up
+
+
+@pytest.mark.parametrize("brush_type", sorted(PRESETS))
+def test_stroke_pixels_do_not_depend_on_event_chunking(brush_type):
+    buffers = []
+    for chunks in ([5], [1] * 5, [3, 2]):
+        engine = StampEngine()
+        buffer = StrokeBuffer(256, 160, (0, 0, 0))
+        engine.begin_stroke(PATH[0])
+        start = 1
+        for size in chunks:
+            engine.stroke_to(buffer, PATH[start:start + size], PRESETS[brush_type], 14, seed=5)
+            start += size
+        buffers.append(read_coverage(buffer, (0, 0, 256, 160)))
+    assert np.array_equal(buffers[0], buffers[1]) and np.array_equal(buffers[0], buffers[2])
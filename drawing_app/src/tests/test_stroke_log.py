@@ -0,0 +1,118 @@
+import os
+import numpy as np
+import pytest
+from core.events import PointerEvent
+from core.stroke_log import (StrokeRecorder, StrokeLogWriter, prune_stroke_logs, read_stroke_log, replay,
+                             session_stroke_log, PRESS, DRAG, RELEASE)
+from drawing_manager import DrawingManager
+from tools.registry import TOOL_TYPES
+
+# (tool id, settings, points) of a short session touching every recordable tool
+SESSION = [
+    ("Pen", {}, [(20, 20), (60, 40), (110, 35), (150, 80)]),
+    ("Pencil", {}, [(30, 150), (90, 120), (140, 160)]),
+    ("Line", {}, [(200, 20), (280, 170)]),
+    ("Shapes", {"shape_type": "ellipse"}, [(160, 100), (240, 180)]),
+    ("Brush", {"brush_type": "textured"}, [(40, 100), (80, 110), (120, 95), (170, 130)]),
+    ("BlurBrush", {"blur_strength": 6}, [(20, 30), (70, 45), (140, 60)]),
+]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 0.01
+        return self.now
+
+
+def record_session(drawing_manager, recorder):
+    """Drive the tools the way GUI.mouse_events does, recording every stroke."""
+    for index, (tool_id, settings, points) in enumerate(SESSION):
+        tool = TOOL_TYPES[tool_id](drawing_manager)
+        for name, value in settings.items():
+            setattr(tool, name, value)
+        drawing_manager.set_color((40 * index, 0, 255 - 40 * index))
+        drawing_manager.set_thickness(3 + index)
+        recorder.begin(tool, drawing_manager, PointerEvent(*points[0]))
+        tool.on_press(PointerEvent(*points[0]))
+        recorder.capture_parameters(tool)
+        for point in points[1:]:
+            recorder.drag(PointerEvent(*point))
+            tool.on_drag(PointerEvent(*point))
+        recorder.end(PointerEvent(*points[-1]))
+        tool.on_release(PointerEvent(*points[-1]))
+
+
+def test_log_round_trip_replays_the_same_pixels(tmp_path):
+    path = str(tmp_path / "session.strokes")
+    original = DrawingManager(width=300, height=200, tile_size=64)
+    writer = StrokeLogWriter(path)
+    record_session(original, StrokeRecorder(writer, clock=FakeClock()))
+    writer.close()
+
+    records = read_stroke_log(path)
+    assert [record.tool_id for record in records] == [tool_id for tool_id, _, _ in SESSION]
+    assert records[3].parameters["shape_type"] == "ellipse"
+    assert records[0].kinds.tolist() == [PRESS, DRAG, DRAG, DRAG, RELEASE]
+
+    replayed = DrawingManager(width=300, height=200, tile_size=64)
+    result = replay(records, replayed, TOOL_TYPES)
+    assert result["strokes"] == len(SESSION)
+    assert np.array_equal(replayed.image, original.image)
+
+
+def test_replay_at_recorded_speed_waits_between_events():
+    records = []
+    recorder = StrokeRecorder(clock=FakeClock())
+    recorder.listeners.append(records.append)
+    record_session(DrawingManager(width=300, height=200), recorder)
+
+    waits = []
+    replay(records[:1], DrawingManager(width=300, height=200), TOOL_TYPES, speed=2.0,
+           clock=lambda: 0.0, sleep=waits.append)  # Time stands still, so every event is waited for
+    expected = (records[0].start_time + records[0].times.astype(np.float64)) / 2.0
+    assert waits == pytest.approx(expected.tolist(), abs=1e-6)
+
+
+def test_truncated_log_keeps_complete_strokes(tmp_path):
+    path = tmp_path / "session.strokes"
+    writer = StrokeLogWriter(str(path))
+    record_session(DrawingManager(width=300, height=200), StrokeRecorder(writer, clock=FakeClock()))
+    writer.close()
+    data = path.read_bytes()
+    path.write_bytes(data[:-10])  # A crash in the middle of the last chunk
+
+    assert len(read_stroke_log(str(path))) == len(SESSION) - 1
+
+
+def test_other_files_are_rejected(tmp_path):
+    path = tmp_path / "not_a_log"
+    path.write_bytes(b"hello")
+    with pytest.raises(ValueError):
+        read_stroke_log(str(path))
+
+
+def test_every_session_gets_its_own_log(tmp_path):
+    """A new session never replaces the log of an earlier one, even one started in the same second."""
+    directory = str(tmp_path)
+    first = session_stroke_log(directory, "session", when=1_700_000_000)
+    StrokeLogWriter(first).close()
+    second = session_stroke_log(directory, "session", when=1_700_000_000)
+    assert second != first and second.endswith(".strokes")
+    assert session_stroke_log(directory, "session", when=1_700_000_001) != first
+
+
+def test_pruning_keeps_the_newest_logs_and_those_of_running_sessions(tmp_path):
+    directory = str(tmp_path)
+    exited = [session_stroke_log(directory, "session", when=1_700_000_000 + day * 86400, pid=2 ** 22 + day)
+              for day in range(4)]  # Far above any real pid
+    running = session_stroke_log(directory, "session", when=1_600_000_000)  # Oldest, but this process
+    for path in exited + [running]:
+        StrokeLogWriter(path).close()
+    (tmp_path / "other.strokes").write_bytes(b"")
+
+    assert sorted(prune_stroke_logs(directory, "session", keep=2)) == sorted(exited[:2])
+    assert sorted(os.listdir(directory)) == sorted([os.path.basename(path) for path in exited[2:] + [running]]
+                                                   + ["other.strokes"])
@@ -0,0 +1,119 @@
+import cv2
+import numpy as np
+import pytest
+from core.tile_store import TileStore
+
+WIDTH, HEIGHT, TILE = 200, 150, 64  # Partial tiles on the right and bottom edges
+WHITE = (255, 255, 255)
+
+
+@pytest.fixture(params=["ram", "memmap"])
+def tiles(request, tmp_path):
+    backing_file = str(tmp_path / "tiles.raw") if request.param == "memmap" else None
+    return TileStore(WIDTH, HEIGHT, WHITE, tile_size=TILE, backing_file=backing_file)
+
+
+def random_image(seed=3):
+    return np.random.default_rng(seed).integers(0, 256, (HEIGHT, WIDTH, 3), dtype=np.uint8)
+
+
+def test_blank_tiles_cost_no_memory(tiles):
+    assert tiles.nbytes == 0
+    assert np.array_equal(tiles.to_array(), np.full((HEIGHT, WIDTH, 3), 255, dtype=np.uint8))
+
+    tiles.write((10, 10), np.full((100, 100, 3), 255, dtype=np.uint8))  # Background only
+    assert tiles.allocated_tiles() == []
+    tiles.write((70, 70), np.zeros((2, 2, 3), dtype=np.uint8))
+    assert tiles.allocated_tiles() == [(1, 1)]
+    assert tiles.nbytes == TILE * TILE * 3
+    assert not tiles.is_blank((60, 60, 20, 20)) and tiles.is_blank((0, 0, 64, 64))
+
+
+def test_write_and_read_across_tiles(tiles):
+    image = random_image()
+    tiles.write((0, 0), image)
+    assert np.array_equal(tiles.to_array(), image)
+    assert np.array_equal(tiles.read((50, 40, 100, 60)), image[40:100, 50:150])
+
+    outside = tiles.read((-10, -10, 20, 20))  # Parts outside the canvas read as background
+    assert np.array_equal(outside[:10], np.full((10, 20, 3), 255, dtype=np.uint8))
+    assert np.array_equal(outside[10:, 10:], image[:10, :10])
+
+
+def test_memmap_and_ram_stores_agree(tmp_path):
+    stores = [TileStore(WIDTH, HEIGHT, WHITE, tile_size=TILE),
+              TileStore(WIDTH, HEIGHT, WHITE, tile_size=TILE, backing_file=str(tmp_path / "tiles.raw"))]
+    for store in stores:
+        store.write((30, 20), random_image()[:90, :120])
+        store.draw((0, 0, WIDTH, HEIGHT), lambda region, x, y: cv2.line(region, (5 - x, 140 - y), (195 - x, 3 - y), (0, 0, 255), 3))
+        store.clear_rect((100, 64, 64, 64))
+    assert np.array_equal(stores[0].to_array(), stores[1].to_array())
+    assert sorted(stores[0].allocated_tiles()) == sorted(stores[1].allocated_tiles())
+
+
+def test_draw_across_tile_edges_matches_a_dense_image(tiles):
+    """Primitives are rasterized in one piece, so lines do not shift where they cross tile edges."""
+    expected = np.full((HEIGHT, WIDTH, 3), 255, dtype=np.uint8)
+    cv2.line(expected, (10, 120), (190, 7), (0, 0, 0), 1)
+    cv2.circle(expected, (64, 64), 30, (0, 255, 0), 5)
+
+    tiles.draw((0, 0, WIDTH, HEIGHT), lambda region, x, y: cv2.line(region, (10 - x, 120 - y), (190 - x, 7 - y), (0, 0, 0), 1))
+    tiles.draw((31, 31, 67, 67), lambda region, x, y: cv2.circle(region, (64 - x, 64 - y), 30, (0, 255, 0), 5))
+    assert np.array_equal(tiles.to_array(), expected)
+
+
+def test_clear_rect_releases_covered_tiles_and_resets_partial_ones(tiles):
+    tiles.write((0, 0), random_image())
+    tiles.clear_rect((64, 0, 100, 64))
+    assert not tiles.is_allocated(1, 0)  # Fully covered
+    assert tiles.is_allocated(2, 0)  # Partly covered
+    assert np.array_equal(tiles.read((64, 0, 100, 64)), np.full((64, 100, 3), 255, dtype=np.uint8))
+    assert not np.array_equal(tiles.read((164, 0, 36, 64)), np.full((64, 36, 3), 255, dtype=np.uint8))
+
+
+def test_copy_is_independent(tiles):
+    image = random_image()
+    tiles.write((0, 0), image)
+    part = tiles.copy((70, 70, 10, 10))
+    full = tiles.copy()
+    tiles.clear()
+
+    assert part.backing_file is None
+    assert part.allocated_tiles() == [(1, 1)]
+    assert np.array_equal(part.read((64, 64, 64, 64)), image[64:128, 64:128])
+    assert np.array_equal(full.to_array(), image)
+    assert tiles.nbytes == 0
+
+
+def test_set_array_writes_only_tiles_that_differ(tiles):
+    image = random_image()
+    tiles.set_array(image)
+    changed = []
+    tiles.on_change = changed.append
+
+    image[100, 130] = (1, 2, 3)
+    tiles.set_array(image)
+    assert changed == [(128, 64, 64, 64)]
+    assert np.array_equal(tiles.to_array(), image)
+
+
+def test_change_hooks(tiles):
+    before, changed = [], []
+    tiles.before_change = lambda tile_x, tile_y: before.append((tile_x, tile_y))
+    tiles.on_change = changed.append
+
+    tiles.write((60, 10), np.zeros((10, 10, 3), dtype=np.uint8))
+    assert before == [(0, 0), (1, 0)]
+    assert changed == [(60, 10, 10, 10)]
+
+    before.clear()
+    changed.clear()
+    tiles.write((195, 140), np.zeros((20, 20, 3), dtype=np.uint8))  # Clipped to the canvas
+    assert before == [(3, 2)]
+    assert changed == [(195, 140, 5, 10)]
+
+    before.clear()
+    changed.clear()
+    tiles.restore_tile(0, 0, None)
+    assert before == [(0, 0)]
+    assert changed == [(0, 0, 64, 64)]
@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+from core.events import PointerEvent
+from core.headless import HeadlessCanvas
+from drawing_manager import DrawingManager
+from GUI.canvas_manager import CanvasManager
+from tools.registry import TOOL_TYPES
+from tools.shapes import Shapes
+from tools.turtle_tool import TurtleTool
+
+STROKE = [(40, 50), (90, 70), (140, 110), (200, 150)]
+
+
+def make_tool(tool_type, drawing_manager):
+    tool = tool_type(drawing_manager)
+    if hasattr(tool, 'seed'):
+        tool.seed = 7  # Brushes are random per stroke otherwise
+    drawing_manager.set_color((0, 0, 255))
+    drawing_manager.set_thickness(6)
+    return tool
+
+
+def drive(tool, points=STROKE, batch=False):
+    tool.on_press(PointerEvent(*points[0]))
+    if batch:
+        tool.on_drag_batch(list(points[1:]))
+    else:
+        for point in points[1:]:
+            tool.on_drag(PointerEvent(*point))
+    tool.on_release(PointerEvent(*points[-1]))
+
+
+def changed_bounds(before, after):
+    rows, columns = np.nonzero(np.any(before != after, axis=2))
+    return (columns.min(), rows.min(), columns.max(), rows.max()) if len(rows) else None
+
+
+@pytest.mark.parametrize("tool_id", sorted(TOOL_TYPES))
+def test_tool_draws_around_the_stroke_and_undoes(drawing_manager, tool_id):
+    if tool_id == "BlurBrush":
+        drawing_manager.stroke_polyline(STROKE, (0, 0, 0), 3)  # Something to blur
+        drawing_manager.history.checkpoint()
+    before = drawing_manager.image
+    drive(make_tool(TOOL_TYPES[tool_id], drawing_manager))
+
+    bounds = changed_bounds(before, drawing_manager.image)
+    assert bounds is not None
+    left, top, right, bottom = bounds
+    assert left >= 20 and top >= 30 and right <= 220 and bottom <= 170
+    assert drawing_manager.undo()
+    assert np.array_equal(drawing_manager.image, before)
+
+
+@pytest.mark.parametrize("tool_id", sorted(TOOL_TYPES))
+def test_managers_share_one_drawing_interface(tool_id):
+    """A tool paints the same pixels through a DrawingManager as through the GUI's CanvasManager."""
+    images = []
+    for manager in (DrawingManager(width=256, height=192, tile_size=64),
+                    CanvasManager(HeadlessCanvas(256, 192), 256, 192)):
+        inner = getattr(manager, 'drawing_manager', manager)
+        inner.stroke_polyline(STROKE, (0, 0, 0), 3)
+        drive(make_tool(TOOL_TYPES[tool_id], manager))
+        images.append(inner.image)
+    assert np.array_equal(*images)
+
+
+def test_batched_drags_match_single_drags():
+    images = []
+    for batch in (False, True):
+        drawing_manager = DrawingManager(width=256, height=192)
+        drive(make_tool(TOOL_TYPES["Pen"], drawing_manager), batch=batch)
+        images.append(drawing_manager.image)
+    assert np.array_equal(*images)
+
+
+def test_line_is_drawn_once_on_release(drawing_manager):
+    tool = make_tool(TOOL_TYPES["Line"], drawing_manager)
+    tool.on_press(PointerEvent(10, 10))
+    tool.on_drag(PointerEvent(100, 10))
+    assert not drawing_manager.history.can_undo()  # Only a preview while dragging
+    tool.on_release(PointerEvent(100, 100))
+    assert drawing_manager.image[55, 55].tolist() == [0, 0, 255]
+    assert drawing_manager.image[10, 60].tolist() == [255, 255, 255]
+
+
+def test_ellipse_shape(drawing_manager):
+    tool = make_tool(Shapes, drawing_manager)
+    tool.shape_type = 'ellipse'
+    drive(tool, [(50, 50), (150, 130)])
+    assert drawing_manager.image[90, 100].tolist() == [255, 255, 255]  # Outline only
+    assert changed_bounds(np.full_like(drawing_manager.image, 255), drawing_manager.image) is not None
+
+
+def test_turtle_draws_headless(drawing_manager):
+    turtle = TurtleTool(drawing_manager, start_position=(150, 100))
+    turtle.draw_square(40)
+    turtle.draw_circle(10)
+    assert changed_bounds(np.full_like(drawing_manager.image, 255), drawing_manager.image) is not None
+
+
+def test_pencil_and_pen_opacity_blend_lines(drawing_manager):
+    """Pencil draws at half opacity, and a pen set to 0.25 blends a quarter of its colour over the page."""
+    drawing_manager.set_color((0, 0, 0))
+    drive(TOOL_TYPES["Pencil"](drawing_manager), [(20, 50), (120, 50), (220, 50)])
+    assert drawing_manager.image[50, 70].tolist() == [127, 127, 127]
+
+    pen = TOOL_TYPES["Pen"](drawing_manager)
+    pen.set_opacity(0.25)
+    drive(pen, [(20, 150), (120, 150), (220, 150)], batch=True)
+    assert drawing_manager.image[150, 70].tolist() == [191, 191, 191]
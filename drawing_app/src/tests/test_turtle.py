@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from core.turtle import (FORWARD, GOTO, MOVE, PEN_DOWN, PEN_UP, POP, PUSH, TURN, TurtleState, expand_lsystem,
+                         lsystem_commands, parse_program, trace)
+from tools.turtle_tool import TurtleTool
+
+SQUARE = [(0, 0), (10, 0), (10, 10), (0, 10), (0, 0)]  # Right turns go clockwise on screen, where y grows downwards
+
+
+def test_parse_aliases_comments_and_separators():
+    program = """
+        fd 10; bk 5   # back moves backwards
+        lt 30 rt 45
+        pu goto 3 4 pd
+    """
+    assert parse_program(program) == [(FORWARD, 10.0), (FORWARD, -5.0), (TURN, 30.0), (TURN, -45.0),
+                                      (PEN_UP, None), (GOTO, (3.0, 4.0)), (PEN_DOWN, None)]
+
+
+def test_parse_nested_repeats():
+    commands = parse_program("repeat 2 [ fd 1 repeat 3 [lt 90] ] push pop")
+    assert commands == ([(FORWARD, 1.0)] + [(TURN, 90.0)] * 3) * 2 + [(PUSH, None), (POP, None)]
+
+
+@pytest.mark.parametrize("program, message", [
+    ("fd 10 jump 3", "Unknown turtle command 'jump'"),
+    ("fd", "'fd' needs an argument"),
+    ("goto 5", "'goto' needs an argument"),
+    ("repeat 3 fd 10", "needs a block"),
+    ("repeat 2 [ fd 10 repeat 2 [ lt 90 ]", "Missing ']'"),
+    ("fd 10 ]", "Unmatched ']'"),
+])
+def test_malformed_programs_raise(program, message):
+    with pytest.raises(ValueError, match=message):
+        parse_program(program)
+
+
+def test_expand_lsystem_rewrites_every_symbol_in_each_pass():
+    assert expand_lsystem("F", {"F": "F+F"}, 2) == "F+F+F+F"
+    assert expand_lsystem("A", {"A": "AB", "B": "A"}, 4) == "ABAABABA"  # Fibonacci word
+    koch = expand_lsystem("F", {"F": "F+F-F-F+F"}, 3)
+    assert koch.count("F") == 5 ** 3
+
+
+def test_lsystem_commands():
+    commands = lsystem_commands("F[+f]-GX", 5, 60)
+    assert commands == [(FORWARD, 5), (PUSH, None), (TURN, 60), (MOVE, 5), (POP, None), (TURN, -60), (FORWARD, 5)]
+
+
+def test_trace_square():
+    state = TurtleState()
+    polylines = trace(parse_program("repeat 4 [ fd 10 rt 90 ]"), state)
+    assert len(polylines) == 1
+    assert np.allclose(polylines[0], SQUARE)
+    assert np.allclose(state.position, (0, 0)) and state.angle == 0
+
+
+def test_trace_splits_polylines_at_pen_changes_and_saved_states():
+    polylines = trace(parse_program("fd 10 pu fd 5 pd fd 5 push lt 90 fd 3 pop fd 1"))
+    assert [line.tolist() for line in polylines] == [
+        [[0, 0], [10, 0]],
+        [[15, 0], [20, 0]],
+        [[20, 0], [20, -3]],
+        [[20, 0], [21, 0]],  # Back where push saved the turtle
+    ]
+
+
+def test_run_lsystem_draws_its_expansion(drawing_manager):
+    """F -> F+F twice is four sides turning left, so a square above and right of the start."""
+    turtle = TurtleTool(drawing_manager, start_position=(100, 100))
+    polylines = turtle.run_lsystem("F", {"F": "F+F"}, 2, step=20)
+
+    assert np.allclose(polylines[0], [(100, 100), (120, 100), (120, 80), (100, 80), (100, 100)])
+    assert turtle.angle == 270  # Three left turns
+    image = drawing_manager.image
+    assert (image[100, 110] != 255).any() and (image[90, 110] == 255).all()
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+from core.tile_store import TileStore
+from core.view_transform import ViewTransform
+
+
+class ReadSpy:
+    """TileStore wrapper recording the rectangles `ViewTransform.render` reads."""
+
+    def __init__(self, tiles):
+        self.tiles = tiles
+        self.width, self.height = tiles.width, tiles.height
+        self.reads = []
+
+    def read(self, rect):
+        self.reads.append(rect)
+        return self.tiles.read(rect)
+
+
+@pytest.mark.parametrize("zoom", [0.25, 0.5, 1.0, 1.5, 4.0])
+def test_document_and_view_points_round_trip(zoom):
+    view = ViewTransform(400, 300, 2000, 1500, zoom=zoom)
+    view.pan(137, 59)
+    for point in [(0, 0), (123, 456), (1999, 1499)]:
+        x, y = view.to_document(view.to_view(point, as_int=False), as_int=False)
+        assert (x, y) == pytest.approx(point)
+    for point in [(0, 0), (200, 150), (399, 299)]:
+        assert view.to_view(view.to_document(point, as_int=False), as_int=False) == pytest.approx(point)
+
+
+def test_zoom_is_clamped():
+    assert ViewTransform(400, 300, 2000, 1500, zoom=0.01).zoom == 0.1
+    view = ViewTransform(400, 300, 2000, 1500)
+    view.set_zoom(100)
+    assert view.zoom == 32.0
+    view.set_zoom(0.001)
+    assert view.zoom == 0.1
+
+
+def test_zoom_keeps_the_anchor_in_place():
+    view = ViewTransform(400, 300, 2000, 1500, zoom=2.0)
+    view.center_on((1000, 750))
+    anchor = (100, 80)
+    before = view.to_document(anchor, as_int=False)
+    view.set_zoom(3.0, anchor)
+    assert view.to_document(anchor, as_int=False) == pytest.approx(before, abs=0.5)
+
+
+def test_pan_stays_inside_the_document():
+    view = ViewTransform(400, 300, 1000, 800, zoom=1.0)
+    view.pan(-50, -50)
+    assert (view.offset_x, view.offset_y) == (0, 0)
+    view.pan(5000, 5000)
+    assert (view.offset_x, view.offset_y) == (600, 500)
+    assert view.visible_document_rect() == (600, 500, 400, 300)
+
+
+@pytest.mark.parametrize("zoom", [0.5, 1.0, 3.0])
+def test_render_reads_only_the_document_under_the_viewport(zoom):
+    tiles = TileStore(2000, 1500, tile_size=256)
+    tiles.write((0, 0), np.random.default_rng(1).integers(0, 256, (1500, 2000, 3), dtype=np.uint8))
+    view = ViewTransform(320, 240, 2000, 1500, zoom=zoom)
+    view.center_on((1000, 750))
+    spy = ReadSpy(tiles)
+    dst = np.empty((240, 320, 3), dtype=np.uint8)
+    view.render(spy, (0, 0, 320, 240), dst)
+
+    (x, y, width, height), = spy.reads
+    visible = view.visible_document_rect()
+    assert x <= visible[0] and y <= visible[1]
+    assert x + width >= visible[0] + visible[2] and y + height >= visible[1] + visible[3]
+    assert width <= visible[2] + 3 and height <= visible[3] + 3  # Only the interpolation margin extra
+    assert np.array_equal(view.render(tiles.to_array(), (0, 0, 320, 240), np.empty_like(dst)), dst)
+
+
+def test_render_fills_outside_the_document():
+    view = ViewTransform(200, 200, 50, 50, zoom=1.0)
+    dst = view.render(np.zeros((50, 50, 3), dtype=np.uint8), (0, 0, 200, 200), np.empty((200, 200, 3), np.uint8))
+    assert tuple(dst[10, 10]) == (0, 0, 0)
+    assert tuple(dst[150, 150]) == (128, 128, 128)
@@ -0,0 +1,75 @@
+import logging
+import os
+import time
+import pytest
+from core.watchdog import StallWatchdog, budget_from_environment
+
+STALL = 0.2  # Seconds; four times the budget
+
+
+def beat(watchdog, seconds):
+    """Service heartbeats from this thread for a while, like the GUI's heartbeat timer."""
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        watchdog.heartbeat()
+        time.sleep(0.002)
+
+
+def stall():
+    time.sleep(STALL)
+
+
+def other_stall():
+    time.sleep(STALL)
+
+
+def watch(stalls, log):
+    """Run `stalls` (callables) on this thread between heartbeats and return the stopped watchdog."""
+    watchdog = StallWatchdog(budget=0.05, interval=0.01, log=log)
+    watchdog.start()
+    try:
+        beat(watchdog, 0.05)
+        for function in stalls:
+            function()
+            beat(watchdog, 0.1)  # Heartbeats resume, so the stall is recorded
+    finally:
+        watchdog.stop()
+    return watchdog
+
+
+def test_stalls_are_timed_and_grouped_by_call_site():
+    lines = []
+    watchdog = watch([stall, stall, other_stall], lines.append)
+
+    assert sorted(site.split(" in ")[1] for site in watchdog.sites) == ["other_stall", "stall"]
+    entry = next(entry for site, entry in watchdog.sites.items() if site.endswith(" in stall"))
+    assert entry.site.startswith(os.path.join("tests", "test_watchdog.py") + ":")  # Relative to the sources
+    assert entry.count == 2
+    assert STALL * 0.75 < entry.longest < STALL * 2
+    assert STALL * 1.5 < entry.total < STALL * 4
+    assert "time.sleep(STALL)" in entry.stack
+    assert len(lines) == 3 and "(2 times)" in lines[1]
+    assert watchdog.report().splitlines()[1].endswith(entry.site)  # Most stalled time first
+
+
+def test_heartbeats_within_the_budget_are_not_stalls(caplog):
+    with caplog.at_level(logging.WARNING, logger="core.watchdog"):
+        watchdog = watch([lambda: time.sleep(0.02)], None)
+    assert watchdog.sites == {}
+    assert watchdog.report() == "No GUI thread stalls."
+    assert not caplog.records
+
+
+def test_stalls_are_logged_by_default(caplog):
+    with caplog.at_level(logging.WARNING, logger="core.watchdog"):
+        watch([stall], None)
+    assert len(caplog.records) == 1 and "in stall" in caplog.records[0].getMessage()
+
+
+def test_watchdog_is_opt_in():
+    assert budget_from_environment({}) is None
+    assert budget_from_environment({"DRAWING_APP_WATCHDOG": " "}) is None
+    assert budget_from_environment({"DRAWING_APP_WATCHDOG": "50"}) == 0.05
+    for value in ("0", "-5", "fast"):
+        with pytest.raises(ValueError):
+            budget_from_environment({"DRAWING_APP_WATCHDOG": value})
@@ -1,84 +1,293 @@
+import threading
+import time
 import cv2
 import numpy as np
 from tools.tool import Tool
+from core.jobs import FunctionJob, HIGH
+from core.compositing import blend_pixels
+from core.dirty_region import line_bounds, intersect
+
+BLUR_MIX = 0.3  # Share of the blurred pixels mixed in by each segment
+SPEED_FACTORS = range(1, 11)  # Speed factors _adjust_blur_based_on_speed can produce
+CELL_SIZE = 128  # Side of the cells blur levels are computed for
+LOOKAHEAD = 64  # Pixels around the stroke whose cells are queued before the stroke gets there
+RELEASE_WAIT = 1 / 60  # Seconds a release waits for missing levels, one frame, before landing the rest later
+
+
+class BlurLevels:
+    def __init__(self, read, width, height, strengths, jobs, registry=None, cell_size=CELL_SIZE):
+        """
+        Pre-blurred copies of the layer around a stroke, computed cell by cell in the background.
+
+        `request` copies the pixels of cells near the stroke, with a margin for the blur
+        kernel, and queues their blur at every strength, strongest first, since slow strokes
+        use it. Only cells the stroke comes close to are ever copied or blurred. `get` is
+        called from the GUI thread and reports each cell to the memory registry the first
+        time it is used.
+
+        :param read: Callable returning a copy of an (x, y, w, h) rectangle of the layer.
+        :param width: Width of the document.
+        :param height: Height of the document.
+        :param strengths: Blur strengths to prepare; strength s is a (2s + 1) Gaussian kernel.
+        :param jobs: JobService to compute the cells in, at high priority since the stroke waits for them.
+        :param registry: Optional BufferRegistry to report the levels to (as "previews").
+        :param cell_size: Side of the cells.
+        """
+        self.read = read
+        self.document = (0, 0, width, height)
+        self.strengths = sorted(strengths, reverse=True)
+        self.halo = self.strengths[0]  # Pixels of context the strongest kernel reads around a cell
+        self.jobs = jobs
+        self.registry = registry
+        self.cell_size = cell_size
+        self.pending = []  # Jobs computing cells
+        self._requested = set()  # (cell_x, cell_y) of cells queued so far
+        self._levels = {}  # (strength, cell_x, cell_y) -> blurred pixels of the cell
+        self._tracked = set()
+        self._on_ready = None  # Callback waiting for the pending jobs; see when_ready
+        self._lock = threading.Lock()  # Without the GUI's dispatch, done listeners run on the workers
+
+    def request(self, rect):
+        """
+        Queue the cells overlapping an (x, y, w, h) rectangle that are not queued yet.
+        Their pixels are copied now, so later changes to the layer do not leak into the levels.
+        """
+        rect = intersect(rect, self.document)
+        if rect is None:
+            return
+        sources = []
+        for cell in self._cells(rect):
+            if cell in self._requested:
+                continue
+            self._requested.add(cell)
+            cell_rect = self._cell_rect(cell)
+            source_rect = intersect((cell_rect[0] - self.halo, cell_rect[1] - self.halo,
+                                     cell_rect[2] + 2 * self.halo, cell_rect[3] + 2 * self.halo), self.document)
+            sources.append((cell, cell_rect, source_rect, self.read(source_rect)))
+        if sources:
+            job = FunctionJob("blur_levels", self._build, sources, priority=HIGH)
+            job.done_listeners.append(self._job_done)
+            self.pending = [job for job in self.pending if not job.finished] + [job]
+            self.jobs.submit(job)
+
+    def _build(self, sources):
+        for strength in self.strengths:
+            size = strength * 2 + 1
+            for (cell_x, cell_y), cell_rect, source_rect, pixels in sources:
+                x, y = cell_rect[0] - source_rect[0], cell_rect[1] - source_rect[1]
+                blurred = cv2.GaussianBlur(pixels, (size, size), 0)
+                self._levels[(strength, cell_x, cell_y)] = blurred[y:y + cell_rect[3], x:x + cell_rect[2]]
+
+    def get(self, strength, rect):
+        """Return the level for a blur strength under an (x, y, w, h) rectangle, or None if part of it is not computed yet."""
+        cells = self._cells(rect)
+        parts = [self._levels.get((strength,) + cell) for cell in cells]
+        if any(part is None for part in parts):
+            return None
+        x, y, width, height = rect
+        level = None
+        for cell, part in zip(cells, parts):
+            if self.registry is not None and (strength,) + cell not in self._tracked:
+                self._tracked.add((strength,) + cell)
+                self.registry.track("previews", part)
+            cell_rect = self._cell_rect(cell)
+            px, py, pw, ph = intersect(rect, cell_rect)
+            if level is None:
+                level = np.empty((height, width, part.shape[2]), dtype=np.uint8)
+            level[py - y:py - y + ph, px - x:px - x + pw] = \
+                part[py - cell_rect[1]:py - cell_rect[1] + ph, px - cell_rect[0]:px - cell_rect[0] + pw]
+        return level
+
+    def wait(self, timeout):
+        """
+        Block until the queued cells are computed, or their jobs were cancelled or failed, for at most `timeout` seconds.
+        :return: True if every queued job finished, successfully or not.
+        """
+        deadline = time.perf_counter() + timeout
+        for job in self.pending:
+            try:
+                job.wait(max(0.0, deadline - time.perf_counter()))
+            except TimeoutError:
+                return False
+            except Exception:
+                pass  # when_ready reports it
+        return True
+
+    def when_ready(self, callback):
+        """
+        Call `callback(ok)` once every queued job finished; `ok` is False if one failed or was
+        cancelled. The call comes from a done listener, so on the GUI thread in the app, or
+        right away if nothing is pending.
+        """
+        with self._lock:
+            if not all(job.finished for job in self.pending):
+                self._on_ready = callback
+                return
+        callback(self._succeeded())
+
+    def _job_done(self, job):
+        with self._lock:
+            if self._on_ready is None or not all(job.finished for job in self.pending):
+                return
+            callback, self._on_ready = self._on_ready, None
+        callback(self._succeeded())
+
+    def _succeeded(self):
+        return all(job.error is None and not job.cancelled for job in self.pending)
+
+    def cancel(self):
+        """Stop computing cells nobody will use."""
+        for job in self.pending:
+            job.cancel()
+        self.pending = []
+
+    def _cells(self, rect):
+        x, y, width, height = rect
+        size = self.cell_size
+        return [(cell_x, cell_y)
+                for cell_y in range(y // size, (y + height - 1) // size + 1)
+                for cell_x in range(x // size, (x + width - 1) // size + 1)]
+
+    def _cell_rect(self, cell):
+        return intersect((cell[0] * self.cell_size, cell[1] * self.cell_size, self.cell_size, self.cell_size),
+                         self.document)
+
 
 class BlurBrush(Tool):
     def __init__(self, drawing_manager, blur_strength=5):
         super().__init__(drawing_manager)
         self.blur_strength = blur_strength
         self.last_point = None
-        self.temp_image = None
-        self.canvas_backup = None  # Store the canvas state before applying blur for undo
+        self.levels = None  # BlurLevels around the current stroke
+        self.pending_segments = []  # (start, end, strength) dragged before their level was ready
 
     def set_blur_strength(self, strength):
         self.blur_strength = strength
         print(f"Blur strength set to: {self.blur_strength}")
 
+    def stroke_parameters(self):
+        parameters = super().stroke_parameters()
+        parameters["blur_strength"] = self.blur_strength
+        return parameters
+
+    def apply_stroke_parameters(self, parameters):
+        super().apply_stroke_parameters(parameters)
+        self.blur_strength = parameters.get("blur_strength", self.blur_strength)
+
+    def blur_strengths(self):
+        """Return every strength `_adjust_blur_based_on_speed` can produce for the current blur strength."""
+        return {max(1, self.blur_strength // speed_factor) for speed_factor in SPEED_FACTORS}
+
     def on_press(self, event):
-        """Handle the initial press of the brush."""
-        self.last_point = (event.pos().x(), event.pos().y())
+        """Handle the initial press of the brush: start pre-blurring the area around the pointer."""
+        self.last_point = (event.x, event.y)
         self.drawing_manager.enable_drawing()
-        self.temp_image = self.drawing_manager.image.copy()
-        self.canvas_backup = self.drawing_manager.image.copy()  # Backup for undo feature
+        self.pending_segments = []
+        self.levels = BlurLevels(self.drawing_manager.read_region, self.drawing_manager.width,
+                                 self.drawing_manager.height, self.blur_strengths(), self.drawing_manager.jobs,
+                                 self.drawing_manager.memory)
+        self._request_levels(self.last_point, self.last_point)
 
     def on_drag(self, event):
         """Handle dragging the brush across the canvas."""
-        current_point = (event.pos().x(), event.pos().y())
+        current_point = (event.x, event.y)
         if self.last_point:
             distance = self._calculate_distance(self.last_point, current_point)
             dynamic_blur_strength = self._adjust_blur_based_on_speed(distance)
-            self._blur_region(self.last_point, current_point, dynamic_blur_strength)
+            self.pending_segments.append((self.last_point, current_point, dynamic_blur_strength))
+            self._request_levels(self.last_point, current_point)
             self.last_point = current_point
-            self.drawing_manager.update_canvas_with_image(self.temp_image)
+            self._apply_pending_segments()
 
     def on_release(self, event):
-        """Handle releasing the brush."""
+        """
+        Handle releasing the brush. The GUI thread waits at most one frame for missing levels;
+        segments still waiting after that land once their levels are computed, after the
+        stroke in progress then (if any), as an undo step of their own.
+        """
         if self.last_point:
-            current_point = (event.pos().x(), event.pos().y())
+            current_point = (event.x, event.y)
             distance = self._calculate_distance(self.last_point, current_point)
             dynamic_blur_strength = self._adjust_blur_based_on_speed(distance)
-            self._blur_region(self.last_point, current_point, dynamic_blur_strength)
-            self._commit_blur_to_canvas()
+            self.pending_segments.append((self.last_point, current_point, dynamic_blur_strength))
+            self._request_levels(self.last_point, current_point)
+            self.levels.wait(RELEASE_WAIT)
+            self._apply_pending_segments()
+            if self.pending_segments:
+                levels, segments, thickness = self.levels, self.pending_segments, self._thickness()
+                levels.when_ready(lambda ok: self.drawing_manager.after_stroke(
+                    lambda: self._land_late_segments(levels, segments, thickness, ok)))
+            else:
+                self.levels.cancel()
+        self.pending_segments = []
         self.last_point = None
+        self.levels = None
         self.drawing_manager.disable_drawing()
 
-    def _blur_region(self, start_point, end_point, dynamic_blur_strength):
+    def _request_levels(self, start_point, end_point):
         """
-        Apply a blur to the region between the start and end points.
-        The blur strength is adjusted dynamically based on stroke speed.
+        Queue the levels around a segment before it is blurred. The margin exceeds the kernel
+        radius, so every cell is copied before the stroke changes any pixel its blur reads.
         """
-        # Draw a line to define the blur region
-        cv2.line(self.temp_image, start_point, end_point, (0, 0, 0, 0), self.drawing_manager.thickness)
+        margin = self.levels.halo + LOOKAHEAD
+        x, y, width, height = line_bounds(start_point, end_point, self._thickness())
+        self.levels.request((x - margin, y - margin, width + 2 * margin, height + 2 * margin))
+
+    def _thickness(self):
+        return max(1, self.drawing_manager.thickness)
 
-        # Extract a local region around the brush stroke for blurring
-        blur_radius = max(1, self.drawing_manager.thickness // 2)
-        region = cv2.getRectSubPix(self.temp_image, (blur_radius * 2, blur_radius * 2), start_point)
+    def _apply_pending_segments(self):
+        """Blur the queued segments in order, stopping at the first whose level is still being computed."""
+        self._apply_segments(self.levels, self.pending_segments, self._thickness())
 
-        # Apply Gaussian blur with dynamic strength
-        blurred_region = cv2.GaussianBlur(region, (dynamic_blur_strength * 2 + 1, dynamic_blur_strength * 2 + 1), 0)
+    def _apply_segments(self, levels, segments, thickness):
+        """Blur and remove segments from the front of `segments` while their levels are ready."""
+        while segments:
+            start_point, end_point, strength = segments[0]
+            bounds = intersect(line_bounds(start_point, end_point, thickness), levels.document)
+            if bounds is None:
+                segments.pop(0)  # Entirely outside the document
+                continue
+            level = levels.get(strength, bounds)
+            if level is None:
+                return
+            segments.pop(0)
+            self._blur_region(start_point, end_point, bounds, level, thickness)
 
-        # Merge the blurred region back without erasing
-        self._apply_blurred_region(self.temp_image, blurred_region, start_point)
+    def _land_late_segments(self, levels, segments, thickness, ok):
+        """Blur the end of a released stroke whose levels were computed after the release."""
+        if not ok:
+            self.drawing_manager.report("Blur levels could not be computed; the end of the blur stroke was dropped.")
+            return
+        history = self.drawing_manager.history
+        history.checkpoint()  # Keep whatever happened since the release out of this step
+        self._apply_segments(levels, segments, thickness)
+        history.checkpoint()
 
-    def _apply_blurred_region(self, image, blurred_region, point):
-        """Apply the blurred region to the original image at the given point."""
-        x, y = int(point[0]), int(point[1])
-        h, w = blurred_region.shape[:2]
+    def _blur_region(self, start_point, end_point, bounds, level, thickness):
+        """
+        Blend a pre-blurred level into the region between the start and end points.
+        The segment is drawn into a coverage mask over its bounding box only, and the level
+        is mixed in through it and written back into the active layer.
+        :param bounds: The segment's (x, y, w, h) bounding box, inside the document.
+        :param level: Blurred pixels of `bounds`.
+        :param thickness: Width of the segment in pixels.
+        """
+        x, y, width, height = bounds
 
-        # Ensure the blurred region is applied within bounds
-        image[y:y + h, x:x + w] = cv2.addWeighted(image[y:y + h, x:x + w], 0.7, blurred_region, 0.3, 0)
+        mask = self.drawing_manager.scratch.get("blur_mask", (height, width))
+        mask[:] = 0
+        cv2.line(mask, (int(start_point[0]) - x, int(start_point[1]) - y),
+                 (int(end_point[0]) - x, int(end_point[1]) - y), 255, thickness)
 
-    def _commit_blur_to_canvas(self):
-        """Commit the blurred stroke to the base canvas image."""
-        self.drawing_manager.image = self.temp_image.copy()
-        self.drawing_manager.update_canvas()
+        target = self.drawing_manager.read_region(bounds)
+        blend_pixels(target, level, mask, BLUR_MIX, out=target)
+        self.drawing_manager.write_region((x, y), target)
 
     def undo(self):
-        """Undo the last brush stroke by restoring the previous canvas state."""
-        if self.canvas_backup is not None:
-            self.drawing_manager.image = self.canvas_backup.copy()
-            self.drawing_manager.update_canvas()
-            print("Undo successful")
+        """Undo the last brush stroke through the shared tile history."""
+        if not self.drawing_manager.undo():
+            print("No more actions to undo.")
 
     def _adjust_blur_based_on_speed(self, distance):
         """
@@ -1,6 +1,9 @@
-import cv2
 import numpy as np
 from tools.tool import Tool
+from core.compositing import StrokeBuffer
+from tools.Brush.stamp_engine import StampEngine, BrushStroke, PRESETS
+
+TEXTURE_SEED = 20  # Fixed seed of the textured brush pattern, so replayed strokes match
 
 class Brush(Tool):
     def __init__(self, drawing_manager, brush_type="bristle"):
@@ -14,17 +17,22 @@ class Brush(Tool):
         self.last_point = None
         self.opacity = 0.7  # Default brush opacity for softer effects
         self.dynamic_thickness_range = (5, 20)  # Simulates pressure sensitivity
-        self.temp_image = None  # Temporary image for smoother drawing updates
+        self.buffer = None  # Coverage of the stroke in progress, shown as an overlay until release
+        self.seed = None  # Fixed stroke seed (e.g. for tests); None draws a fresh seed per stroke
+        self.stroke = None  # BrushStroke being painted, with the seed that reproduces it
 
         # Initialize and load textures for different brush types
         self.textures = self._initialize_textures()
         self.texture = self.textures.get(brush_type, None)
 
+        # Every brush type is a dab preset on one stamping engine, which modulates its dabs by these textures
+        self.engine = StampEngine(self.textures, registry=drawing_manager.memory)
+
     def _initialize_textures(self):
         """Initialize textures for different brush types."""
         return {
-            "bristle": self._create_bristle_texture(),
-            "soft": None,  # Soft brush uses Gaussian blur directly
+            "bristle": None,  # Bristle tips are generated per stroke from its seed
+            "soft": None,  # Soft brush uses plain round dabs
             "textured": self._create_textured_brush(),
         }
 
@@ -34,98 +42,95 @@ class Brush(Tool):
         self.texture = self.textures.get(brush_type, None)
         print(f"Brush type changed to: {brush_type}")
 
-    def _create_bristle_texture(self):
-        """Create and return a texture for a bristle brush."""
-        texture = np.zeros((10, 10), dtype=np.uint8)
-        cv2.randu(texture, 0, 255)  # Simulates random bristle strokes
-        return texture
+    def stroke_parameters(self):
+        """Add the brush type and the seed of the last stroke, which reproduces its randomness."""
+        parameters = super().stroke_parameters()
+        parameters["brush_type"] = self.brush_type
+        parameters["seed"] = self.stroke.seed if self.stroke is not None else self.seed
+        return parameters
+
+    def apply_stroke_parameters(self, parameters):
+        super().apply_stroke_parameters(parameters)
+        self.brush_type = parameters.get("brush_type", self.brush_type)
+        self.texture = self.textures.get(self.brush_type, None)
+        self.seed = parameters.get("seed", self.seed)
 
     def _create_textured_brush(self):
         """Create a texture for a textured brush using a noise pattern."""
-        texture = np.random.randint(0, 255, (20, 20), dtype=np.uint8)
+        texture = np.random.default_rng(TEXTURE_SEED).integers(0, 255, (20, 20), dtype=np.uint8)
         return texture
 
     def on_press(self, event):
         """Handle the initial press of the brush tool."""
-        self.last_point = (event.pos().x(), event.pos().y())
-        self.drawing_manager.set_thickness(np.random.randint(*self.dynamic_thickness_range))  # Randomized thickness
+        self.last_point = (event.x, event.y)
+        seed = self.seed if self.seed is not None else int(np.random.SeedSequence().generate_state(1, np.uint64)[0])
+        rng = np.random.default_rng(seed)  # Everything random about the stroke comes from its seed
+        self.drawing_manager.set_thickness(int(rng.integers(*self.dynamic_thickness_range)))  # Randomized thickness
         self.drawing_manager.set_opacity(self.opacity)  # Adjust opacity for soft brushes
         self.drawing_manager.enable_drawing()
-        self.temp_image = self.drawing_manager.image.copy()  # Store the image for smoother dragging
+        self.stroke = BrushStroke(self.brush_type, seed, self.drawing_manager.thickness,
+                                  self.drawing_manager.color, self.opacity)
+        self.buffer = self._new_buffer(self.stroke)  # Only the area under the stroke is allocated
+        self.drawing_manager.add_overlay(self.buffer)
+        self.engine.begin_stroke(self.last_point)
+        self._draw_brush_stroke([self.last_point])
 
     def on_drag(self, event):
         """Handle dragging the brush across the canvas."""
-        current_point = (event.pos().x(), event.pos().y())
+        self.on_drag_batch([(event.x, event.y)])
+
+    def on_drag_batch(self, points):
+        """Stamp a frame's worth of drag points in one batch and show the result once."""
         if self.last_point:
-            self._draw_brush_stroke(self.last_point, current_point, temp=True)
-            self.last_point = current_point
-            self.drawing_manager.update_canvas_with_image(self.temp_image)
+            self._draw_brush_stroke(points)
+            self.last_point = tuple(points[-1])
 
     def on_release(self, event):
         """Handle the brush release event."""
         if self.last_point:
-            current_point = (event.pos().x(), event.pos().y())
-            self._draw_brush_stroke(self.last_point, current_point, temp=False)
+            self._draw_brush_stroke([(event.x, event.y)])
             self._commit_stroke_to_canvas()
         self.last_point = None
         self.drawing_manager.disable_drawing()
 
-    def _draw_brush_stroke(self, start_point, end_point, temp=True):
+    def _draw_brush_stroke(self, points):
         """
-        Draw the brush stroke from start to end, applying the appropriate texture or effect.
+        Continue the stroke through `points` with the dab preset of the current brush type.
         """
-        target_image = self.temp_image if temp else self.drawing_manager.image
-
-        if self.brush_type == "bristle":
-            self._draw_bristle_stroke(target_image, start_point, end_point)
-        elif self.brush_type == "soft":
-            self._draw_soft_stroke(target_image, start_point, end_point)
-        elif self.brush_type == "textured":
-            self._draw_textured_stroke(target_image, start_point, end_point)
-
-    def _draw_bristle_stroke(self, image, start_point, end_point):
-        """Draw a bristle-like stroke with randomness to simulate individual bristles."""
-        color_with_opacity = self._apply_opacity(self.drawing_manager.color, self.opacity)
-        for _ in range(5):  # Simulate multiple bristles by adding jitter
-            jitter_start = (start_point[0] + np.random.randint(-3, 3), start_point[1] + np.random.randint(-3, 3))
-            jitter_end = (end_point[0] + np.random.randint(-3, 3), end_point[1] + np.random.randint(-3, 3))
-            cv2.line(image, jitter_start, jitter_end, color_with_opacity, np.random.randint(2, 5))
-
-    def _draw_soft_stroke(self, image, start_point, end_point):
-        """Draw a soft stroke using Gaussian blur localized to the stroke area."""
-        color_with_opacity = self._apply_opacity(self.drawing_manager.color, self.opacity)
-        cv2.line(image, start_point, end_point, color_with_opacity, self.drawing_manager.thickness)
-
-        # Create a mask to localize the blur effect
-        mask = np.zeros_like(image)
-        cv2.line(mask, start_point, end_point, 255, self.drawing_manager.thickness)
-        
-        # Only apply blur to the stroke area
-        blurred_image = cv2.GaussianBlur(image, (21, 21), 0)
-        np.copyto(image, blurred_image, where=mask.astype(bool))
-
-    def _draw_textured_stroke(self, image, start_point, end_point):
-        """Draw a textured stroke using a noise pattern for rough effects."""
-        if self.texture is None:
-            print("No texture available for this brush type.")
-            return
+        self.stroke.add(points)
+        rect = self._paint_stroke(self.buffer, self.stroke, points)
+        self.drawing_manager.update_overlay(self.buffer, rect)
 
-        mask = np.zeros((image.shape[0], image.shape[1]), dtype=np.uint8)
-        cv2.line(mask, start_point, end_point, 255, self.drawing_manager.thickness)
-        texture_resized = cv2.resize(self.texture, (mask.shape[1], mask.shape[0]), interpolation=cv2.INTER_NEAREST)
+    def _new_buffer(self, stroke):
+        """Return an empty coverage buffer for a stroke; it is composited with the stroke's colour and opacity."""
+        return StrokeBuffer(self.drawing_manager.width, self.drawing_manager.height, stroke.color,
+                            stroke.opacity, registry=self.drawing_manager.memory)
 
-        # Ensure the texture matches the image's color channels
-        if len(image.shape) == 3 and image.shape[2] == 3:
-            texture_resized = np.stack([texture_resized] * 3, axis=-1)
-
-        # Apply the texture to the stroke area
-        image[mask > 0] = cv2.bitwise_and(image[mask > 0], texture_resized[mask > 0])
+    def _paint_stroke(self, buffer, stroke, points):
+        """
+        Stamp part of a stroke with the stroke's own preset, size and seed.
+        :return: The (x, y, w, h) document rectangle whose coverage changed, or None.
+        """
+        preset = PRESETS.get(stroke.brush_type)
+        if preset is None:
+            print(f"Unknown brush type: {stroke.brush_type}")
+            return None
+        return self.engine.stroke_to(buffer, points, preset, stroke.size, seed=stroke.seed)
 
-    def _apply_opacity(self, color, opacity):
-        """Apply opacity to the color for blending."""
-        return [int(c * opacity) for c in color]
+    def replay(self, stroke):
+        """
+        Paint a recorded BrushStroke onto the canvas; the same seed gives the same pixels.
+        :param stroke: BrushStroke as recorded in `self.stroke` while it was painted.
+        """
+        if not stroke.points:
+            return
+        buffer = self._new_buffer(stroke)
+        self.engine.begin_stroke(stroke.points[0])
+        for points in stroke.iter_batches():
+            self._paint_stroke(buffer, stroke, points)
+        self.drawing_manager.commit_overlay(buffer)
 
     def _commit_stroke_to_canvas(self):
-        """Save the current stroke from the temporary image to the base canvas image."""
-        self.drawing_manager.image = self.temp_image.copy()
-        self.drawing_manager.update_canvas()
+        """Blend the finished stroke into the document, touching only the tiles under it."""
+        self.drawing_manager.commit_overlay(self.buffer)
+        self.buffer = None
@@ -0,0 +1,224 @@
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+
+class DabPreset:
+    def __init__(self, shape="round", hardness=0.5, spacing=0.25, flow=1.0):
+        """
+        Parameters of a dab brush.
+        :param shape: Dab shape: "round", "bristle" or "textured".
+        :param hardness: Fraction of the radius that is fully opaque (0 = all falloff, 1 = hard edge).
+        :param spacing: Distance between dabs as a fraction of the brush size.
+        :param flow: Opacity of a single dab relative to the brush opacity.
+        """
+        self.shape = shape
+        self.hardness = hardness
+        self.spacing = spacing
+        self.flow = flow
+
+
+class BrushStroke:
+    def __init__(self, brush_type, seed, size, color, opacity):
+        """
+        Everything needed to reproduce a brush stroke exactly.
+        :param brush_type: Name of the dab preset.
+        :param seed: Seed of the stroke's random generator (bristle layout, size).
+        :param size: Brush diameter in pixels.
+        :param color: Colour of the paint.
+        :param opacity: Brush opacity (0..1).
+        """
+        self.brush_type = brush_type
+        self.seed = seed
+        self.size = size
+        self.color = tuple(color)
+        self.opacity = opacity
+        self.points = []  # The stroke's (x, y) input points, in order
+        self.batches = []  # Number of points painted by each stamping call
+
+    def add(self, points):
+        """Record a batch of points painted with one stamping call."""
+        self.points.extend((point[0], point[1]) for point in points)
+        self.batches.append(len(points))
+
+    def iter_batches(self):
+        """Yield the recorded points batch by batch, as they were painted."""
+        start = 0
+        for count in self.batches:
+            yield self.points[start:start + count]
+            start += count
+
+
+# The brush types of the toolbar, as dab presets
+PRESETS = {
+    "bristle": DabPreset("bristle", hardness=0.8, spacing=0.2, flow=1.0),
+    "soft": DabPreset("round", hardness=0.0, spacing=0.1, flow=1.0),
+    "textured": DabPreset("textured", hardness=0.6, spacing=0.25, flow=1.0),
+}
+
+
+class StampEngine:
+    def __init__(self, textures=None, cache_size=64, registry=None):
+        """
+        Dab-stamping brush engine.
+
+        A stroke is resampled at a fixed spacing along its path and a precomputed dab (a
+        uint8 coverage mask) is stamped at every sample into the stroke's StrokeBuffer. All
+        dabs of one call are stamped in a single vectorized `np.maximum.at`, so overlapping
+        dabs of one stroke never build up; the colour is blended in only when the buffer is
+        composited.
+
+        Dabs are kept in an LRU cache keyed by shape, size, hardness and opacity.
+
+        :param textures: {shape: 2D uint8 texture} modulating the dabs of that shape, e.g. "textured".
+        :param cache_size: Number of dabs kept in the cache.
+        :param registry: Optional BufferRegistry to report the cache to (as "caches").
+        """
+        self.textures = textures or {}
+        self.cache_size = cache_size
+        self._dabs = OrderedDict()  # (shape, size, hardness, opacity, seed) -> uint8 coverage mask
+        self._last_point = None
+        self._carry = 0.0  # Path length since the last dab of the stroke
+        if registry is not None:
+            registry.register("caches", lambda: self.nbytes, evict=lambda nbytes: self.clear_cache(), priority=0)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the cached dabs."""
+        return sum(dab.nbytes for dab in self._dabs.values())
+
+    def clear_cache(self):
+        """Drop every cached dab."""
+        self._dabs.clear()
+
+    def dab(self, shape, size, hardness, opacity, seed=0):
+        """
+        Return the coverage mask of a dab (255 = opaque), building it on a cache miss.
+        :param shape: "round", "bristle" or "textured".
+        :param size: Diameter in pixels.
+        :param hardness: Fraction of the radius that is fully opaque.
+        :param opacity: Peak alpha of the dab (0..1).
+        :param seed: Seed of the bristle layout; only "bristle" dabs depend on it.
+        """
+        seed = int(seed) if shape == "bristle" else 0
+        key = (shape, int(size), round(float(hardness), 3), round(float(opacity), 3), seed)
+        dab = self._dabs.get(key)
+        if dab is not None:
+            self._dabs.move_to_end(key)
+            return dab
+        dab = self._build_dab(*key)
+        self._dabs[key] = dab
+        if len(self._dabs) > self.cache_size:
+            self._dabs.popitem(last=False)
+        return dab
+
+    def _build_dab(self, shape, size, hardness, opacity, seed):
+        size = max(1, size)
+        radius = size / 2.0
+        coordinates = np.arange(size, dtype=np.float32) + 0.5 - radius
+        if shape == "bristle":
+            alpha = _bristle_alpha(coordinates, radius, hardness, seed)
+        else:
+            distance = np.hypot(coordinates[None, :], coordinates[:, None]) / radius  # 0 at the centre, 1 at the edge
+            alpha = _smooth_edge(distance, hardness)
+        texture = self.textures.get(shape)
+        if texture is not None:
+            alpha *= cv2.resize(texture, (size, size), interpolation=cv2.INTER_NEAREST).astype(np.float32) / 255.0
+        return np.rint(alpha * opacity * 255).astype(np.uint8)
+
+    def begin_stroke(self, point):
+        """Start a new stroke at `point`; the first dab is placed there by the next `stroke_to`."""
+        self._last_point = (float(point[0]), float(point[1]))
+        self._carry = None  # No dab yet: the first sample goes on the start point
+
+    def stroke_to(self, buffer, points, preset, size, opacity=1.0, seed=0):
+        """
+        Continue the stroke through `points`, stamping dabs at the preset spacing.
+        :param buffer: The stroke's core.compositing.StrokeBuffer.
+        :param points: Sequence of (x, y) points following the previous end point.
+        :param preset: DabPreset to paint with.
+        :param size: Brush diameter in pixels.
+        :param opacity: Brush opacity (0..1).
+        :param seed: Per-stroke seed of the bristle layout.
+        :return: The (x, y, w, h) document rectangle whose coverage changed, or None.
+        """
+        positions = self.resample(points, max(1.0, preset.spacing * size))
+        dab = self.dab(preset.shape, size, preset.hardness, opacity * preset.flow, seed)
+        return self.stamp(buffer, positions, dab)
+
+    def resample(self, points, spacing):
+        """
+        Return dab positions every `spacing` pixels along the path from the previous end point
+        through `points`, carrying the leftover distance over to the next call.
+        """
+        path = np.array([self._last_point] + [tuple(point) for point in points], dtype=np.float64)
+        self._last_point = tuple(path[-1])
+        lengths = np.hypot(*np.diff(path, axis=0).T)
+        cumulative = np.concatenate(([0.0], np.cumsum(lengths)))
+        total = cumulative[-1]
+        first = 0.0 if self._carry is None else spacing - self._carry
+        distances = np.arange(first, total + 1e-9, spacing)
+        if len(distances):
+            self._carry = total - distances[-1]
+        elif self._carry is not None:
+            self._carry += total
+        x = np.interp(distances, cumulative, path[:, 0])
+        y = np.interp(distances, cumulative, path[:, 1])
+        return np.stack([x, y], axis=1)
+
+    @staticmethod
+    def stamp(buffer, positions, dab):
+        """
+        Stamp `dab` centred on every position into a StrokeBuffer in one vectorized batch.
+        Coverage is combined with a per-pixel maximum, so stamping order and batching do not
+        matter and overlapping dabs of a stroke do not build up.
+        :return: The (x, y, w, h) document rectangle whose coverage changed, or None.
+        """
+        if len(positions) == 0:
+            return None
+        size = dab.shape[0]
+        origins = np.floor(positions - size / 2.0 + 0.5).astype(np.int64)  # Top-left corner of every dab
+        x0, y0 = origins.min(axis=0)
+        x1, y1 = origins.max(axis=0) + size
+        bounds = (int(x0), int(y0), int(x1 - x0), int(y1 - y0))
+        roi = buffer.ensure(bounds)
+        if roi is None:
+            return None
+
+        # Document coordinates of every dab pixel; everything inside the document is stamped at once
+        offsets = np.arange(size)
+        xs = origins[:, 0, None, None] + offsets[None, None, :]
+        ys = origins[:, 1, None, None] + offsets[None, :, None]
+        values = np.broadcast_to(dab, xs.shape[:1] + dab.shape)
+        if roi != bounds:
+            rx, ry, rw, rh = roi
+            inside = (xs >= rx) & (xs < rx + rw) & (ys >= ry) & (ys < ry + rh)
+            xs, ys, values = np.broadcast_to(xs, inside.shape)[inside], np.broadcast_to(ys, inside.shape)[inside], values[inside]
+        np.maximum.at(buffer.coverage.reshape(-1), buffer.flat_index(xs, ys).ravel(), values.ravel())
+        buffer.mark_painted(roi)
+        return roi
+
+
+def _smooth_edge(distance, hardness):
+    """Alpha of a round tip at a normalized distance (1 = edge), solid up to `hardness`, then a smoothstep falloff."""
+    falloff = np.clip((1.0 - distance) / max(1.0 - hardness, 1e-3), 0.0, 1.0)
+    return falloff * falloff * (3.0 - 2.0 * falloff)
+
+
+def _bristle_alpha(coordinates, radius, hardness, seed, density=0.5):
+    """
+    Alpha of a bristle tip: a cluster of round bristles inside the brush radius.
+    The offsets and widths of all bristles come from one vectorized draw of a generator
+    seeded per stroke, and the tips are rasterized together, so a stroke's bristle layout is
+    reproducible from its seed alone.
+    """
+    count = max(3, int(round(2 * radius * density)))
+    draws = np.random.default_rng(seed).random((count, 3))  # angle, radial position, width per bristle
+    widths = 0.75 + draws[:, 2] * max(0.5, radius / 4.0)
+    reach = np.sqrt(draws[:, 1]) * np.maximum(radius - widths, 0.0)  # Uniform over the disc the bristles fit in
+    centres_x = np.cos(draws[:, 0] * 2 * np.pi) * reach
+    centres_y = np.sin(draws[:, 0] * 2 * np.pi) * reach
+    distance = np.hypot(coordinates[None, None, :] - centres_x[:, None, None],
+                        coordinates[None, :, None] - centres_y[:, None, None]) / widths[:, None, None]
+    return _smooth_edge(distance, hardness).max(axis=0)
+
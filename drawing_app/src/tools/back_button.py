@@ -1,43 +1,48 @@
-import numpy as np
-
 class BackButton:
-    def __init__(self, drawing_manager, max_history=50):
+    def __init__(self, drawing_manager, max_bytes=None):
         """
         Initialize the BackButton class.
         
         Args:
             drawing_manager: The drawing manager responsible for canvas drawing operations.
-            max_history (int): Maximum number of undo states to store in history.
+            max_bytes (int): Optional memory budget for the undo history, in bytes.
         """
         self.drawing_manager = drawing_manager
-        self.history = []  # Store history of canvas states for undo
-        self.max_history = max_history  # Limit the size of the history to avoid memory overflow
+        self.history = drawing_manager.history  # Tile-delta history shared by every BackButton of the document
+        if max_bytes is not None:
+            self.history.max_bytes = max_bytes
 
     def save_state(self):
         """
-        Save the current canvas state to the history.
-        Ensures the number of saved states does not exceed `max_history`.
+        Close the current operation so the next undo stops here.
+        Only the tiles the operation changed are kept; an operation that changed nothing adds no step.
         """
-        # Save a deep copy of the current image to the history stack
-        if len(self.history) >= self.max_history:
-            self.history.pop(0)  # Remove the oldest state if history exceeds max limit
-        self.history.append(np.copy(self.drawing_manager.image))
+        self.history.checkpoint()
 
     def undo(self):
         """
-        Undo the last action by restoring the previous canvas state.
+        Undo the last action by restoring the tiles it changed.
         If no more history is available, it prints a message and does nothing.
         """
-        if self.history:
-            last_state = self.history.pop()
-            self.drawing_manager.update_canvas_with_image(last_state)
-        else:
+        if not self.drawing_manager.undo():
             print("No more actions to undo.")
 
+    def redo(self):
+        """
+        Redo the last undone action.
+        If nothing was undone, it prints a message and does nothing.
+        """
+        if not self.drawing_manager.redo():
+            print("No more actions to redo.")
+
     def clear_history(self):
         """Clear the undo history."""
         self.history.clear()
 
     def can_undo(self):
         """Check if there are states in the history that can be undone."""
-        return bool(self.history)
+        return self.history.can_undo()
+
+    def can_redo(self):
+        """Check if there are undone states that can be redone."""
+        return self.history.can_redo()
@@ -1,5 +1,5 @@
-import cv2
 from tools.tool import Tool
+from core.shape_preview import ShapePreview, LINE
 
 class Line(Tool):
     def __init__(self, drawing_manager):
@@ -8,18 +8,19 @@ class Line(Tool):
 
     def on_press(self, event):
         # Capture the start point when the mouse is pressed
-        self.start_point = (event.pos().x(), event.pos().y())
+        self.start_point = (event.x, event.y)
         self.drawing_manager.set_thickness(self.drawing_manager.thickness)  # Ensure thickness is set
 
     def on_drag(self, event):
         if self.start_point:
-            end_point = (event.pos().x(), event.pos().y())
-            temp_image = self.drawing_manager.image.copy()  # Copy the image to preview
-            cv2.line(temp_image, self.start_point, end_point, self.drawing_manager.color, self.drawing_manager.thickness)
-            self.drawing_manager.update_canvas_with_image(temp_image)
+            end_point = (event.x, event.y)
+            # Rubber band painted over the canvas; the document is not touched until release
+            self.drawing_manager.show_shape_preview(ShapePreview(
+                LINE, self.start_point, end_point, self.drawing_manager.color, self.drawing_manager.thickness))
 
     def on_release(self, event):
-        end_point = (event.pos().x(), event.pos().y())
-        self.drawing_manager.draw_line(self.start_point, end_point)
+        self.drawing_manager.clear_shape_preview()
+        if self.start_point:
+            end_point = (event.x, event.y)
+            self.drawing_manager.draw_line(self.start_point, end_point)
         self.start_point = None
-
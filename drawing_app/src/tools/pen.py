@@ -12,7 +12,7 @@ class Pen(Tool):
         Handle the initial press for the pen tool. Set the thickness, opacity, and enable drawing.
         """
         if event:
-            self.last_point = (event.pos().x(), event.pos().y())
+            self.last_point = (event.x, event.y)
             self.drawing_manager.set_thickness(self.thickness)
             self.drawing_manager.set_opacity(self.opacity)
             self.drawing_manager.enable_drawing()
@@ -23,10 +23,19 @@ class Pen(Tool):
         Updates the last point for continuous drawing.
         """
         if self.last_point and event:
-            current_point = (event.pos().x(), event.pos().y())
+            current_point = (event.x, event.y)
             self.drawing_manager.draw_line(self.last_point, current_point, self.drawing_manager.color)  # Pass color
             self.last_point = current_point
 
+    def on_drag_batch(self, points):
+        """
+        Handle a frame's worth of queued drag points at once, drawing them as one polyline.
+        :param points: List of (x, y) points received since the last frame.
+        """
+        if self.last_point and points:
+            self.drawing_manager.draw_polyline([self.last_point] + points, self.drawing_manager.color)
+            self.last_point = points[-1]
+
     def on_release(self, event):
         """
         Handle releasing the pen, ending the drawing stroke.
@@ -8,17 +8,23 @@ class Pencil(Tool):
 
     def on_press(self, event):
         # Drawing thin and transparent lines
-        self.last_point = (event.pos().x(), event.pos().y())
+        self.last_point = (event.x, event.y)
         self.drawing_manager.set_thickness(self.thickness)
         self.drawing_manager.set_opacity(self.opacity)
         self.drawing_manager.enable_drawing()
 
 
     def on_drag(self, event):
-        current_point = (event.pos().x(), event.pos().y())
+        current_point = (event.x, event.y)
         if self.last_point is not None:
             self.drawing_manager.draw_line(self.last_point, current_point)
             self.last_point = current_point
 
+    def on_drag_batch(self, points):
+        # Draw all points queued during the last frame as one polyline
+        if self.last_point is not None and points:
+            self.drawing_manager.draw_polyline([self.last_point] + points)
+            self.last_point = points[-1]
+
     def on_release(self, event):
         self.last_point = None
@@ -0,0 +1,9 @@
+from tools.pen import Pen
+from tools.pencil import Pencil
+from tools.line import Line
+from tools.shapes import Shapes
+from tools.Brush.brush import Brush
+from tools.Brush.BlurBrush import BlurBrush
+
+# Tools that take pointer events, by the tool id the stroke log records for them
+TOOL_TYPES = {tool_type.__name__: tool_type for tool_type in (Pen, Pencil, Line, Shapes, Brush, BlurBrush)}
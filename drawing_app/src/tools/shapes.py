@@ -1,5 +1,5 @@
-import cv2
 from tools.tool import Tool
+from core.shape_preview import ShapePreview, ellipse_geometry
 
 class Shapes(Tool):
     def __init__(self, drawing_manager, shape_type='rectangle'):
@@ -7,25 +7,40 @@ class Shapes(Tool):
         self.start_point = None
         self.shape_type = shape_type  # Shape can be 'rectangle' or 'ellipse'
 
+    def stroke_parameters(self):
+        parameters = super().stroke_parameters()
+        parameters["shape_type"] = self.shape_type
+        return parameters
+
+    def apply_stroke_parameters(self, parameters):
+        super().apply_stroke_parameters(parameters)
+        self.shape_type = parameters.get("shape_type", self.shape_type)
+
     def on_press(self, event):
         # Capture the start point when the mouse is pressed
-        self.start_point = (event.pos().x(), event.pos().y())
+        self.start_point = (event.x, event.y)
         self.drawing_manager.set_color(self.color)  # Ensure color is set correctly
+        self.drawing_manager.enable_drawing()
 
     def on_drag(self, event):
         # Handle dragging to preview the shape being drawn
-        end_point = (event.pos().x(), event.pos().y())
+        if self.start_point is None:
+            return
+        end_point = (event.x, event.y)
 
-        # Make a copy of the original image to preview the shape without affecting the base
-        temp_image = self.drawing_manager.image.copy()
+        # Show the outline as a vector preview over the canvas; the document is not touched
+        self.drawing_manager.show_shape_preview(ShapePreview(
+            self.shape_type, self.start_point, end_point, self.color,
+            self.drawing_manager.thickness, self.drawing_manager.opacity))
 
-        # Draw the selected shape (rectangle or ellipse)
-        if self.shape_type == 'rectangle':
-            cv2.rectangle(temp_image, self.start_point, end_point, self.color, self.drawing_manager.thickness)
-        elif self.shape_type == 'ellipse':
-            center = ((self.start_point[0] + end_point[0]) // 2, (self.start_point[1] + end_point[1]) // 2)
-            axes = (abs(self.start_point[0] - end_point[0]) // 2, abs(self.start_point[1] - end_point[1]) // 2)
-            cv2.ellipse(temp_image, center, axes, 0, 0, 360, self.color, self.drawing_manager.thickness)
-
-        # Update the canvas with the temporary shape
-        self.drawing_manager.update_canvas_with_image(temp_image)
+    def on_release(self, event):
+        # Rasterize the final shape into the document once
+        self.drawing_manager.clear_shape_preview()
+        if self.start_point is not None:
+            end_point = (event.x, event.y)
+            if self.shape_type == 'rectangle':
+                self.drawing_manager.draw_rectangle(self.start_point, end_point)
+            elif self.shape_type == 'ellipse':
+                self.drawing_manager.draw_ellipse(*ellipse_geometry(self.start_point, end_point))
+        self.start_point = None
+        self.drawing_manager.disable_drawing()
@@ -27,6 +27,20 @@ class Tool:
         self.opacity = opacity
         self.drawing_manager.set_opacity(self.opacity)
 
+    def stroke_parameters(self):
+        """
+        Return the tool's own settings that shape a stroke, for the stroke log.
+        Override this in derived tools that have more settings; values must be JSON types.
+        """
+        return {"color": list(self.color), "thickness": self.thickness, "opacity": self.opacity}
+
+    def apply_stroke_parameters(self, parameters):
+        """Restore settings from `stroke_parameters` without touching the drawing manager, e.g. to replay a stroke."""
+        if "color" in parameters:
+            self.color = tuple(parameters["color"])
+        self.thickness = parameters.get("thickness", self.thickness)
+        self.opacity = parameters.get("opacity", self.opacity)
+
     def apply_tool_style(self, start_point, end_point):
         """
         Apply tool styles like opacity and texture. 
@@ -1,11 +1,14 @@
-import cv2
 import numpy as np
 from tools.tool import Tool
+from core.turtle import (TurtleState, trace, parse_program, expand_lsystem, lsystem_commands,
+                         FORWARD, TURN)
 
 class TurtleTool(Tool):
     def __init__(self, drawing_manager, initial_angle=0, start_position=None, speed=10):
         """
         Initialize the Turtle Tool.
+        Moves are traced by core.turtle, so a whole program or L-system is rasterized with
+        one cv2.polylines call and the canvas is repainted once, when it ends.
         :param drawing_manager: The canvas manager.
         :param initial_angle: Initial angle for the turtle (default is 0 degrees).
         :param start_position: Optional starting position (default is the center of the canvas).
@@ -16,25 +19,50 @@ class TurtleTool(Tool):
         self.position = start_position or self.get_default_start_position()
         self.previous_position = self.position
         self.speed = speed
+        self.pen_is_down = True
         self.drawing_manager.enable_drawing()
 
     def get_default_start_position(self):
         """Get the default start position as the center of the canvas."""
         return (self.drawing_manager.width // 2, self.drawing_manager.height // 2)
 
+    def run_program(self, program):
+        """
+        Run a turtle program and draw its whole path at once.
+        :param program: Text in the language of core.turtle.parse_program, or a list of (command, argument) tuples.
+        :return: The traced polylines, in document coordinates.
+        """
+        commands = parse_program(program) if isinstance(program, str) else program
+        state = TurtleState(self.position, self.angle, self.pen_is_down)
+        polylines = trace(commands, state)
+        self.drawing_manager.draw_polylines(polylines)
+        self.position, self.angle = state.position, state.angle
+        self.previous_position = self.position
+        if state.pen_down and not self.pen_is_down:
+            self.pen_down()
+        elif not state.pen_down and self.pen_is_down:
+            self.pen_up()
+        return polylines
+
+    def run_lsystem(self, axiom, rules, iterations, step=None, angle=90):
+        """
+        Expand an L-system and draw it as one turtle program.
+        :param axiom: Start string, e.g. "F".
+        :param rules: Rewriting rules, e.g. {"F": "F+F-F-F+F"}.
+        :param iterations: Number of rewriting passes.
+        :param step: Length of a forward move (defaults to the speed).
+        :param angle: Angle of a `+` or `-` turn, in degrees.
+        """
+        string = expand_lsystem(axiom, rules, iterations)
+        return self.run_program(lsystem_commands(string, step or self.speed, angle))
+
     def move_forward(self, distance=None):
         """Move the turtle forward by the specified distance, defaults to speed if not provided."""
-        distance = distance if distance else self.speed
-        self.position = self.calculate_new_position(distance)
-        self.drawing_manager.draw_line(self.previous_position, self.position)
-        self.previous_position = self.position
-        self._update_canvas()
+        self.run_program([(FORWARD, distance if distance else self.speed)])
 
     def move_backward(self, distance=None):
         """Move the turtle backward by the specified distance."""
-        self.turn_left(180)
-        self.move_forward(distance)
-        self.turn_right(180)
+        self.run_program([(FORWARD, -(distance if distance else self.speed))])
 
     def turn_left(self, degrees=90):
         """Turn the turtle left by the given number of degrees, defaults to 90 degrees."""
@@ -46,23 +74,15 @@ class TurtleTool(Tool):
 
     def draw_circle(self, radius):
         """Draw a circle with the turtle as the center."""
-        cv2.circle(self.drawing_manager.image, self.position, radius, self.color, self.thickness)
-        self._update_canvas()
+        self.drawing_manager.draw_circle(self.position, radius, self.color, self.thickness)
 
     def draw_square(self, side_length):
         """Draw a square with the turtle moving forward and turning at right angles."""
-        for _ in range(4):
-            self.move_forward(side_length)
-            self.turn_right(90)
-        self._update_canvas()
+        self.draw_polygon(4, side_length)
 
     def draw_polygon(self, sides, side_length):
-        """Draw a regular polygon with the specified number of sides and side length."""
-        angle = 360 / sides
-        for _ in range(sides):
-            self.move_forward(side_length)
-            self.turn_right(angle)
-        self._update_canvas()
+        """Draw a regular polygon with the specified number of sides and side length, in one call."""
+        self.run_program([(FORWARD, side_length), (TURN, -360 / sides)] * sides)
 
     def teleport(self, x, y):
         """
@@ -78,10 +98,12 @@ class TurtleTool(Tool):
 
     def pen_up(self):
         """Temporarily disable drawing (i.e., lift the pen)."""
+        self.pen_is_down = False
         self.drawing_manager.disable_drawing()
 
     def pen_down(self):
         """Re-enable drawing (i.e., put the pen down)."""
+        self.pen_is_down = True
         self.drawing_manager.enable_drawing()
 
     def reset(self):
@@ -89,11 +111,11 @@ class TurtleTool(Tool):
         self.angle = 0
         self.position = self.get_default_start_position()
         self.previous_position = self.position
-        self._update_canvas()
 
     def set_position(self, new_position):
         """Set the turtle to a new position without drawing."""
         self.position = new_position
+        self.previous_position = new_position
 
     def set_angle(self, angle):
         """Set the turtle's angle directly."""
@@ -110,7 +132,3 @@ class TurtleTool(Tool):
         new_x = int(x + distance * np.cos(radian_angle))
         new_y = int(y - distance * np.sin(radian_angle))  # Subtract for upward direction in image
         return new_x, new_y
-
-    def _update_canvas(self):
-        """Ensure the canvas is updated after each operation."""
-        self.drawing_manager.update_canvas()